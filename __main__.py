@@ -7,8 +7,11 @@ from tkinter import colorchooser, filedialog, messagebox, font, simpledialog, tt
 
 # threading
 # used for action queue
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+import contextlib
 import queue
+import time
 import datetime
 
 # IO utilities
@@ -39,8 +42,11 @@ from PIL import Image, ImageTk, ImageGrab
 # scrollable textboxes
 from src.uicomponents import ScrollableText, ScrollableTreeView
 # RTF parsing
-from src.RTFParser import RTFParseError, RTFParser
+from src.RTFParser import RTFControlWord, RTFParseError, RTFParser, RTFTokenGroup
 from src.search_index import NoteSearchIndex
+from src.note_cache import shared_note_cache
+from src.note_prefetch import NotePrefetcher
+from src.note_indexer import NoteIndexer
 from src.archive_store import (
     ArchiveConflictError,
     ArchiveError,
@@ -89,12 +95,103 @@ SPECIAL_CHARACTER_GROUPS = (
     ),
 )
 
+# Embedded pictures are decoded in parallel, since PIL decodes image data
+# without holding the GIL.
+image_decode_pool = ThreadPoolExecutor(
+    max_workers=min(8, os.cpu_count() or 1),
+    thread_name_prefix='image-decode',
+)
+
+# Saved notes are written one at a time, in the order they were saved.
+note_write_pool = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='note-writer',
+)
+
 @dataclass(order=True)
 class PrioritizedItem:
     priority: int
     item: Any=field(compare=False)
     descr: str=field(compare=False)
 
+@dataclass
+class EmbeddedPicture:
+    """A picture read from a \\pict group: its bytes as stored and its size."""
+    data: bytes
+    # 'pngblip' or 'jpegblip' when the bytes can be written back unchanged
+    blip: str | None
+    size: tuple
+    image: Any = None # the decoded PIL image, when the pixels were loaded
+
+@dataclass
+class LoadedNote:
+    """A note read, parsed and with its pictures read off the Tk thread."""
+    path: str
+    data: str
+    tree: Any
+    # EmbeddedPicture (None when unreadable) by the row of its \pict group,
+    # with its pixels decoded when near the top of the note
+    images: dict = field(default_factory=dict)
+
+    @property
+    def size(self):
+        # the text and token columns of the note plus its pictures
+        return sys.getsizeof(self.data) + self.tree.stream.nbytes + sum(
+            len(picture.data) + (
+                picture.image.width * picture.image.height * len(picture.image.getbands())
+                if picture.image is not None
+                else 0
+            )
+            for picture in self.images.values()
+            if picture is not None
+        )
+
+@dataclass
+class ProgressiveRender:
+    """A large note being inserted into its tab in time slices."""
+    # Stack of [child rows, style] for the groups being rendered, innermost
+    # last, so a slice can stop and resume anywhere in the token tree.
+    stream: Any
+    frames: list
+    dirty: bool = False
+    row: int = 0
+    layouts: set = field(default_factory=set)
+    after_id: Any = None
+
+    @property
+    def percent(self):
+        return min(99, 100 * self.row // max(1, len(self.stream)))
+
+@dataclass
+class RTFSnapshot:
+    """Part of a note captured from Tk, so it can be written as RTF elsewhere."""
+    contents: list # text.dump() of the range
+    initial_style_tags: list
+    initial_hyperlink_tags: list
+    style_tags: dict
+    hyperlink_tags: dict
+    # EmbeddedPicture by image name. Pictures without stored bytes carry the
+    # displayed image and are encoded as PNG when the snapshot is written.
+    pictures: dict
+    files: dict
+    horizontal_rules: set
+    # the photo each picture to be encoded was taken from, by image name
+    photos: dict = field(default_factory=dict)
+
+class HashingWriter:
+    """Writes text to a file while hashing it as documentContentHash does."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode('utf-8'))
+        return self.sink.write(text)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
 @dataclass
 class OpenDocument:
     """Editor and document-specific state for one open tab."""
@@ -127,7 +224,11 @@ class OpenDocument:
     wrap_text: bool = True
     dirty: bool = False
     loading: bool = False
+    render_job: Any = None
+    loaded_note: Any = None
+    autosave_after_id: Any = None
     content_hash: str = ''
+    pending_writes: dict = field(default_factory=dict)
 
 # this is the meat of the program, that joins together the uicomponents, RTF parser, and INI config into one functional UI and software
 class RTFWindow:
@@ -149,6 +250,26 @@ class RTFWindow:
     TABLE_COLUMN_GAP = 24
     HORIZONTAL_RULE_HEIGHT = 9
     HORIZONTAL_RULE_COLOR = "#737373"
+    # While RTF is rendered, styled text is collected and sent to Tk in one
+    # multi-segment insert per this many differently tagged runs.
+    STYLED_TEXT_BATCH_SEGMENTS = 1000
+    # Embedded pictures within this many lines of the view are decoded and
+    # shown; farther away they are blank placeholders of the same size, and
+    # decoded pictures beyond the release margin are dropped again.
+    IMAGE_VIEW_MARGIN_LINES = 50
+    IMAGE_RELEASE_MARGIN_LINES = 200
+    # notes loaded off the Tk thread decode the pictures in this many lines
+    # from their top, about a window of text plus IMAGE_VIEW_MARGIN_LINES
+    IMAGE_PRELOAD_LINES = 100
+    # PIL formats whose bytes are written back to RTF unchanged.
+    RTF_PICTURE_BLIPS = {'PNG': 'pngblip', 'JPEG': 'jpegblip'}
+    # Picture and attachment bytes are written out as hex this much at a time.
+    RTF_HEX_BLOCK_BYTES = 64 * 1024
+    # Notes at least this large are rendered progressively: a slice of about
+    # PROGRESSIVE_RENDER_SLICE_MS is inserted at a time and the rest follows
+    # from idle callbacks, so the window stays responsive while they load.
+    PROGRESSIVE_RENDER_MIN_BYTES = 512 * 1024
+    PROGRESSIVE_RENDER_SLICE_MS = 15
 
     def __init__(self, configFile='rtfjournal.ini', start_mainloop=True, start_worker=True):
         self.start_mainloop = start_mainloop
@@ -177,7 +298,27 @@ class RTFWindow:
         # set up public variables to this class
         self.RTF_HEADER = config_dict['constants']['RTF_HEADER'] + ' ' # read in RTF header
         self.nodeDir = os.path.normpath(config_dict['constants']['nodeDir']) + os.sep # read in directory to hold RTF file tree
-        self.search_index = NoteSearchIndex(self.nodeDir)
+        # parsed notes are shared between tabs, reloads and the search index
+        self.note_cache = shared_note_cache
+        self.note_cache.set_max_bytes(
+            config_dict.getint('cache', 'parsed_note_cache_mb', fallback=64) * 1024 * 1024
+        )
+        # neighbours of a previewed note are loaded ahead, within this budget
+        self.note_prefetcher = NotePrefetcher(
+            self.readNoteForDisplay,
+            lambda note: note.size,
+            config_dict.getint('cache', 'prefetch_mb', fallback=32) * 1024 * 1024,
+        )
+        # modified notes are saved after this many idle seconds; 0 turns it off
+        self.autosave_seconds = config_dict.getint('autosave', 'idle_seconds', fallback=0)
+        self.search_index = NoteSearchIndex(self.nodeDir, note_cache=self.note_cache)
+        # notes changed on disk are indexed in the background, checked every
+        # this many seconds; 0 indexes them when searching instead
+        self.note_indexer = NoteIndexer(
+            self.search_index,
+            poll_seconds=config_dict.getint('search', 'index_poll_seconds', fallback=5),
+            on_change=self.queueNoteIndexStatus,
+        )
         self.archive_store = NoteArchiveStore(self.nodeDir)
         self.openFile = '' # holds the currently open file for easy saving etc.
         self.tkinter_imagelist = [] # tkinter has a garbage collector bug where images need to be kept in a list to prevent them being garbage collected
@@ -206,18 +347,26 @@ class RTFWindow:
         self.center_layout_after_id = None
         self.table_layout_after_id = None
         self.horizontal_rule_layout_after_id = None
+        self.styled_text_batch = None # (index, [(tags, [text, ...]), ...]) while rendering RTF
+        self.image_decode_batch = None # [(mark, future), ...] of pictures decoding while rendering RTF
+        self.image_refresh_after_id = None
+        self.image_placeholders = {} # blank images padded out to stand in for far-away pictures
+        self.bulk_text_load = None # layout refreshes deferred by bulkTextLoad, while one runs
 
         # track if a UI popup is open or not to prevent spawning multiple windows
         self.UI_popup = None
         self.search_popup = None
         self.search_generation = 0
         self.search_results = {}
+        self.search_status_message = ''
+        self.search_stale_query = None # searched while the index was catching up
         self.archive_popup = None
         self.archive_generation = 0
         self.archive_results = {}
         self.rename_entry = None
         self.move_source_node = None
         self.tree_single_click_after_id = None
+        self.note_load_generation = 0
         self.ignore_next_tree_release = False
         self.open_documents_by_tab = {}
         self.open_documents_by_path = {}
@@ -393,6 +542,8 @@ class RTFWindow:
         # Tk event loop instead of a background thread.
         if self.start_worker:
             self._queue_after_id = self.window.after_idle(self.processActionQueueItem)
+            if self.note_indexer.poll_seconds > 0:
+                self.note_indexer.start()
         
         if self.start_mainloop:
             self.window.mainloop()
@@ -418,16 +569,30 @@ class RTFWindow:
         editor.bind('<KeyRelease>', self.scheduleCenteredTextLayoutRefresh, add='+')
         editor.bind('<KeyRelease>', self.scheduleTableLayoutRefresh, add='+')
         editor.bind('<KeyRelease>', self.applyFormatPainterAfterKeySelection, add='+')
+        editor.bind(
+            '<KeyRelease>',
+            lambda _event, current_editor=editor: self.scheduleDocumentAutosave(current_editor),
+            add='+',
+        )
         editor.bind('<ButtonRelease-1>', self.scheduleToolbarStyleUpdate, add='+')
         editor.bind('<<Selection>>', self.scheduleToolbarStyleUpdate, add='+')
         editor.bind('<Configure>', self.scheduleCenteredTextLayoutRefresh, add='+')
         editor.bind('<Configure>', self.scheduleTableLayoutRefresh, add='+')
         editor.bind('<Configure>', self.scheduleHorizontalRuleLayoutRefresh, add='+')
+        editor.yscroll_callback = (
+            lambda _first, _last, current_editor=editor:
+                self.scheduleEmbeddedImageRefresh(current_editor)
+        )
         editor.bind('<Motion>', self.updateImageResizeCursor, add='+')
         editor.bind('<ButtonPress-1>', self.beginImageResize, add='+')
         editor.bind('<B1-Motion>', self.dragImageResize, add='+')
         editor.bind('<ButtonRelease-1>', self.finishImageResize, add='+')
         editor.bind('<ButtonRelease-1>', self.applyFormatPainterToSelection, add='+')
+        editor.bind(
+            '<ButtonRelease-1>',
+            lambda _event, current_editor=editor: self.scheduleDocumentAutosave(current_editor),
+            add='+',
+        )
         editor.bind(
             '<<Modified>>',
             lambda _event, current_editor=editor: self.onDocumentModified(current_editor),
@@ -525,6 +690,8 @@ class RTFWindow:
             title = os.path.splitext(os.path.basename(document.path))[0]
         else:
             title = 'No note open'
+        if document.render_job is not None:
+            title = f'{title} ({document.render_job.percent}%)'
         return f'* {title}' if document.dirty else title
 
     def updateDocumentTabTitle(self, document):
@@ -568,12 +735,16 @@ class RTFWindow:
             self.cancelScheduledCenteredTextLayoutRefresh()
             self.cancelScheduledTableLayoutRefresh()
             self.cancelScheduledHorizontalRuleLayoutRefresh()
+            self.cancelScheduledEmbeddedImageRefresh()
             self.captureActiveDocumentState()
 
         self.active_document = document
         self.text = document.text
         self.openFile = document.path
-        document.text.configure(state='normal' if document.path else 'disabled')
+        # a note that is still rendering stays read-only until it is complete
+        document.text.configure(
+            state='normal' if document.path and document.render_job is None else 'disabled'
+        )
         self.tkinter_imagelist = document.tkinter_imagelist
         self.embedded_images = document.embedded_images
         self.embedded_files = document.embedded_files
@@ -602,14 +773,195 @@ class RTFWindow:
         self.scheduleCenteredTextLayoutRefresh()
         self.scheduleTableLayoutRefresh()
         self.scheduleHorizontalRuleLayoutRefresh()
+        self.scheduleEmbeddedImageRefresh()
+        job = document.render_job
+        if job is not None and job.after_id is None:
+            job.after_id = self.window.after_idle(self.renderProgressiveSlice, document)
         return document
 
     def documentContentHash(self, data):
         return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
+    @contextlib.contextmanager
+    def bulkTextLoad(self, undoable=False):
+        """Insert a whole note or paste into the active editor as one step.
+
+        Layout refreshes requested inside the block are deferred and run once
+        at the end, and modified events are not handled until then. A load
+        records no undo history and finishes with a fresh undo stack and a
+        clear modified flag. An ``undoable`` paste becomes a single undo step
+        and marks the document modified.
+        """
+        if self.bulk_text_load is not None:
+            yield
+            return
+
+        text = self.text
+        self.bulk_text_load = set()
+        if undoable:
+            autoseparators = text.widget.cget('autoseparators')
+            text.edit_separator()
+            text.configure(autoseparators=False)
+        else:
+            undo = text.widget.cget('undo')
+            text.configure(undo=False)
+        try:
+            yield
+            # Refreshes already scheduled before the block are folded into
+            # the same single pass.
+            deferred_layouts = self.bulk_text_load
+            deferred_layouts.update(self.takeScheduledLayoutRefreshes())
+            if 'centered' in deferred_layouts:
+                self.refreshCenteredTextLayout()
+            if 'table' in deferred_layouts:
+                self.refreshTableLayout()
+            if 'horizontal_rule' in deferred_layouts:
+                self.refreshHorizontalRuleLayout()
+        finally:
+            self.bulk_text_load = None
+            if undoable:
+                text.edit_separator()
+                text.configure(autoseparators=autoseparators)
+            else:
+                text.configure(undo=undo)
+                text.edit_reset()
+                text.edit_modified(False)
+
+        if undoable:
+            self.onDocumentModified(text)
+
+    def takeScheduledLayoutRefreshes(self):
+        """Cancel the pending layout refreshes and return their names."""
+        layouts = set()
+        if self.center_layout_after_id is not None:
+            layouts.add('centered')
+        if self.table_layout_after_id is not None:
+            layouts.add('table')
+        if self.horizontal_rule_layout_after_id is not None:
+            layouts.add('horizontal_rule')
+        self.cancelScheduledCenteredTextLayoutRefresh()
+        self.cancelScheduledTableLayoutRefresh()
+        self.cancelScheduledHorizontalRuleLayoutRefresh()
+        return layouts
+
+    def deferredLayoutRefreshes(self):
+        # Layout refreshes are collected instead of scheduled while a bulk
+        # load runs or while the active note is still rendering.
+        if self.bulk_text_load is not None:
+            return self.bulk_text_load
+        document = self.active_document
+        if document is not None and document.render_job is not None:
+            return document.render_job.layouts
+        return None
+
+    def startProgressiveRender(self, document, structure, dirty=False):
+        """Render a parsed note into the active tab a time slice at a time.
+
+        The first slice is inserted before this returns and the rest follows
+        from idle callbacks. The tab shows its progress and stays read-only,
+        with no undo history recorded, until the note is complete.
+        """
+        self.cancelProgressiveRender(document)
+        document.loading = True
+        self.text.configure(state='normal', undo=False)
+        self.text.delete('1.0', 'end')
+        self.font_table = self.parseRTFFontTable(structure)
+        self.color_table = self.parseRTFColorTable(structure)
+        job = document.render_job = ProgressiveRender(
+            stream=structure.stream,
+            frames=[[structure.stream.children(structure.row), self.defaultTextStyle()]],
+            dirty=dirty,
+            row=structure.row,
+        )
+        job.layouts.update(self.takeScheduledLayoutRefreshes())
+        return self.renderProgressiveSlice(document)
+
+    def renderProgressiveSlice(self, document):
+        job = document.render_job
+        if job is None:
+            return None
+        job.after_id = None
+        if document is not self.active_document:
+            # paused; activateDocument resumes it when the tab is shown again
+            return None
+
+        stream = job.stream
+        frames = job.frames
+        deadline = time.perf_counter() + self.PROGRESSIVE_RENDER_SLICE_MS / 1000
+        self.text.configure(state='normal')
+        self.beginImageDecodeBatch()
+        self.beginStyledTextBatch('end')
+        try:
+            while frames:
+                frame = frames[-1]
+                row = next(frame[0], None)
+                if row is None:
+                    frames.pop()
+                    continue
+                job.row = row
+                token = stream.token(row)
+                if not self.isRTFGroup(token):
+                    frame[1] = self.displayRTFToken(token, frame[1])
+                elif not self.displaySpecialRTFGroup(token, frame[1].copy()):
+                    frames.append([stream.children(row), frame[1].copy()])
+                if time.perf_counter() >= deadline:
+                    break
+        except Exception:
+            self.cancelProgressiveRender(document)
+            document.loading = False
+            raise
+        finally:
+            self.endStyledTextBatch()
+            self.endImageDecodeBatch()
+
+        if frames:
+            self.text.configure(state='disabled')
+            self.updateDocumentTabTitle(document)
+            job.after_id = self.window.after_idle(self.renderProgressiveSlice, document)
+            return None
+        return self.finishProgressiveRender(document)
+
+    def finishProgressiveRender(self, document):
+        job = document.render_job
+        document.render_job = None
+        document.loaded_note = None
+        self.text.configure(state='normal', undo=True)
+        try:
+            # runs the layout refreshes requested while rendering once and
+            # leaves a fresh undo stack, as a synchronous load does
+            with self.bulkTextLoad():
+                self.bulk_text_load.update(job.layouts)
+            document.dirty = False
+        finally:
+            document.loading = False
+        if job.dirty:
+            self.text.edit_modified(True)
+            document.dirty = True
+        self.captureActiveDocumentState()
+        self.updateDocumentTabTitle(document)
+        return None
+
+    def cancelProgressiveRender(self, document):
+        job = document.render_job
+        if job is None:
+            return None
+        document.render_job = None
+        document.loaded_note = None
+        if job.after_id is not None:
+            try:
+                self.window.after_cancel(job.after_id)
+            except tk.TclError:
+                pass
+        try:
+            document.text.configure(undo=True)
+        except tk.TclError:
+            pass
+        return None
+
     def replaceDocumentContent(self, document, parsed_rtf, content_hash, dirty):
         """Replace one tab from a shared node snapshot without selecting it."""
         original_document = self.active_document
+        self.cancelProgressiveRender(document)
         document.loading = True
         document.tkinter_imagelist = []
         document.embedded_images = {}
@@ -632,10 +984,9 @@ class RTFWindow:
         )
 
         try:
-            self.text.delete('1.0', 'end')
-            self.text.edit_reset()
-            self.displayNestedRTFStructure(parsed_rtf)
-            self.text.edit_reset()
+            with self.bulkTextLoad():
+                self.text.delete('1.0', 'end')
+                self.displayNestedRTFStructure(parsed_rtf)
             self.text.edit_modified(bool(dirty))
             document.dirty = bool(dirty)
             document.content_hash = content_hash
@@ -650,10 +1001,23 @@ class RTFWindow:
                     synchronize_current=False,
                 )
 
-    def synchronizeOpenDocumentCopies(self, document, data=None, dirty=None):
-        """Copy the latest content to every other tab showing the same node."""
+    def synchronizeOpenDocumentCopies(
+        self,
+        document,
+        data=None,
+        dirty=None,
+        content_hash=None,
+    ):
+        """Copy the latest content to every other tab showing the same node.
+
+        Given the ``content_hash`` of the content instead of its ``data``, or
+        when the document is unchanged since it was loaded or saved, the
+        document is only serialized again for copies showing something else.
+        """
         if document is None or not document.path or document is not self.active_document:
             return None
+        if document.render_job is not None:
+            return None
 
         normalized_path = self.normalizedDocumentPath(document.path)
         copies = [
@@ -665,11 +1029,16 @@ class RTFWindow:
         if not copies:
             return None
 
-        if data is None:
-            data = self.convertToRTF('1.0', 'end')
+        modified = document.dirty or bool(document.text.edit_modified())
         if dirty is None:
-            dirty = document.dirty or bool(document.text.edit_modified())
-        content_hash = self.documentContentHash(data)
+            dirty = modified
+        if content_hash is None and data is None and not modified:
+            # empty while a background save of the document is being written
+            content_hash = document.content_hash or None
+        if content_hash is None:
+            if data is None:
+                data = self.convertToRTF('1.0', 'end')
+            content_hash = self.documentContentHash(data)
         document.content_hash = content_hash
         document.dirty = bool(dirty)
 
@@ -681,7 +1050,9 @@ class RTFWindow:
                 self.updateDocumentTabTitle(copy)
                 continue
             if parsed_rtf is None:
-                parsed_rtf = RTFParser(data).parseme()
+                if data is None:
+                    data = self.convertToRTF('1.0', 'end')
+                parsed_rtf = RTFParser(data, coalesce_text=True).parsecompact().root
             self.replaceDocumentContent(
                 copy,
                 parsed_rtf,
@@ -705,6 +1076,9 @@ class RTFWindow:
         document = self.open_documents_by_tab.get(str(editor))
         if document is None:
             return None
+        if self.bulk_text_load is not None and document is self.active_document:
+            # bulkTextLoad settles the modified state once when it finishes
+            return None
         modified = bool(editor.edit_modified())
         if document.loading:
             if modified:
@@ -712,6 +1086,7 @@ class RTFWindow:
             return None
         document.dirty = modified and bool(document.path)
         self.updateDocumentTabTitle(document)
+        self.scheduleDocumentAutosave(editor)
         return None
 
     def markCurrentDocumentModified(self):
@@ -721,6 +1096,58 @@ class RTFWindow:
         self.text.edit_modified(True)
         document.dirty = True
         self.updateDocumentTabTitle(document)
+        self.scheduleDocumentAutosave(document.text)
+        return None
+
+    def scheduleDocumentAutosave(self, editor):
+        """Save a modified tab once it has been left alone for a while.
+
+        Each edit restarts the wait, so a burst of typing is saved once.
+        """
+        if self.autosave_seconds <= 0:
+            return None
+        document = self.open_documents_by_tab.get(str(editor))
+        if document is None or not document.path:
+            return None
+        self.cancelDocumentAutosave(document)
+        if not (document.dirty or bool(editor.edit_modified())):
+            return None
+        document.autosave_after_id = self.window.after(
+            self.autosave_seconds * 1000,
+            self.autosaveDocument,
+            document,
+        )
+        return None
+
+    def cancelDocumentAutosave(self, document):
+        if document.autosave_after_id is None:
+            return None
+        try:
+            self.window.after_cancel(document.autosave_after_id)
+        except tk.TclError:
+            pass
+        document.autosave_after_id = None
+        return None
+
+    def autosaveDocument(self, document):
+        document.autosave_after_id = None
+        if (
+            self.open_documents_by_tab.get(document.tab_id) is not document
+            or not document.path
+            or document.loading
+            or document.render_job is not None
+            or not (document.dirty or bool(document.text.edit_modified()))
+        ):
+            return None
+        snapshot = self.snapshotRTF('1.0', 'end', document)
+        # cloud-synced folders see no write when the note is unchanged on disk
+        self.startNoteWrite(
+            document,
+            document.path,
+            snapshot,
+            show_confirmation=False,
+            skip_unchanged=True,
+        )
         return None
 
     def selectDocumentTab(self, document):
@@ -770,6 +1197,10 @@ class RTFWindow:
         if document is None:
             return True
 
+        # a background save still being written may fail and leave the note
+        # modified, so its outcome is reported before the tab can close
+        for finish_write in list(document.pending_writes.values()):
+            finish_write()
         if document is self.active_document:
             self.captureActiveDocumentState()
         if document.dirty and not force:
@@ -784,6 +1215,8 @@ class RTFWindow:
                 if not self.writeCurrentDocument(show_confirmation=False):
                     return False
 
+        self.cancelProgressiveRender(document)
+        self.cancelDocumentAutosave(document)
         if document.path:
             self.unregisterOpenDocumentPath(document)
         self.open_documents_by_tab.pop(tab_id, None)
@@ -809,6 +1242,11 @@ class RTFWindow:
         for tab_id in list(self.editor_tabs.tabs()):
             if not self.closeDocumentTab(tab_id, create_placeholder=False):
                 return None
+        # the indexer stops between notes; one still indexing after this
+        # stops at its next write once the index is closed
+        self.note_indexer.stop(timeout=1)
+        # closed once the saves still being written have updated it
+        note_write_pool.submit(self.search_index.close).result()
         self.window.destroy()
         return 'break'
 
@@ -840,6 +1278,8 @@ class RTFWindow:
             except tk.TclError:
                 pass
             self.tree_single_click_after_id = None
+        # a note still loading in the background is discarded when it arrives
+        self.note_load_generation += 1
         return None
 
     def scheduleNodePreview(self, event):
@@ -882,11 +1322,40 @@ class RTFWindow:
         self.tree.selection_set(node)
         self.tree.focus(item=node)
         self.selected_node = node
-        return self.tryReadShowRTF(
+        # Previews are loaded off the Tk thread when the action queue that
+        # delivers the result is being drained.
+        document = self.tryReadShowRTF(
             None,
             open_in_new_tab=False,
             reuse_open_tab=False,
+            background=self.start_worker,
         )
+        if document is not None:
+            self.prefetchNodeNeighbours(node)
+        return document
+
+    def prefetchNodeNeighbours(self, node):
+        """Load the siblings and first child of a previewed node ahead of time."""
+        if not self.start_worker:
+            return None
+        siblings = self.tree.get_children(self.get_node_parent(node))
+        try:
+            position = siblings.index(node)
+        except ValueError:
+            return None
+        neighbours = list(siblings[position + 1:position + 2])
+        if position > 0:
+            neighbours.append(siblings[position - 1])
+        neighbours.extend(self.tree.get_children(node)[:1])
+
+        paths = []
+        for neighbour in neighbours:
+            try:
+                paths.append(self.resolveNodePath(self.get_node_path(neighbour)) + '.rtf')
+            except ValueError:
+                continue
+        self.note_prefetcher.prefetch(paths)
+        return None
 
     def previewSelectedNodeFromKeyboard(self, event=None):
         """Preview the node selected by Tk's completed arrow-key navigation."""
@@ -1361,9 +1830,8 @@ class RTFWindow:
         footer = ttk.Frame(popup, padding=(10, 0, 10, 10))
         footer.grid(row=2, column=0, sticky='ew')
         footer.grid_columnconfigure(0, weight=1)
-        self.search_status_var = tk.StringVar(
-            value='Enter text to search every saved note.'
-        )
+        self.search_status_var = tk.StringVar()
+        self.setSearchStatus('Enter text to search every saved note.')
         ttk.Label(footer, textvariable=self.search_status_var).grid(
             row=0,
             column=0,
@@ -1382,6 +1850,7 @@ class RTFWindow:
 
         self.search_entry.bind('<Return>', lambda _event: self.startNoteSearch())
         self.search_entry.focus_set()
+        self.note_indexer.poll_now()
         return 'break'
 
     def closeSearchDialog(self):
@@ -1389,19 +1858,24 @@ class RTFWindow:
         popup = self.search_popup
         self.search_popup = None
         self.search_results = {}
+        self.search_stale_query = None
         if popup is not None:
             popup.destroy()
 
     def startNoteSearch(self):
         query = self.search_query_var.get()
         if not query:
-            self.search_status_var.set('Enter text to search every saved note.')
+            self.setSearchStatus('Enter text to search every saved note.')
             return None
 
         self.search_generation += 1
         generation = self.search_generation
+        self.search_stale_query = None
         self.search_button.configure(state='disabled')
-        self.search_status_var.set('Updating the index and searching\u2026')
+        if self.note_indexer.running:
+            self.setSearchStatus('Searching\u2026')
+        else:
+            self.setSearchStatus('Updating the index and searching\u2026')
         for item in self.search_results_tree.get_children():
             self.search_results_tree.delete(item)
         self.search_results = {}
@@ -1416,7 +1890,11 @@ class RTFWindow:
 
     def _runNoteSearch(self, query, generation):
         try:
-            stats, results = self.search_index.refresh_and_search(query)
+            if self.note_indexer.running:
+                # the indexer keeps the index current; its backlog is shown
+                stats, results = None, self.search_index.search(query)
+            else:
+                stats, results = self.search_index.refresh_and_search(query)
             error = None
         except Exception as exc:
             stats, results = None, []
@@ -1444,7 +1922,7 @@ class RTFWindow:
 
         self.search_button.configure(state='normal')
         if error is not None:
-            self.search_status_var.set(f'Search failed: {error}')
+            self.setSearchStatus(f'Search failed: {error}')
             return None
 
         for result in results:
@@ -1457,9 +1935,14 @@ class RTFWindow:
 
         count = len(results)
         suffix = '' if count != 200 else ' (first 200)'
-        indexed = stats['updated']
+        indexed = stats['updated'] if stats is not None else 0
         index_note = f' Indexed {indexed} changed note(s).' if indexed else ''
-        self.search_status_var.set(
+        status = self.note_indexer.status()
+        if self.note_indexer.running and (
+            not status['ready'] or status['indexing'] or status['pending']
+        ):
+            self.search_stale_query = query
+        self.setSearchStatus(
             f'{count} match(es) for \u201c{query}\u201d{suffix}.{index_note}'
         )
         if results:
@@ -1468,6 +1951,49 @@ class RTFWindow:
             self.search_results_tree.focus(first)
         return None
 
+    def setSearchStatus(self, message):
+        """Show a search dialog message, followed by the indexing backlog."""
+        self.search_status_message = message
+        self.search_status_var.set(message + self.noteIndexStatusText())
+
+    def noteIndexStatusText(self):
+        if not self.note_indexer.running:
+            return ''
+        status = self.note_indexer.status()
+        pending = status['pending']
+        if status['error'] is not None:
+            return f' Indexing failed: {status["error"]}'
+        if status['indexing'] or not status['ready']:
+            if pending:
+                return f' Indexing {pending} changed note(s)\u2026'
+            return ' Indexing notes\u2026'
+        if pending:
+            return f' {pending} changed note(s) waiting to be indexed.'
+        return ''
+
+    def queueNoteIndexStatus(self):
+        # called on the indexer thread
+        self.actionQueue.put(
+            PrioritizedItem(0, self.showNoteIndexStatus, "showNoteIndexStatus")
+        )
+
+    def showNoteIndexStatus(self):
+        """Update the search dialog's backlog, searching again once it clears."""
+        if self.search_popup is None:
+            return None
+        status = self.note_indexer.status()
+        caught_up = status['ready'] and not status['indexing'] and not status['pending']
+        if (
+            caught_up
+            and self.search_stale_query is not None
+            and self.search_stale_query == self.search_query_var.get()
+            and str(self.search_button.cget('state')) != 'disabled'
+        ):
+            self.startNoteSearch()
+            return None
+        self.search_status_var.set(self.search_status_message + self.noteIndexStatusText())
+        return None
+
     def openSelectedSearchResult(self):
         selection = self.search_results_tree.selection()
         if not selection:
@@ -2445,6 +2971,10 @@ class RTFWindow:
         return None
 
     def scheduleCenteredTextLayoutRefresh(self, event=None):
+        deferred_layouts = self.deferredLayoutRefreshes()
+        if deferred_layouts is not None:
+            deferred_layouts.add('centered')
+            return None
         if self.center_layout_after_id is None:
             self.center_layout_after_id = self.window.after_idle(
                 self.runScheduledCenteredTextLayoutRefresh
@@ -2531,6 +3061,19 @@ class RTFWindow:
 
     def insertStyledText(self, index, text, style):
         tag = self.getStyleTag(style)
+        batch = self.styled_text_batch
+        if batch is not None and batch[0] == index:
+            tags = () if tag is None else (tag,)
+            segments = batch[1]
+            if segments and segments[-1][0] == tags:
+                segments[-1][1].append(text)
+                return
+            if len(segments) >= self.STYLED_TEXT_BATCH_SEGMENTS:
+                self.flushStyledTextBatch()
+            segments.append((tags, [text]))
+            return
+
+        self.flushStyledTextBatch()
         if tag is None:
             self.text.insert(index, text)
         else:
@@ -2538,6 +3081,36 @@ class RTFWindow:
         self.scheduleCenteredTextLayoutRefresh()
         self.scheduleTableLayoutRefresh()
 
+    def beginStyledTextBatch(self, index):
+        """Collect insertStyledText calls at ``index`` until the batch ends."""
+        self.endStyledTextBatch()
+        self.styled_text_batch = (index, [])
+
+    def flushStyledTextBatch(self):
+        """Insert the collected text, e.g. before reading text positions."""
+        if self.styled_text_batch is None:
+            return None
+
+        index, segments = self.styled_text_batch
+        if not segments:
+            return None
+
+        # Tk inserts each (chars, tagList) pair after the previous one, so the
+        # whole batch costs a single Tcl call.
+        arguments = []
+        for tags, pieces in segments:
+            arguments.append(''.join(pieces))
+            arguments.append(tags)
+        segments.clear()
+        self.text.insert(index, *arguments)
+        self.scheduleCenteredTextLayoutRefresh()
+        self.scheduleTableLayoutRefresh()
+        return None
+
+    def endStyledTextBatch(self):
+        self.flushStyledTextBatch()
+        self.styled_text_batch = None
+
     def typedCharacterFromEvent(self, event):
         control_is_held = bool(event.state & 0x0004)
         # Aqua Tk maps Command to Mod1.  Ignore it here just as we ignore
@@ -4266,6 +4839,10 @@ class RTFWindow:
         return None
 
     def scheduleTableLayoutRefresh(self, event=None):
+        deferred_layouts = self.deferredLayoutRefreshes()
+        if deferred_layouts is not None:
+            deferred_layouts.add('table')
+            return None
         if self.table_layout_after_id is None:
             self.table_layout_after_id = self.window.after_idle(
                 self.runScheduledTableLayoutRefresh
@@ -4286,19 +4863,36 @@ class RTFWindow:
         self.table_layout_after_id = None
         return self.refreshTableLayout()
         
+    def isRTFGroup(self, token):
+        # Groups are lists from parseme() or RTFTokenGroup views from
+        # parsecompact(); either reads as a sequence of tokens.
+        return isinstance(token, (list, RTFTokenGroup))
+
     def flattenRTFTokens(self, structure):
         for token in structure:
-            if isinstance(token, list):
+            if self.isRTFGroup(token):
                 yield from self.flattenRTFTokens(token)
             else:
                 yield token
 
+    def rtfControlWord(self, command):
+        if isinstance(command, RTFControlWord):
+            return command
+        return RTFControlWord(command)
+
     def firstRTFCommand(self, structure):
         for token in structure:
             if isinstance(token, tuple) and token[0] == 'RTFCMD':
                 return token[1]
         return None
 
+    def findRTFPayload(self, structure):
+        """Return the hex payload token held directly by a binary group."""
+        for token in structure:
+            if isinstance(token, tuple) and token[0] == 'PAYLOAD':
+                return token[1]
+        return None
+
     def hasDirectRTFCommand(self, structure, command):
         """Check a group itself, without matching commands in child groups."""
         return any(
@@ -4309,7 +4903,7 @@ class RTFWindow:
 
     def findRTFGroup(self, structure, command):
         for token in structure:
-            if isinstance(token, list):
+            if self.isRTFGroup(token):
                 if self.firstRTFCommand(token) == command:
                     return token
                 found = self.findRTFGroup(token, command)
@@ -4320,7 +4914,7 @@ class RTFWindow:
     def findRTFGroupWithDirectCommand(self, structure, command):
         r"""Find a group even when ``\*`` precedes its destination command."""
         for token in structure:
-            if not isinstance(token, list):
+            if not self.isRTFGroup(token):
                 continue
             if self.hasDirectRTFCommand(token, command):
                 return token
@@ -4340,9 +4934,9 @@ class RTFWindow:
 
         for token_type, token_value in self.flattenRTFTokens(font_group):
             if token_type == 'RTFCMD':
-                match = re.fullmatch(r'f(\d+)', token_value)
-                if match:
-                    current_font_id = int(match.group(1))
+                word = self.rtfControlWord(token_value)
+                if word.name == 'f' and word.parameter is not None:
+                    current_font_id = word.parameter
                     font_name = ''
                 continue
 
@@ -4376,11 +4970,16 @@ class RTFWindow:
 
         for token_type, token_value in self.flattenRTFTokens(color_group):
             if token_type == 'RTFCMD':
-                match = re.fullmatch(r'(red|green|blue)(\d+)(;*)', token_value)
-                if match:
-                    current_color[match.group(1)] = int(match.group(2))
+                # Writers put the entry separator straight after the last
+                # component, so "blue255;" arrives as a single control word.
+                word = self.rtfControlWord(token_value)
+                separators = len(word) - len(word.rstrip(';'))
+                if separators:
+                    word = RTFControlWord(word[:-separators])
+                if word.name in current_color and word.parameter is not None:
+                    current_color[word.name] = word.parameter
                     saw_rgb = True
-                    for _ in range(match.group(3).count(';')):
+                    for _ in range(separators):
                         red = current_color["red"] or 0
                         green = current_color["green"] or 0
                         blue = current_color["blue"] or 0
@@ -4421,8 +5020,9 @@ class RTFWindow:
 
         return ''.join(hex_chunks)
 
-    def createEmbeddedImage(self, index, pil_image):
-        source_image = pil_image.copy()
+    def createEmbeddedImage(self, index, pil_image, copy_image=True):
+        # freshly decoded pictures are not shared and need no defensive copy
+        source_image = pil_image.copy() if copy_image else pil_image
         tk_image = ImageTk.PhotoImage(source_image)
         self.tkinter_imagelist.append(tk_image)
         embedded_name = self.text.image_create(index, image=tk_image)
@@ -4536,6 +5136,10 @@ class RTFWindow:
         return None
 
     def scheduleHorizontalRuleLayoutRefresh(self, event=None):
+        deferred_layouts = self.deferredLayoutRefreshes()
+        if deferred_layouts is not None:
+            deferred_layouts.add('horizontal_rule')
+            return None
         if self.horizontal_rule_layout_after_id is None:
             self.horizontal_rule_layout_after_id = self.window.after_idle(
                 self.runScheduledHorizontalRuleLayoutRefresh
@@ -4701,6 +5305,8 @@ class RTFWindow:
     def getPhotoImageForEmbeddedImage(self, embedded_name):
         image_data = self.embedded_images.get(embedded_name)
         if image_data is not None:
+            if image_data["original"] is None:
+                return self.materializeEmbeddedImage(embedded_name)
             return image_data["photo"]
 
         try:
@@ -4773,6 +5379,9 @@ class RTFWindow:
                 "photo": current_photo,
             }
             self.embedded_images[embedded_name] = image_data
+        elif image_data["original"] is None:
+            if self.materializeEmbeddedImage(embedded_name) is None:
+                return None
 
         original_image = image_data["original"]
         resampling_filter = getattr(
@@ -4786,6 +5395,10 @@ class RTFWindow:
 
         self.text.image_configure(embedded_name, image=resized_photo)
         image_data["photo"] = resized_photo
+        # the stored bytes no longer match, so the picture is kept decoded
+        image_data["size"] = (width, height)
+        image_data.pop("data", None)
+        image_data.pop("blip", None)
         self.tkinter_imagelist.append(resized_photo)
         if old_photo in self.tkinter_imagelist:
             self.tkinter_imagelist.remove(old_photo)
@@ -4987,161 +5600,552 @@ class RTFWindow:
         return 'break'
 
     def displayRTFImageGroup(self, structure, insertion_index='end'):
-        img_buildout_hex = self.extractRTFImageHex(structure)
+        loaded_note = None
+        if self.active_document is not None:
+            loaded_note = self.active_document.loaded_note
+        if (
+            loaded_note is not None
+            and isinstance(structure, RTFTokenGroup)
+            and structure.stream is loaded_note.tree.stream
+            and structure.row in loaded_note.images
+        ):
+            img = loaded_note.images.pop(structure.row)
+        elif self.image_decode_batch is not None:
+            # Read on the pool while the rest of the note renders, then
+            # inserted at a mark left here. Only pictures near the view have
+            # their pixels decoded.
+            mark = f'rtf_pending_image_{len(self.image_decode_batch)}'
+            self.text.mark_set(mark, 'end-1c' if insertion_index == 'end' else insertion_index)
+            self.text.mark_gravity(mark, 'left')
+            if self.isIndexNearTextView(mark):
+                read_picture = self.decodeRTFImageGroup
+            else:
+                read_picture = self.readRTFPicture
+            self.image_decode_batch.append(
+                (mark, image_decode_pool.submit(read_picture, structure))
+            )
+            return None
+        else:
+            img = self.decodeRTFImageGroup(structure)
+
+        if img is not None:
+            self.createEmbeddedPicture(insertion_index, img)
+
+        return None
+
+    def beginImageDecodeBatch(self):
+        """Decode pictures displayed until the batch ends in parallel."""
+        self.endImageDecodeBatch()
+        self.image_decode_batch = []
+
+    def endImageDecodeBatch(self):
+        """Insert the pictures of the batch at their marks."""
+        batch = self.image_decode_batch
+        self.image_decode_batch = None
+        if not batch:
+            return None
+        # Adjacent pictures leave their marks at the same index. Filled last
+        # first, each picture lands after the left-gravity marks before it.
+        for mark, future in reversed(batch):
+            picture = future.result()
+            if picture is not None:
+                self.createEmbeddedPicture(mark, picture)
+            self.text.mark_unset(mark)
+        return None
+
+    def createEmbeddedPicture(self, index, picture):
+        """Insert a picture read from RTF, as a placeholder when far from view."""
+        if picture.image is not None and self.isIndexNearTextView(index):
+            embedded_name = self.createEmbeddedImage(index, picture.image, copy_image=False)
+        else:
+            placeholder, padx, pady = self.embeddedImagePlaceholder(*picture.size)
+            embedded_name = self.text.image_create(
+                index,
+                image=placeholder,
+                padx=padx,
+                pady=pady,
+            )
+            self.embedded_images[embedded_name] = {"original": None, "photo": None}
+        self.embedded_images[embedded_name].update(
+            data=picture.data,
+            blip=picture.blip,
+            size=picture.size,
+        )
+        return embedded_name
+
+    def embeddedImagePlaceholder(self, width, height):
+        # A shared blank image of 1 or 2 pixels, padded on both sides to the
+        # picture's size so the layout does not move when it is decoded.
+        key = (2 - width % 2, 2 - height % 2)
+        placeholder = self.image_placeholders.get(key)
+        if placeholder is None:
+            placeholder = tk.PhotoImage(master=self.window, width=key[0], height=key[1])
+            self.image_placeholders[key] = placeholder
+        return placeholder, (width - key[0]) // 2, (height - key[1]) // 2
+
+    def materializeEmbeddedImage(self, embedded_name, image=None):
+        """Show the decoded picture in place of an image's placeholder."""
+        image_data = self.embedded_images.get(embedded_name)
+        if image_data is None:
+            return None
+        if image_data["original"] is not None:
+            return image_data["photo"]
+        if image is None:
+            image = self.decodeEmbeddedPicture(image_data["data"])
+        if image is None:
+            return None
+        photo = ImageTk.PhotoImage(image)
+        self.text.image_configure(embedded_name, image=photo, padx=0, pady=0)
+        self.tkinter_imagelist.append(photo)
+        image_data["original"] = image
+        image_data["photo"] = photo
+        return photo
+
+    def releaseEmbeddedImage(self, embedded_name):
+        """Replace a decoded picture that can be read again by a placeholder."""
+        image_data = self.embedded_images.get(embedded_name)
+        # pictures without a blip are saved from their decoded pixels
+        if image_data is None or image_data["original"] is None or image_data.get("blip") is None:
+            return None
+        placeholder, padx, pady = self.embeddedImagePlaceholder(*image_data["size"])
+        self.text.image_configure(embedded_name, image=placeholder, padx=padx, pady=pady)
+        if image_data["photo"] in self.tkinter_imagelist:
+            self.tkinter_imagelist.remove(image_data["photo"])
+        image_data["original"] = None
+        image_data["photo"] = None
+        return None
+
+    def textViewLines(self):
+        """Return the first and last line numbers shown in the editor."""
+        first = self.text.index('@0,0')
+        last = self.text.index(f'@0,{self.text.widget.winfo_height()}')
+        return int(first.split('.')[0]), int(last.split('.')[0])
+
+    def isIndexNearTextView(self, index):
+        first, last = self.textViewLines()
+        line = int(self.text.index(index).split('.')[0])
+        margin = self.IMAGE_VIEW_MARGIN_LINES
+        return first - margin <= line <= last + margin
 
-        if img_buildout_hex == '':
+    def scheduleEmbeddedImageRefresh(self, editor=None):
+        if editor is not None and editor is not self.text:
             return None
+        if self.image_refresh_after_id is None and self.embedded_images:
+            self.image_refresh_after_id = self.window.after_idle(
+                self.runScheduledEmbeddedImageRefresh
+            )
+        return None
+
+    def cancelScheduledEmbeddedImageRefresh(self):
+        if self.image_refresh_after_id is not None:
+            try:
+                self.window.after_cancel(self.image_refresh_after_id)
+            except tk.TclError:
+                pass
+            self.image_refresh_after_id = None
+        return None
 
+    def runScheduledEmbeddedImageRefresh(self):
+        self.image_refresh_after_id = None
+        return self.refreshEmbeddedImages()
+
+    def refreshEmbeddedImages(self):
+        """Decode pictures scrolled near the view and release far ones."""
+        first, last = self.textViewLines()
+        wanted = []
+        for embedded_name, image_data in list(self.embedded_images.items()):
+            try:
+                line = int(self.text.index(embedded_name).split('.')[0])
+            except tk.TclError:
+                # deleted from the text
+                continue
+            distance = max(first - line, line - last, 0)
+            if image_data["original"] is None:
+                if distance <= self.IMAGE_VIEW_MARGIN_LINES:
+                    wanted.append(embedded_name)
+            elif distance > self.IMAGE_RELEASE_MARGIN_LINES:
+                self.releaseEmbeddedImage(embedded_name)
+
+        decoding = [
+            (
+                embedded_name,
+                image_decode_pool.submit(
+                    self.decodeEmbeddedPicture,
+                    self.embedded_images[embedded_name]["data"],
+                ),
+            )
+            for embedded_name in wanted
+        ]
+        for embedded_name, future in decoding:
+            self.materializeEmbeddedImage(embedded_name, future.result())
+        return None
+
+    def decodeEmbeddedPicture(self, data):
+        """Decode a picture's stored bytes to a loaded PIL image, or None."""
         try:
-            imgdata = io.BytesIO(bytes.fromhex(img_buildout_hex.replace('\r', '').replace('\n', '').replace(' ', '')))
-            img = Image.open(imgdata)
+            img = Image.open(io.BytesIO(data))
+            img.load()
         except (OSError, ValueError) as exc:
             print(f'ERROR: Could not load embedded image: {exc}')
             return None
+        return img
+
+    def readPictureFile(self, path):
+        """Read an image file into an EmbeddedPicture with its pixels decoded."""
+        with open(path, 'rb') as source:
+            data = source.read()
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return EmbeddedPicture(
+            data,
+            self.RTF_PICTURE_BLIPS.get(img.format),
+            img.size,
+            img,
+        )
+
+    def decodeRTFImageGroup(self, structure):
+        """Read a picture group with its pixels decoded; see readRTFPicture."""
+        return self.readRTFPicture(structure, load=True)
+
+    def readRTFPicture(self, structure, load=False):
+        """Read a picture group into an EmbeddedPicture, or None.
+
+        The pixels are only decoded when ``load`` is set. Does not use Tk, so
+        notes can be read on worker threads.
+        """
+        payload = self.findRTFPayload(structure)
+        if payload is None:
+            img_buildout_hex = self.extractRTFImageHex(structure)
+
+            if img_buildout_hex == '':
+                return None
 
-        self.createEmbeddedImage(insertion_index, img)
+        try:
+            if payload is not None:
+                # The parser keeps picture hex as one source span, so it is
+                # decoded in a single pass without joining text tokens.
+                image_bytes = payload.decode()
+            else:
+                image_bytes = bytes.fromhex(img_buildout_hex.replace('\r', '').replace('\n', '').replace(' ', ''))
+            img = Image.open(io.BytesIO(image_bytes))
+            if load:
+                img.load()
+        except (OSError, ValueError) as exc:
+            print(f'ERROR: Could not load embedded image: {exc}')
+            return None
+        return EmbeddedPicture(
+            image_bytes,
+            self.RTF_PICTURE_BLIPS.get(img.format),
+            img.size,
+            img if load else None,
+        )
+
+    def readNoteForDisplay(self, node_path, is_stale=None):
+        """Read and parse a note and read its pictures without using Tk.
+
+        Runs on worker threads. Only pictures within IMAGE_PRELOAD_LINES of
+        the top, where the note is shown first, have their pixels decoded.
+        Returns None when ``is_stale()`` reports the load is no longer wanted
+        before it finishes.
+        """
+        data, tree = self.note_cache.parsed(node_path)
+        note = LoadedNote(node_path, data, tree)
+        stream = tree.stream
+        decoding = {}
+        lines = 0
+        for row in range(tree.row, stream.ends[tree.row]):
+            if stream.kinds[row] == stream.RTFCMD:
+                if stream.value(row) in ('par', 'line'):
+                    lines += 1
+                continue
+            if stream.kinds[row] != stream.GROUP:
+                continue
+            group = RTFTokenGroup(stream, row)
+            if self.firstRTFCommand(group) == 'pict':
+                if lines <= self.IMAGE_PRELOAD_LINES:
+                    read_picture = self.decodeRTFImageGroup
+                else:
+                    read_picture = self.readRTFPicture
+                decoding[row] = image_decode_pool.submit(read_picture, group)
+        for row, future in decoding.items():
+            if is_stale is not None and is_stale():
+                for pending in decoding.values():
+                    pending.cancel()
+                return None
+            note.images[row] = future.result()
+        return note
 
+    def startBackgroundNoteLoad(self, node, sel_path, node_path, open_in_new_tab):
+        generation = self.note_load_generation
+        worker = threading.Thread(
+            target=self._runBackgroundNoteLoad,
+            args=(generation, node, sel_path, node_path, open_in_new_tab),
+            daemon=True,
+        )
+        worker.start()
         return None
 
-    def applyRTFCommandToStyle(self, command, style, insertion_index='end'):
-        if command == 'par':
+    def _runBackgroundNoteLoad(self, generation, node, sel_path, node_path, open_in_new_tab):
+        def is_stale():
+            return generation != self.note_load_generation
+
+        try:
+            note = self.readNoteForDisplay(node_path, is_stale)
+            error = None
+        except (OSError, RTFParseError) as exc:
+            note = None
+            error = exc
+        if note is None and error is None:
+            return None
+
+        # Only inserting into the widget is left for the Tk thread.
+        self.actionQueue.put(
+            PrioritizedItem(
+                0,
+                lambda: self._showBackgroundNoteLoad(
+                    generation,
+                    node,
+                    sel_path,
+                    note,
+                    error,
+                    open_in_new_tab,
+                ),
+                "showBackgroundNoteLoad",
+            )
+        )
+        return None
+
+    def _showBackgroundNoteLoad(self, generation, node, sel_path, note, error, open_in_new_tab):
+        # The user may have moved on to another node while the note loaded.
+        if generation != self.note_load_generation or self.tree.selection() != (node,):
+            return None
+
+        if isinstance(error, OSError):
+            messagebox.showerror('Error Reading Node', f'Could not read node file: {error}')
+            return None
+        if error is not None:
+            messagebox.showerror('Error Reading Node', f'Could not parse node RTF: {error}')
+            return None
+        self.selected_node = node
+        document = self.showRTFDocument(
+            note.path,
+            sel_path,
+            note.data,
+            note.tree,
+            open_in_new_tab,
+            loaded_note=note,
+        )
+        if document is not None:
+            self.prefetchNodeNeighbours(node)
+        return document
+
+    def applyRTFParagraphCommand(self, parameter, style, insertion_index):
+        if parameter is None:
             self.insertStyledText(insertion_index, '\n', style)
-            return style
+        return style
 
-        if command == 'tab':
+    def applyRTFTabCommand(self, parameter, style, insertion_index):
+        if parameter is None:
             self.insertStyledText(insertion_index, '\t', style)
-            return style
+        return style
 
-        if command == 'pard':
+    def applyRTFLeftAlignCommand(self, parameter, style, insertion_index):
+        if parameter is None:
             style["alignment"] = "left"
-            return style
-
-        if command == 'plain':
-            return self.defaultTextStyle()
+        return style
 
-        if command == 'qc':
+    def applyRTFCenterAlignCommand(self, parameter, style, insertion_index):
+        if parameter is None:
             style["alignment"] = "center"
-            return style
+        return style
 
-        if command == 'ql':
-            style["alignment"] = "left"
-            return style
+    def applyRTFPlainCommand(self, parameter, style, insertion_index):
+        if parameter is None:
+            return self.defaultTextStyle()
+        return style
 
-        bold_match = re.fullmatch(r'b(0?)', command)
-        if bold_match:
-            style["bold"] = bold_match.group(1) != "0"
-            return style
+    def applyRTFBoldCommand(self, parameter, style, insertion_index):
+        # \b turns bold on and \b0 turns it off; other parameters are ignored.
+        if parameter in {None, 0}:
+            style["bold"] = parameter is None
+        return style
 
-        italic_match = re.fullmatch(r'i(0?)', command)
-        if italic_match:
-            style["italic"] = italic_match.group(1) != "0"
-            return style
+    def applyRTFItalicCommand(self, parameter, style, insertion_index):
+        if parameter in {None, 0}:
+            style["italic"] = parameter is None
+        return style
 
-        underline_match = re.fullmatch(r'ul(0|none)?', command)
-        if underline_match:
-            style["underline"] = underline_match.group(1) not in {"0", "none"}
-            return style
+    def applyRTFUnderlineCommand(self, parameter, style, insertion_index):
+        if parameter in {None, 0}:
+            style["underline"] = parameter is None
+        return style
 
-        color_match = re.fullmatch(r'cf(\d+)', command)
-        if color_match:
-            style["color"] = self.color_table.get(
-                int(color_match.group(1)),
-                self.DEFAULT_TEXT_COLOR,
-            )
-            return style
+    def applyRTFUnderlineNoneCommand(self, parameter, style, insertion_index):
+        if parameter is None:
+            style["underline"] = False
+        return style
 
-        font_match = re.fullmatch(r'f(\d+)', command)
-        if font_match:
+    def applyRTFColorCommand(self, parameter, style, insertion_index):
+        if parameter is not None:
+            style["color"] = self.color_table.get(parameter, self.DEFAULT_TEXT_COLOR)
+        return style
+
+    def applyRTFFontCommand(self, parameter, style, insertion_index):
+        if parameter is not None:
             style["font_family"] = self.font_table.get(
-                int(font_match.group(1)),
+                parameter,
                 self.DEFAULT_FONT_FAMILY,
             )
-            return style
-
-        size_match = re.fullmatch(r'fs(\d+)', command)
-        if size_match:
-            style["font_size"] = max(1, round(int(size_match.group(1)) / 2))
-            return style
+        return style
 
+    def applyRTFFontSizeCommand(self, parameter, style, insertion_index):
+        if parameter is not None:
+            style["font_size"] = max(1, round(parameter / 2))
         return style
 
+    # Style commands keyed by control word name. Each handler receives the
+    # word's numeric parameter (None when it has none) and returns the style.
+    RTF_STYLE_COMMANDS = {
+        'par': applyRTFParagraphCommand,
+        'tab': applyRTFTabCommand,
+        'pard': applyRTFLeftAlignCommand,
+        'ql': applyRTFLeftAlignCommand,
+        'qc': applyRTFCenterAlignCommand,
+        'plain': applyRTFPlainCommand,
+        'b': applyRTFBoldCommand,
+        'i': applyRTFItalicCommand,
+        'ul': applyRTFUnderlineCommand,
+        'ulnone': applyRTFUnderlineNoneCommand,
+        'cf': applyRTFColorCommand,
+        'f': applyRTFFontCommand,
+        'fs': applyRTFFontSizeCommand,
+    }
+
+    def applyRTFCommandToStyle(self, command, style, insertion_index='end'):
+        command = self.rtfControlWord(command)
+        handler = self.RTF_STYLE_COMMANDS.get(command.name)
+        if handler is None:
+            return style
+        return handler(self, command.parameter, style, insertion_index)
+
     def displayNestedRTFStructure(self, structure, insertion_index='end'):
         self.font_table = self.parseRTFFontTable(structure)
         self.color_table = self.parseRTFColorTable(structure)
-        self._displayNestedRTFStructure(
-            structure,
-            self.defaultTextStyle(),
-            insertion_index,
-        )
+        self.beginImageDecodeBatch()
+        self.beginStyledTextBatch(insertion_index)
+        try:
+            self._displayNestedRTFStructure(
+                structure,
+                self.defaultTextStyle(),
+                insertion_index,
+            )
+        finally:
+            self.endStyledTextBatch()
+            self.endImageDecodeBatch()
 
     def _displayNestedRTFStructure(self, structure, style, insertion_index='end'):
+        if self.displaySpecialRTFGroup(structure, style, insertion_index):
+            return None
+
+        current_style = style.copy()
+        for token in structure:
+            if self.isRTFGroup(token):
+                self._displayNestedRTFStructure(
+                    token,
+                    current_style.copy(),
+                    insertion_index,
+                )
+            else:
+                current_style = self.displayRTFToken(
+                    token,
+                    current_style,
+                    insertion_index,
+                )
+
+        return None
+
+    def displaySpecialRTFGroup(self, structure, style, insertion_index='end'):
+        """Display a group that is not plain styled text.
+
+        Returns False, displaying nothing, for an ordinary group whose tokens
+        should be displayed one by one.
+        """
         first_command = self.firstRTFCommand(structure)
         if first_command in {'fonttbl', 'colortbl'}:
-            return None
+            return True
 
         # Field instructions are hidden metadata. Clipboard RTF generated by
         # SuperText includes a standard HYPERLINK field around the custom link
         # group so external editors recognize it; only the field result should
         # be displayed when that RTF is pasted back into SuperText.
         if self.hasDirectRTFCommand(structure, 'fldinst'):
-            return None
+            return True
 
+        # Embedded objects and links read or extend the text as it is, so
+        # batched text is inserted before them.
         if first_command == 'pict':
-            return self.displayRTFImageGroup(structure, insertion_index)
+            self.flushStyledTextBatch()
+            self.displayRTFImageGroup(structure, insertion_index)
+            return True
 
         if self.hasDirectRTFCommand(structure, 'supertextlink'):
-            return self.displayRTFHyperlinkGroup(
-                structure,
-                style,
-                insertion_index,
-            )
+            self.flushStyledTextBatch()
+            self.displayRTFHyperlinkGroup(structure, style, insertion_index)
+            return True
 
         if self.hasDirectRTFCommand(structure, 'supertextfile'):
-            return self.displayRTFFileGroup(structure, insertion_index)
+            self.flushStyledTextBatch()
+            self.displayRTFFileGroup(structure, insertion_index)
+            return True
 
         if self.hasDirectRTFCommand(structure, 'supertexthr'):
-            return self.createHorizontalRule(insertion_index)
-
-        current_style = style.copy()
-        for token in structure:
-            if isinstance(token, list):
-                self._displayNestedRTFStructure(
-                    token,
-                    current_style.copy(),
-                    insertion_index,
-                )
-                continue
+            self.flushStyledTextBatch()
+            self.createHorizontalRule(insertion_index)
+            return True
 
-            token_type, token_value = token
-            if token_type in {'TEXT', 'CMDPARAM'}:
-                self.insertStyledText(insertion_index, token_value, current_style)
-            elif token_type == 'RTFCMD':
-                current_style = self.applyRTFCommandToStyle(
-                    token_value,
-                    current_style,
-                    insertion_index,
-                )
-            else:
-                print('ERROR: UNKNOWN PARSE TOKEN TO DISPLAY')
-                print(token)
+        return False
 
-        return None
+    def displayRTFToken(self, token, style, insertion_index='end'):
+        """Display one non-group token and return the style that follows it."""
+        token_type, token_value = token
+        if token_type in {'TEXT', 'CMDPARAM'}:
+            self.insertStyledText(insertion_index, token_value, style)
+        elif token_type == 'PAYLOAD':
+            self.insertStyledText(insertion_index, token_value.text, style)
+        elif token_type == 'RTFCMD':
+            return self.applyRTFCommandToStyle(token_value, style, insertion_index)
+        else:
+            print('ERROR: UNKNOWN PARSE TOKEN TO DISPLAY')
+            print(token)
+        return style
 
-    def customRTFGroupValue(self, structure, command):
+    def findCustomRTFGroup(self, structure, command):
         group = self.findRTFGroup(structure, command)
         if group is None:
             group = self.findRTFGroupWithDirectCommand(structure, command)
+        return group
+
+    def customRTFGroupValue(self, structure, command):
+        group = self.findCustomRTFGroup(structure, command)
         if group is None:
             return ''
         return ''.join(
-            value for kind, value in self.flattenRTFTokens(group)
-            if kind in {'TEXT', 'CMDPARAM'} and value.strip()
+            value.text if kind == 'PAYLOAD' else value
+            for kind, value in self.flattenRTFTokens(group)
+            if kind == 'PAYLOAD' or (kind in {'TEXT', 'CMDPARAM'} and value.strip())
         )
 
+    def customRTFGroupBytes(self, structure, command):
+        group = self.findCustomRTFGroup(structure, command)
+        payload = None if group is None else self.findRTFPayload(group)
+        if payload is not None:
+            return payload.decode()
+        return bytes.fromhex(self.customRTFGroupValue(structure, command))
+
     def displayRTFFileGroup(self, structure, insertion_index='end'):
         try:
             filename = bytes.fromhex(self.customRTFGroupValue(structure, 'supertextfilename')).decode('utf-8')
-            data = bytes.fromhex(self.customRTFGroupValue(structure, 'supertextdata'))
+            data = self.customRTFGroupBytes(structure, 'supertextdata')
         except (ValueError, UnicodeDecodeError) as exc:
             print(f'Could not decode embedded file: {exc}')
             return None
@@ -5164,6 +6168,7 @@ class RTFWindow:
             style.copy(),
             insertion_index,
         )
+        self.flushStyledTextBatch()
         if insertion_index == 'end':
             finish = self.text.index('end-1c')
         else:
@@ -5213,6 +6218,7 @@ class RTFWindow:
         open_in_new_tab=True,
         force_new_tab=False,
         reuse_open_tab=True,
+        background=False,
     ): # event is not used
         selection = self.selected_node = self.tree.selection()[0] if len(self.tree.selection()) != 0 else ''
         
@@ -5238,11 +6244,18 @@ class RTFWindow:
             self.selectDocumentTab(open_document)
             return open_document
 
+        # a newer open supersedes a preview that is still loading
+        self.note_load_generation += 1
+        loaded_note = None
         cloned_modified_document = False
         active_document = self.active_document
+        # a copy of a note that is still rendering, or unchanged since it was
+        # read, is read from disk instead
         active_document_matches = (
             force_new_tab
             and active_document is not None
+            and active_document.render_job is None
+            and (active_document.dirty or bool(active_document.text.edit_modified()))
             and self.normalizedDocumentPath(active_document.path) == normalized_path
         )
         if active_document_matches and active_document is not None:
@@ -5250,24 +6263,56 @@ class RTFWindow:
             data = self.convertToRTF('1.0', 'end')
             cloned_modified_document = active_document.dirty
             active_document.content_hash = self.documentContentHash(data)
+            # parse the RTF using the RTF parser
+            try:
+                rt = RTFParser(data, coalesce_text=True).parsecompact().root
+            except RTFParseError as exc:
+                messagebox.showerror('Error Reading Node', f'Could not parse node RTF: {exc}')
+                return None
+        elif (loaded_note := self.note_prefetcher.take(node_path)) is not None:
+            # prefetched while a neighbouring note was previewed
+            data, rt = loaded_note.data, loaded_note.tree
+        elif background:
+            # read, parsed and decoded on a worker thread, then shown from
+            # the action queue by _showBackgroundNoteLoad
+            return self.startBackgroundNoteLoad(
+                selection,
+                sel_path,
+                node_path,
+                open_in_new_tab,
+            )
         else:
+            # notes read from disk come from the shared parsed-note cache
             try:
-                with open(node_path, 'r', encoding='utf-8') as fi:
-                    data = fi.read()
-            except UnicodeDecodeError:
-                with open(node_path, 'r') as fi:
-                    data = fi.read()
+                data, rt = self.note_cache.parsed(node_path)
             except OSError as exc:
                 messagebox.showerror('Error Reading Node', f'Could not read node file: {exc}')
                 return None
+            except RTFParseError as exc:
+                messagebox.showerror('Error Reading Node', f'Could not parse node RTF: {exc}')
+                return None
 
-        # parse the RTF using the RTF parser
-        try:
-            rt = RTFParser(data).parseme()
-        except RTFParseError as exc:
-            messagebox.showerror('Error Reading Node', f'Could not parse node RTF: {exc}')
-            return None
+        return self.showRTFDocument(
+            node_path,
+            sel_path,
+            data,
+            rt,
+            open_in_new_tab,
+            cloned_modified_document,
+            loaded_note,
+        )
 
+    def showRTFDocument(
+        self,
+        node_path,
+        sel_path,
+        data,
+        rt,
+        open_in_new_tab=True,
+        cloned_modified_document=False,
+        loaded_note=None,
+    ):
+        """Show a parsed note in a new tab or in the active one."""
         # verify the header matches the expected for an RTF that this program can read
         if not self.isSupportedRTF(rt):
             messagebox.showerror('Error Reading Node', 'Unsupported RTF header')
@@ -5293,6 +6338,7 @@ class RTFWindow:
             document.relative_path = sel_path
             self.registerOpenDocumentPath(document)
 
+        self.cancelProgressiveRender(document)
         document.loading = True
         document.tkinter_imagelist = []
         document.embedded_images = {}
@@ -5309,22 +6355,30 @@ class RTFWindow:
         document.current_text_cursor = self.TEXT_CURSOR
         document.image_resize_state = None
         self.activateDocument(document)
+        document.loaded_note = loaded_note
+        # the note as read stands for the content until it is edited, so a
+        # load never serializes the rendered note again
+        document.content_hash = self.documentContentHash(data)
+
+        if len(data) >= self.PROGRESSIVE_RENDER_MIN_BYTES:
+            self.startProgressiveRender(
+                document,
+                rt,
+                dirty=cloned_modified_document,
+            )
+            return document
 
         try:
-            self.text.delete('1.0', 'end')
-            self.text.edit_reset()
-            self.displayNestedRTFStructure(rt)
             # A loaded note starts with a clean undo and modified-state baseline.
-            self.text.edit_reset()
-            self.text.edit_modified(False)
+            with self.bulkTextLoad():
+                self.text.delete('1.0', 'end')
+                self.displayNestedRTFStructure(rt)
             document.dirty = False
-            document.content_hash = self.documentContentHash(
-                self.convertToRTF('1.0', 'end')
-            )
             self.captureActiveDocumentState()
             self.updateDocumentTabTitle(document)
         finally:
             document.loading = False
+            document.loaded_note = None
 
         if cloned_modified_document:
             self.text.edit_modified(True)
@@ -5425,11 +6479,13 @@ class RTFWindow:
 
         return ''.join(commands)
 
-    def currentDumpStyle(self, active_style_tags):
+    def currentDumpStyle(self, active_style_tags, style_tags=None):
+        if style_tags is None:
+            style_tags = self.style_tags
         style = self.defaultTextStyle()
         for tag in active_style_tags:
-            if tag in self.style_tags:
-                style.update(self.style_tags[tag])
+            if tag in style_tags:
+                style.update(style_tags[tag])
         return style
 
     def hyperlinkRTFGroupPrefix(self, link, standard_hyperlink=False):
@@ -5456,31 +6512,128 @@ class RTFWindow:
     def hyperlinkRTFGroupSuffix(self, standard_hyperlink=False):
         return '}}}}' if standard_hyperlink else '}}'
 
-    def convertDumpToRTFBody(
-        self,
-        textContents,
-        initial_style_tags=None,
-        initial_hyperlink_tags=None,
-        standard_hyperlinks=False,
-    ):
-        body = ''
+    def snapshotRTF(self, start, finish, document=None):
+        """Capture what writeRTFSnapshot needs from the editor for a range.
+
+        ``document`` captures a tab other than the active one.
+        """
+        if document is None or document is self.active_document:
+            text = self.text
+            embedded_images = self.embedded_images
+            style_tags = self.style_tags
+            hyperlink_tags = self.hyperlink_tags
+            embedded_files = self.embedded_files
+            horizontal_rules = self.horizontal_rules
+        else:
+            text = document.text
+            embedded_images = document.embedded_images
+            style_tags = document.style_tags
+            hyperlink_tags = document.hyperlink_tags
+            embedded_files = document.embedded_files
+            horizontal_rules = document.horizontal_rules
+        if finish == 'end':
+            finish = 'end-1c'
+        start_tags = text.tag_names(start)
+        contents = text.dump(start, finish)
+
+        pictures = {}
+        photos = {}
+        for token_type, token_value, _ in contents:
+            if token_type != 'image':
+                continue
+            image_data = embedded_images.get(token_value)
+            if image_data is not None and image_data.get("blip") is not None:
+                pictures[token_value] = EmbeddedPicture(
+                    image_data["data"],
+                    image_data["blip"],
+                    image_data["size"],
+                )
+                continue
+            displayed_image = None
+            if text is self.text:
+                photo = self.getPhotoImageForEmbeddedImage(token_value)
+            elif image_data is not None:
+                photo = image_data["photo"]
+                if photo is None and image_data.get("data") is not None:
+                    # still a placeholder; read from the bytes it was loaded from
+                    displayed_image = self.decodeEmbeddedPicture(image_data["data"])
+            else:
+                try:
+                    photo = self.findTkImageByName(text.image_cget(token_value, 'image'))
+                except tk.TclError:
+                    photo = None
+            if photo is not None:
+                # Tk photos can only be read here; the copy is encoded later
+                displayed_image = ImageTk.getimage(photo)
+            if displayed_image is None:
+                continue
+            pictures[token_value] = EmbeddedPicture(
+                b'',
+                None,
+                displayed_image.size,
+                displayed_image,
+            )
+            if image_data is not None and photo is not None:
+                photos[token_value] = photo
+
+        return RTFSnapshot(
+            contents,
+            [tag for tag in start_tags if tag in style_tags],
+            [tag for tag in start_tags if tag in hyperlink_tags],
+            # color names are resolved by Tk, so they are normalized here too
+            {
+                tag: (
+                    {**style, "color": self.normalizeColor(style["color"])}
+                    if "color" in style
+                    else dict(style)
+                )
+                for tag, style in style_tags.items()
+            },
+            dict(hyperlink_tags),
+            pictures,
+            dict(embedded_files),
+            set(horizontal_rules),
+            photos,
+        )
+
+    def storeEncodedPictures(self, embedded_images, snapshot):
+        """Keep the PNG encodings made while writing a snapshot for later saves."""
+        for name, photo in snapshot.photos.items():
+            image_data = embedded_images.get(name)
+            picture = snapshot.pictures[name]
+            # a picture resized since the snapshot shows another photo
+            if image_data is None or image_data.get("photo") is not photo or picture.blip is None:
+                continue
+            image_data.update(
+                data=picture.data,
+                blip=picture.blip,
+                size=picture.size,
+            )
+
+    def convertDumpToRTFBody(self, snapshot, standard_hyperlinks=False):
+        # Chunks are str, or bytes written out as hex by writeRTFChunks, so
+        # picture and attachment data is never copied into the document text.
+        body = []
+        write = body.append
         font_ids = {self.DEFAULT_FONT_FAMILY: 0}
         color_ids = {}
-        active_style_tags = list(initial_style_tags or [])
-        active_hyperlink_tags = list(initial_hyperlink_tags or [])
+        style_tags = snapshot.style_tags
+        hyperlink_tags = snapshot.hyperlink_tags
+        active_style_tags = list(snapshot.initial_style_tags)
+        active_hyperlink_tags = list(snapshot.initial_hyperlink_tags)
         active_padding_tags = []
         has_formatting = False
 
         for tag in active_hyperlink_tags:
-            link = self.hyperlink_tags.get(tag)
+            link = hyperlink_tags.get(tag)
             if link is not None:
-                body += self.hyperlinkRTFGroupPrefix(
+                write(self.hyperlinkRTFGroupPrefix(
                     link,
                     standard_hyperlinks,
-                )
+                ))
                 has_formatting = True
 
-        for token_type, token_value, _ in textContents:
+        for token_type, token_value, _ in snapshot.contents:
             if token_type == 'tagon' and self.isAlignmentPaddingTag(token_value):
                 active_padding_tags.append(token_value)
                 continue
@@ -5489,7 +6642,7 @@ class RTFWindow:
                 active_padding_tags.remove(token_value)
                 continue
 
-            if token_type == 'tagon' and token_value in self.style_tags:
+            if token_type == 'tagon' and token_value in style_tags:
                 # A dump that starts exactly at a tag boundary includes a
                 # ``tagon`` event for a tag already captured at ``start``.
                 # Keep the active tags unique so the matching ``tagoff`` fully
@@ -5502,20 +6655,20 @@ class RTFWindow:
                 active_style_tags.remove(token_value)
                 continue
 
-            if token_type == 'tagon' and token_value in self.hyperlink_tags:
+            if token_type == 'tagon' and token_value in hyperlink_tags:
                 if token_value not in active_hyperlink_tags:
                     # Tk can report an adjacent range's ``tagon`` before the
                     # previous range's ``tagoff`` at the same character.
                     # Normalize that boundary so custom link groups never
                     # become accidentally nested.
-                    body += self.hyperlinkRTFGroupSuffix(
+                    write(self.hyperlinkRTFGroupSuffix(
                         standard_hyperlinks,
-                    ) * len(active_hyperlink_tags)
+                    ) * len(active_hyperlink_tags))
                     active_hyperlink_tags.clear()
-                    body += self.hyperlinkRTFGroupPrefix(
-                        self.hyperlink_tags[token_value],
+                    write(self.hyperlinkRTFGroupPrefix(
+                        hyperlink_tags[token_value],
                         standard_hyperlinks,
-                    )
+                    ))
                     active_hyperlink_tags.append(token_value)
                     has_formatting = True
                 continue
@@ -5524,33 +6677,37 @@ class RTFWindow:
                 # Hyperlinks created by the editor do not overlap. Closing the
                 # active custom group here preserves the exact tagged range.
                 active_hyperlink_tags.remove(token_value)
-                body += self.hyperlinkRTFGroupSuffix(standard_hyperlinks)
+                write(self.hyperlinkRTFGroupSuffix(standard_hyperlinks))
                 continue
 
             if token_type == 'image':
-                real_image = self.getPhotoImageForEmbeddedImage(token_value)
-
-                if real_image is None:
+                picture = snapshot.pictures.get(token_value)
+                if picture is None:
                     continue
-
-                ibytes = io.BytesIO()
-                shifted_img = ImageTk.getimage(real_image)
-                imgx, imgy = shifted_img.size
-                shifted_img.save(ibytes, 'PNG')
-                body += r'{\pict\pngblip' + rf'\picw{int(imgx*self.rtf_img_factor)}\pich{int(imgy*self.rtf_img_factor)} ' + ibytes.getvalue().hex() + '}'
+                if picture.blip is None:
+                    # resized pictures and clipboard grabs have no stored bytes
+                    ibytes = io.BytesIO()
+                    picture.image.save(ibytes, 'PNG')
+                    picture.data = ibytes.getvalue()
+                    picture.blip = 'pngblip'
+                imgx, imgy = picture.size
+                write('{\\pict\\' + picture.blip + rf'\picw{int(imgx*self.rtf_img_factor)}\pich{int(imgy*self.rtf_img_factor)} ')
+                write(picture.data)
+                write('}')
                 continue
 
-            if token_type == 'window' and token_value in self.embedded_files:
-                attachment = self.embedded_files[token_value]
+            if token_type == 'window' and token_value in snapshot.files:
+                attachment = snapshot.files[token_value]
                 filename_hex = attachment['filename'].encode('utf-8').hex()
-                data_hex = attachment['data'].hex()
-                body += (r'{\*\supertextfile '
-                         r'{\supertextfilename ' + filename_hex + '}'
-                         r'{\supertextdata ' + data_hex + '}}')
+                write(r'{\*\supertextfile '
+                      r'{\supertextfilename ' + filename_hex + '}'
+                      r'{\supertextdata ')
+                write(attachment['data'])
+                write('}}')
                 continue
 
-            if token_type == 'window' and token_value in self.horizontal_rules:
-                body += r'{\*\supertexthr }'
+            if token_type == 'window' and token_value in snapshot.horizontal_rules:
+                write(r'{\*\supertexthr }')
                 continue
 
             if token_type != 'text':
@@ -5560,17 +6717,17 @@ class RTFWindow:
                 continue
 
             text = self.escapeRTFText(token_value)
-            style = self.currentDumpStyle(active_style_tags)
+            style = self.currentDumpStyle(active_style_tags, style_tags)
             style_prefix = self.styleRTFCommandPrefix(style, font_ids, color_ids)
             if style_prefix:
                 has_formatting = True
-                body += '{' + style_prefix + ' ' + text + '}'
+                write('{' + style_prefix + ' ' + text + '}')
             else:
-                body += text
+                write(text)
 
-        body += self.hyperlinkRTFGroupSuffix(
+        write(self.hyperlinkRTFGroupSuffix(
             standard_hyperlinks,
-        ) * len(active_hyperlink_tags)
+        ) * len(active_hyperlink_tags))
         return body, font_ids, color_ids, has_formatting
 
     def rangeHasFormatting(self, start, finish):
@@ -5661,72 +6818,235 @@ class RTFWindow:
         except (LookupError, UnicodeEncodeError):
             pass
     
-    # convert a text selection to RTF
-    # start to finish of selection
-    def convertToRTF(self, start, finish, standard_hyperlinks=False):
-        # get the text contents including images
-        # tkinter proves "dump" for this
-        if finish == 'end':
-            finish = 'end-1c'
-        initial_style_tags = [
-            tag for tag in self.text.tag_names(start)
-            if tag in self.style_tags
-        ]
-        initial_hyperlink_tags = [
-            tag for tag in self.text.tag_names(start)
-            if tag in self.hyperlink_tags
-        ]
-        textContents = self.text.dump(start, finish)
+    def writeRTFChunks(self, sink, header, chunks):
+        """Write a header and body chunks to ``sink`` as one RTF document.
+
+        Whitespace at the ends of the document is dropped and the closing
+        brace added. Bytes chunks are written as hex a block at a time.
+        """
+        end = len(chunks)
+        while end and isinstance(chunks[end - 1], str) and not chunks[end - 1].strip():
+            end -= 1
+        if end:
+            sink.write(header.lstrip())
+        else:
+            sink.write(header.strip())
+        for position in range(end):
+            chunk = chunks[position]
+            if position == end - 1 and isinstance(chunk, str):
+                chunk = chunk.rstrip()
+            if isinstance(chunk, str):
+                sink.write(chunk)
+                continue
+            view = memoryview(chunk)
+            for offset in range(0, len(view), self.RTF_HEX_BLOCK_BYTES):
+                sink.write(view[offset:offset + self.RTF_HEX_BLOCK_BYTES].hex())
+        sink.write('}')
 
+    def writeRTFSnapshot(self, sink, snapshot, standard_hyperlinks=False):
+        """Write a snapshot to a file-like sink as RTF, away from Tk if need be."""
         body, font_ids, color_ids, has_formatting = self.convertDumpToRTFBody(
-            textContents,
-            initial_style_tags,
-            initial_hyperlink_tags,
+            snapshot,
             standard_hyperlinks,
         )
 
         if has_formatting or color_ids or len(font_ids) > 1:
-            data = self.buildRTFHeader(font_ids, color_ids) + body
+            header = self.buildRTFHeader(font_ids, color_ids)
         else:
-            data = self.RTF_HEADER + body
+            header = self.RTF_HEADER
 
-        data = data.strip() # this is cleaner to remove extra whitespace
-        data += '}'
-        
-        return data
+        self.writeRTFChunks(sink, header, body)
+
+    # write a text selection as RTF to a file-like sink
+    # start to finish of selection
+    def writeRTF(self, sink, start, finish, standard_hyperlinks=False):
+        snapshot = self.snapshotRTF(start, finish)
+        self.writeRTFSnapshot(sink, snapshot, standard_hyperlinks)
+        self.storeEncodedPictures(self.embedded_images, snapshot)
+
+    # convert a text selection to RTF
+    def convertToRTF(self, start, finish, standard_hyperlinks=False):
+        sink = io.StringIO()
+        self.writeRTF(sink, start, finish, standard_hyperlinks)
+        return sink.getvalue()
     
     # save an RTF file that is open
-    def writeCurrentDocument(self, show_confirmation=True):
+    def writeCurrentDocument(self, show_confirmation=True, background=False):
+        """Save the active note.
+
+        Only the snapshot of the editor is taken here; writeNoteFile writes it
+        on the note writer thread. A background save marks the note saved
+        straight away and finishNoteWrite reports the outcome from the action
+        queue, or when the tab is closed first; otherwise this waits for the
+        write.
+        """
         if self.openFile == '':
             messagebox.showerror(title='No open files to save', message='No open files to save')
             return False
+        if self.active_document is not None and self.active_document.render_job is not None:
+            messagebox.showerror('Error Saving Note', 'The note is still loading.')
+            return False
+
+        document = self.active_document
+        note_path = self.openFile
+        snapshot = self.snapshotRTF('1.0', 'end')
+        if background:
+            self.startNoteWrite(document, note_path, snapshot, show_confirmation)
+            return True
 
-        data = self.convertToRTF('1.0', 'end')
+        write = note_write_pool.submit(self.writeNoteFile, note_path, snapshot)
         try:
-            with open(self.openFile, 'w', encoding='utf-8') as fi:
-                fi.write(data)
-            self.search_index.update_file(self.openFile)
+            content_hash = write.result()
         except OSError as exc:
             messagebox.showerror('Error Saving Note', f'Could not save note: {exc}')
             return False
 
-        if self.active_document is not None:
-            self.active_document.path = self.openFile
-            self.active_document.dirty = False
-            self.text.edit_modified(False)
+        self.storeEncodedPictures(self.embedded_images, snapshot)
+        if document is not None:
+            self.markDocumentSaved(document, note_path, content_hash)
+        if show_confirmation:
+            messagebox.showinfo(title='Saved file', message='Saved file')
+        return True
+
+    def startNoteWrite(
+        self,
+        document,
+        note_path,
+        snapshot,
+        show_confirmation,
+        skip_unchanged=False,
+    ):
+        """Write a note snapshot in the background, reported by finishNoteWrite."""
+        if document is not None:
+            # edits made while the note is written mark it modified again
+            self.markDocumentSaved(document, note_path, '')
+        write = note_write_pool.submit(
+            self.writeNoteFile,
+            note_path,
+            snapshot,
+            skip_unchanged,
+        )
+
+        def finish_write():
+            self.finishNoteWrite(document, note_path, snapshot, write, show_confirmation)
+
+        if document is not None:
+            document.pending_writes[write] = finish_write
+        write.add_done_callback(
+            lambda write: self.actionQueue.put(
+                PrioritizedItem(0, finish_write, "finishNoteWrite")
+            )
+        )
+        return write
+
+    def markDocumentSaved(self, document, note_path, content_hash):
+        """Mark a document clean; an empty hash is filled in later."""
+        document.path = note_path
+        document.dirty = False
+        document.content_hash = content_hash
+        self.cancelDocumentAutosave(document)
+        document.text.edit_modified(False)
+        if document is self.active_document:
             self.captureActiveDocumentState()
-            self.updateDocumentTabTitle(self.active_document)
-            self.synchronizeOpenDocumentCopies(
-                self.active_document,
-                data=data,
-                dirty=False,
+        self.updateDocumentTabTitle(document)
+        self.synchronizeOpenDocumentCopies(
+            document,
+            dirty=False,
+            content_hash=content_hash or None,
+        )
+
+    def writeNoteFile(self, note_path, snapshot, skip_unchanged=False):
+        """Write a note snapshot over the note and return its content hash.
+
+        Runs on the note writer thread. The note is written next to itself,
+        synced and renamed over it, so a failed save leaves the previous
+        version in place. With ``skip_unchanged`` the written copy is dropped
+        instead when the note on disk already holds the same text, so the
+        note is left untouched.
+        """
+        note_directory, note_name = os.path.split(note_path)
+        temporary_path = os.path.join(note_directory, '.' + note_name + '.tmp')
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as fi:
+                sink = HashingWriter(fi)
+                self.writeRTFSnapshot(sink, snapshot)
+                if skip_unchanged and self.noteFileHash(note_path) == sink.hexdigest():
+                    return sink.hexdigest()
+                fi.flush()
+                os.fsync(fi.fileno())
+                # renaming the note keeps this signature
+                note_stat = os.fstat(fi.fileno())
+            os.replace(temporary_path, note_path)
+        finally:
+            if os.path.exists(temporary_path):
+                try:
+                    os.remove(temporary_path)
+                except OSError:
+                    pass
+
+        # a save within the filesystem's timestamp resolution could keep
+        # the same signature, so the cached parse is dropped explicitly
+        self.note_cache.discard(note_path)
+        self.note_prefetcher.discard(note_path)
+        try:
+            # indexed from the text just saved rather than by parsing the file
+            self.search_index.update_text(
+                note_path,
+                ''.join(self.dumpTextWithoutAlignmentPadding(snapshot.contents)),
+                note_stat,
             )
+        except Exception as exc:
+            # the next search refreshes the index from the saved note
+            self.LogWithDateTime('Could not index saved note:', exc)
+        return sink.hexdigest()
+
+    def noteFileHash(self, note_path):
+        """documentContentHash of a UTF-8 note on disk, or None if unreadable."""
+        digest = hashlib.sha256()
+        try:
+            with open(note_path, 'rb') as saved_note:
+                for block in iter(lambda: saved_note.read(1024 * 1024), b''):
+                    digest.update(block)
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    def finishNoteWrite(self, document, note_path, snapshot, write, show_confirmation):
+        """Report a background save once the note writer thread is done."""
+        if document is not None:
+            if write not in document.pending_writes:
+                # already reported when its tab was closed
+                return None
+            del document.pending_writes[write]
+        still_open = (
+            document is not None
+            and self.open_documents_by_tab.get(document.tab_id) is document
+            and document.path == note_path
+        )
+        try:
+            content_hash = write.result()
+        except Exception as exc:
+            # the note was marked saved when the save started
+            if still_open:
+                document.text.edit_modified(True)
+                document.dirty = True
+                self.updateDocumentTabTitle(document)
+            messagebox.showerror('Error Saving Note', f'Could not save note: {exc}')
+            return None
+
+        if still_open:
+            self.storeEncodedPictures(document.embedded_images, snapshot)
+            if not document.content_hash:
+                document.content_hash = content_hash
         if show_confirmation:
             messagebox.showinfo(title='Saved file', message='Saved file')
-        return True
+        return None
 
     def saveRTF(self):
-        return self.writeCurrentDocument(show_confirmation=True)
+        return self.writeCurrentDocument(
+            show_confirmation=True,
+            background=self.start_worker,
+        )
 
     def reloadCurrentDocument(self, event=None):
         """Replace every open copy of the active node with its saved contents."""
@@ -5757,13 +7077,7 @@ class RTFWindow:
             return 'break'
 
         try:
-            try:
-                with open(document.path, 'r', encoding='utf-8') as fi:
-                    data = fi.read()
-            except UnicodeDecodeError:
-                with open(document.path, 'r') as fi:
-                    data = fi.read()
-            rt = RTFParser(data).parseme()
+            data, rt = self.note_cache.parsed(document.path)
         except (OSError, RTFParseError) as exc:
             messagebox.showerror(
                 'Error Reloading Node',
@@ -5991,6 +7305,8 @@ class RTFWindow:
             
             shutil.rmtree(path)
             os.remove(path + '.rtf')
+            self.note_cache.discard(path + '.rtf')
+            self.note_prefetcher.discard(path + '.rtf')
             self.removeNodeFromOrdering(relative_path)
             self.closeDocumentsUnderNodePath(path)
         else:
@@ -6026,6 +7342,8 @@ class RTFWindow:
 
         shutil.move(old_path_withnodedir, newpath)
         shutil.move(old_path_withnodedir + '.rtf', newpath + '.rtf')
+        self.note_cache.discard(old_path_withnodedir + '.rtf')
+        self.note_prefetcher.discard(old_path_withnodedir + '.rtf')
         self.remapOpenDocumentPaths(old_path_withnodedir, newpath)
         
         old_parent_path = os.path.dirname(os.path.normpath(old_path))
@@ -6261,8 +7579,7 @@ class RTFWindow:
                 self.replaceTextSelectionForPaste()
                 for path in clipboard_files:
                     try:
-                        with Image.open(path) as opened_image:
-                            self.createEmbeddedImage('insert', opened_image)
+                        self.createEmbeddedPicture('insert', self.readPictureFile(path))
                     except (OSError, ValueError):
                         try:
                             with open(path, 'rb') as source:
@@ -6280,8 +7597,7 @@ class RTFWindow:
                 self.replaceTextSelectionForPaste()
                 for path in clipimg:
                     try:
-                        with Image.open(path) as opened_image:
-                            self.createEmbeddedImage('insert', opened_image)
+                        self.createEmbeddedPicture('insert', self.readPictureFile(path))
                     except (OSError, ValueError):
                         with open(path, 'rb') as source:
                             self.createEmbeddedFile('insert', os.path.basename(path), source.read())
@@ -6292,15 +7608,16 @@ class RTFWindow:
             self.createEmbeddedImage('insert', clipimg)
         else: # rtf data on the clipboard
             # parse it and display it as normal, to facilitate being able to copy-paste within SuperText
-            parsed_clip = RTFParser(clip_rtf_data).parseme()
-            self.replaceTextSelectionForPaste()
-            paste_mark = '__paste_insert'
-            self.text.mark_set(paste_mark, 'insert')
-            self.text.mark_gravity(paste_mark, 'right')
-            try:
-                self.displayNestedRTFStructure(parsed_clip, paste_mark)
-            finally:
-                self.text.mark_unset(paste_mark)
+            parsed_clip = RTFParser(clip_rtf_data, coalesce_text=True).parsecompact().root
+            with self.bulkTextLoad(undoable=True):
+                self.replaceTextSelectionForPaste()
+                paste_mark = '__paste_insert'
+                self.text.mark_set(paste_mark, 'insert')
+                self.text.mark_gravity(paste_mark, 'right')
+                try:
+                    self.displayNestedRTFStructure(parsed_clip, paste_mark)
+                finally:
+                    self.text.mark_unset(paste_mark)
             #print(parsed_clip)
         return 'break'
 
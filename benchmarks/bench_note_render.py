@@ -0,0 +1,118 @@
+"""Measure how long the editor takes to render a parsed note into Tk.
+
+Needs a display. Run from the repository root:
+
+    python3 -m benchmarks.bench_note_render
+"""
+
+import argparse
+import configparser
+import contextlib
+import importlib.util
+from pathlib import Path
+import tempfile
+import time
+import tkinter as tk
+from unittest import mock
+
+from benchmarks import samples
+from src.RTFParser import RTFParser
+
+
+APP_PATH = Path(__file__).resolve().parents[1] / "__main__.py"
+# Average bytes per word in samples.text_heavy_note.
+BYTES_PER_WORD = 7
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("supertext_app", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
+
+
+class CountingTk:
+    # Stands in for a widget's Tcl interpreter and counts the commands sent
+    # through it.
+    def __init__(self, tk_app):
+        self._tk = tk_app
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return self._tk.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._tk, name)
+
+
+def render(window, structure):
+    window.text.delete("1.0", "end")
+    started = time.perf_counter()
+    window.displayNestedRTFStructure(structure)
+    window.window.update_idletasks()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    try:
+        app = load_app()
+    except tk.TclError as exc:
+        raise SystemExit(f"Tk is unavailable: {exc}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = Path(directory) / "rtfjournal.ini"
+        config = configparser.ConfigParser(interpolation=None)
+        config["constants"] = {
+            "RTF_HEADER": samples.RTF_HEADER.rstrip(),
+            "nodeDir": str(Path(directory) / "nodes"),
+        }
+        with open(config_path, "w", encoding="utf-8") as config_file:
+            config.write(config_file)
+
+        try:
+            window = app.RTFWindow(
+                configFile=str(config_path),
+                start_mainloop=False,
+                start_worker=False,
+            )
+        except tk.TclError as exc:
+            raise SystemExit(f"Tk is unavailable: {exc}")
+        window.window.withdraw()
+        window.text.configure(state="normal")
+        text_widget = window.text.widget
+        counter = text_widget.tk = CountingTk(text_widget.tk)
+
+        data = samples.text_heavy_note(args.words * BYTES_PER_WORD)
+        structure = RTFParser(data, coalesce_text=True).parsecompact().root
+
+        # "per-token" is the renderer with batching turned off, which sends
+        # one insert per text token as the editor did before.
+        modes = (
+            ("per-token", lambda: mock.patch.object(
+                window, "beginStyledTextBatch", lambda index: None
+            )),
+            ("batched", contextlib.nullcontext),
+        )
+        print(f"{'renderer':<10} {'seconds':>9} {'Tcl calls':>10}")
+        results = {}
+        for label, patch in modes:
+            best = float("inf")
+            for _ in range(args.repeat):
+                with patch():
+                    counter.calls = 0
+                    best = min(best, render(window, structure))
+                    calls = counter.calls
+            results[label] = best
+            print(f"{label:<10} {best:>9.3f} {calls:>10}")
+        print(f"speedup    {results['per-token'] / results['batched']:>9.1f}x")
+        window.window.destroy()
+
+
+if __name__ == "__main__":
+    main()
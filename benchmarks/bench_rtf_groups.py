@@ -0,0 +1,62 @@
+"""Measure the parser's per-group cost on notes with many style groups.
+
+Run from the repository root:
+
+    python3 -m benchmarks.bench_rtf_groups
+"""
+
+import argparse
+import sys
+
+from benchmarks import reference_rtfparser, samples
+from benchmarks.bench_rtfparser import best_time
+from src.RTFParser import RTFParser
+
+
+PARSERS = (
+    ("reference", lambda text: reference_rtfparser.RTFParser(text).parseme()),
+    ("current", lambda text: RTFParser(text).parseme()),
+)
+
+
+def nesting_result(parse, depth):
+    try:
+        parse(samples.nested_note(depth))
+    except RecursionError:
+        return "RecursionError"
+    return "ok"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--groups",
+        type=int,
+        nargs="+",
+        default=[10_000, 50_000],
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Each note is timed against a twin holding the same commands and words
+    # without braces; the difference is the cost of the groups themselves.
+    print(f"{'groups':>8} {'parser':<10} {'grouped s':>10} {'flat s':>8} {'us/group':>9}")
+    for groups in args.groups:
+        grouped = samples.style_group_note(groups, grouped=True)
+        flat = samples.style_group_note(groups, grouped=False)
+        for label, parse in PARSERS:
+            grouped_seconds = best_time(parse, grouped, args.repeat)
+            flat_seconds = best_time(parse, flat, args.repeat)
+            per_group = (grouped_seconds - flat_seconds) / groups * 1e6
+            print(
+                f"{groups:>8} {label:<10} {grouped_seconds:>10.3f} "
+                f"{flat_seconds:>8.3f} {per_group:>9.2f}"
+            )
+
+    depth = sys.getrecursionlimit() * 2
+    for label, parse in PARSERS:
+        print(f"nesting depth {depth}: {label} -> {nesting_result(parse, depth)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Measure RTF parsing throughput against the previous character walker.
+
+Run from the repository root:
+
+    python3 -m benchmarks.bench_rtfparser
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+
+from benchmarks import reference_rtfparser, samples
+from src.RTFParser import RTFParser
+
+
+def best_time(parse, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(data)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def peak_allocation(parse, data):
+    tracemalloc.start()
+    try:
+        parse(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def picture_groups(structure):
+    for token in structure:
+        if not isinstance(token, tuple):
+            if token and token[0] == ("RTFCMD", "pict"):
+                yield token
+            else:
+                yield from picture_groups(token)
+
+
+def flatten(structure):
+    for token in structure:
+        if isinstance(token, list):
+            yield from flatten(token)
+        else:
+            yield token
+
+
+def reference_load(text):
+    # Parse, then rebuild every picture the way the editor did before hex
+    # payload tokens: filter and join the text tokens, strip, then decode.
+    images = []
+    for group in picture_groups(reference_rtfparser.RTFParser(text).parseme()):
+        hex_chunks = [
+            value for kind, value in flatten(group)
+            if kind in {"TEXT", "CMDPARAM"}
+            and value.strip()
+            and re.fullmatch(r"[0-9a-fA-F\s]+", value)
+        ]
+        images.append(bytes.fromhex(
+            "".join(hex_chunks).replace("\r", "").replace("\n", "").replace(" ", "")
+        ))
+    return images
+
+
+def current_load(text, coalesce_text=False):
+    images = []
+    for group in picture_groups(RTFParser(text, coalesce_text=coalesce_text).parseme()):
+        for kind, value in group:
+            if kind == "PAYLOAD":
+                images.append(value.decode())
+    return images
+
+
+def compact_load(text):
+    images = []
+    for group in picture_groups(RTFParser(text, coalesce_text=True).parsecompact().root):
+        for kind, value in group:
+            if kind == "PAYLOAD":
+                images.append(value.decode())
+    return images
+
+
+def count_tokens(structure):
+    return sum(
+        1 if isinstance(token, tuple) else count_tokens(token)
+        for token in structure
+    )
+
+
+def expand_payloads(structure, text_kind="TEXT"):
+    # Payload tokens stand for the whitespace and hex runs the previous parser
+    # emitted one by one, so trees are compared in that expanded form.
+    expanded = []
+    for token in structure:
+        if isinstance(token, list):
+            expanded.append(expand_payloads(token, "CMDPARAM"))
+        elif token[0] == "PAYLOAD":
+            expanded.extend(
+                (text_kind, run)
+                for run in re.findall(r"[ \t\f\r\n]|[^ \t\f\r\n]+", token[1].text)
+            )
+        else:
+            expanded.append(token)
+    return expanded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    size = int(args.size_mb * 1024 * 1024)
+    documents = (
+        ("text-heavy", samples.text_heavy_note(size)),
+        ("image-heavy", samples.image_heavy_note(size)),
+        ("wrapped-hex", samples.image_heavy_note(size, line_length=128)),
+    )
+
+    print(f"{'document':<12} {'parser':<10} {'seconds':>9} {'MB/s':>9} "
+          f"{'load s':>9} {'peak MB':>9} {'tree MB':>9} {'tokens':>10}")
+    for name, data in documents:
+        megabytes = len(data) / (1024 * 1024)
+        expected = reference_rtfparser.RTFParser(data).parseme()
+        if expand_payloads(RTFParser(data).parseme()) != expected:
+            raise SystemExit(f"{name}: parsers disagree on the token tree")
+        if current_load(data) != reference_load(data):
+            raise SystemExit(f"{name}: parsers disagree on the decoded images")
+
+        # "coalesced" merges adjacent text and whitespace into one token, and
+        # "compact" keeps those tokens as array-backed spans, the way the
+        # editor and note cache load notes.
+        if compact_load(data) != reference_load(data):
+            raise SystemExit(f"{name}: compact stream disagrees on the decoded images")
+        timings = (
+            ("reference", lambda text: reference_rtfparser.RTFParser(text).parseme(),
+             reference_load),
+            ("current", lambda text: RTFParser(text).parseme(), current_load),
+            ("coalesced", lambda text: RTFParser(text, coalesce_text=True).parseme(),
+             lambda text: current_load(text, coalesce_text=True)),
+            ("compact", lambda text: RTFParser(text, coalesce_text=True).parsecompact().root,
+             compact_load),
+        )
+        results = {}
+        for label, parse, load in timings:
+            seconds = best_time(parse, data, args.repeat)
+            load_seconds = best_time(load, data, args.repeat)
+            peak = peak_allocation(load, data) / (1024 * 1024)
+            # Memory allocated while building the token tree, which is what a
+            # loaded note keeps alive.
+            tree_peak = peak_allocation(parse, data) / (1024 * 1024)
+            tokens = count_tokens(parse(data))
+            results[label] = seconds
+            print(f"{name:<12} {label:<10} {seconds:>9.3f} {megabytes / seconds:>9.1f} "
+                  f"{load_seconds:>9.3f} {peak:>9.1f} {tree_peak:>9.1f} {tokens:>10}")
+        print(f"{name:<12} speedup    {results['reference'] / results['current']:>9.1f}x "
+              f"(coalesced {results['reference'] / results['coalesced']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
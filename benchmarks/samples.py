@@ -0,0 +1,80 @@
+"""Synthetic notes shaped like the RTF that SuperText writes."""
+
+import random
+
+RTF_HEADER = r"{\rtf1\ansi\pard {\fonttbl\f0\fswiss Consolas;}\f0 "
+
+WORDS = (
+    "note", "meeting", "server", "deploy", "ticket", "review", "draft",
+    "customer", "update", "backup", "invoice", "schedule", "the", "a", "and",
+    "with", "for", "after", "before", "release", "screenshot", "paste",
+)
+
+
+def text_heavy_note(size_bytes, seed=1):
+    """Prose with the formatted runs and paragraph groups the editor emits."""
+    rng = random.Random(seed)
+    parts = [RTF_HEADER]
+    length = len(RTF_HEADER)
+    while length < size_bytes:
+        roll = rng.random()
+        if roll < 0.04:
+            piece = r"{\par }"
+        elif roll < 0.08:
+            piece = r"{\b " + rng.choice(WORDS) + "}"
+        elif roll < 0.10:
+            piece = r"{\i\fs28 " + rng.choice(WORDS) + " " + rng.choice(WORDS) + "}"
+        else:
+            piece = rng.choice(WORDS) + " "
+        parts.append(piece)
+        length += len(piece)
+    parts.append("}")
+    return "".join(parts)
+
+
+def image_heavy_note(size_bytes, images=4, seed=2, line_length=None):
+    """A short note dominated by hex-encoded ``\\pict`` screenshots.
+
+    SuperText writes picture hex on one line; pass ``line_length`` to wrap it
+    the way word processors do in pasted RTF.
+    """
+    rng = random.Random(seed)
+    image_hex_length = max(2, size_bytes // images // 2 * 2)
+    parts = [RTF_HEADER, "Screenshots from the incident"]
+    for index in range(images):
+        payload = rng.randbytes(image_hex_length // 2).hex()
+        if line_length:
+            payload = "\r\n".join(
+                payload[start:start + line_length]
+                for start in range(0, len(payload), line_length)
+            )
+        parts.append(
+            r"{\par }Figure " + str(index + 1) + r"{\par }"
+            + r"{\pict\pngblip\picw12000\pich9000 " + payload + "}"
+        )
+    parts.append("}")
+    return "".join(parts)
+
+
+def style_group_note(groups, grouped=True, seed=3):
+    """One formatted run per group, as convertDumpToRTFBody writes them.
+
+    With ``grouped=False`` the same commands and words are written without
+    braces, so the two variants differ only in their group structure.
+    """
+    rng = random.Random(seed)
+    styles = (r"\b", r"\i", r"\ul", r"\fs28", r"\cf1", r"\b\i", r"\f1\fs20")
+    open_brace, close_brace = ("{", "}") if grouped else ("", " ")
+    parts = [RTF_HEADER]
+    for _ in range(groups):
+        parts.append(
+            open_brace + rng.choice(styles) + " " + rng.choice(WORDS) + close_brace
+            + rng.choice(WORDS) + " "
+        )
+    parts.append("}")
+    return "".join(parts)
+
+
+def nested_note(depth):
+    """Pasted RTF whose groups nest ``depth`` levels deep."""
+    return RTF_HEADER + r"{\b x " * depth + "}" * depth + "}"
@@ -1,146 +1,665 @@
+from array import array
+import re
+
+
 class RTFParseError(ValueError):
     pass
 
 
+class RTFControlWord(str):
+    # The value of an RTFCMD token. It compares and hashes as the control word
+    # text, and is split once at tokenization time into its alphabetic name
+    # and unsigned numeric parameter: "fs28" is ("fs", 28), "par" is
+    # ("par", None). Words that are not letters followed by digits, such as
+    # "blue255;" or "*", keep their whole text as the name.
+    _SPLIT_PATTERN = re.compile(r"([a-zA-Z]+)(\d*)")
+
+    def __new__(cls, text):
+        word = super().__new__(cls, text)
+        match = cls._SPLIT_PATTERN.fullmatch(text)
+        if match is None:
+            word.name = str(text)
+            word.parameter = None
+        else:
+            word.name = match[1]
+            word.parameter = int(match[2]) if match[2] else None
+        return word
+
+    def __reduce__(self):
+        return (RTFControlWord, (str(self),))
+
+
+class _ControlWordTable(dict):
+    # Maps control word text to its RTFControlWord, splitting each distinct
+    # word only the first time it is looked up.
+    def __missing__(self, command):
+        word = self[command] = RTFControlWord(command)
+        return word
+
+
+class RTFPayload:
+    # Hex-encoded binary data from a \pict or \supertextdata group, kept as a
+    # span of the source document instead of being split into text tokens.
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    def decode(self):
+        # bytes.fromhex skips the whitespace RTF writers wrap hex lines with.
+        return bytes.fromhex(self.text)
+
+    def __eq__(self, other):
+        if not isinstance(other, RTFPayload):
+            return NotImplemented
+        return self.text == other.text
+
+    def __repr__(self):
+        return f"RTFPayload({self.start}, {self.end})"
+
+
+class RTFEvents:
+    # One walk over a document's events, as returned by iterevents(). It is
+    # iterated like a generator, and skip_group() only affects this walk, so
+    # threads can walk the same parsed stream at once.
+    __slots__ = ("skip_requested", "_events")
+
+    def __init__(self, walk):
+        self.skip_requested = False
+        self._events = walk(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def skip_group(self):
+        # Called while consuming the walk: the innermost open group is closed
+        # without yielding the rest of its contents, and its GROUP_END is the
+        # next event. Content inside a skipped group is not validated.
+        self.skip_requested = True
+
+
+class RTFTokenStream:
+    # The token tree of a document stored column-wise, as built by
+    # RTFParser.parsecompact(). Every token, groups included, is one row in
+    # source order holding its kind, the row of its enclosing group (-1 for
+    # the root group) and a span of the source text. Token values are only
+    # built when they are read, so a parsed note costs a few array entries per
+    # token instead of a tuple and a string each.
+    #
+    # A group's span starts at its opening brace. Its end is not a source
+    # offset but the row just past its last descendant, so readers can step
+    # over a whole group.
+    GROUP, RTFCMD, TEXT, CMDPARAM, PAYLOAD = range(5)
+    KIND_NAMES = ("GROUP", "RTFCMD", "TEXT", "CMDPARAM", "PAYLOAD")
+
+    def __init__(self, source, control_words=None):
+        self.source = source
+        self.kinds = array("B")
+        self.parents = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+        # Text values that are not a plain slice of the source, keyed by row:
+        # unicode escapes and text runs that joined escaped characters.
+        self.values = {}
+        self._control_words = (
+            _ControlWordTable() if control_words is None else control_words
+        )
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self):
+        return RTFTokenGroup(self, 0)
+
+    @property
+    def nbytes(self):
+        # Memory held by the columns and stored values, not counting the
+        # source text the spans point into.
+        columns = (self.kinds, self.parents, self.starts, self.ends)
+        return sum(column.itemsize * len(column) for column in columns) + sum(
+            len(value) for value in self.values.values()
+        )
+
+    def append(self, kind, parent, start, end):
+        row = len(self.kinds)
+        self.kinds.append(kind)
+        self.parents.append(parent)
+        self.starts.append(start)
+        self.ends.append(end)
+        return row
+
+    def children(self, row):
+        """Yield the rows directly inside the group at ``row``."""
+        kinds = self.kinds
+        ends = self.ends
+        child = row + 1
+        stop = ends[row]
+        while child < stop:
+            yield child
+            child = ends[child] if kinds[child] == self.GROUP else child + 1
+
+    def value(self, row):
+        kind = self.kinds[row]
+        if kind == self.GROUP:
+            return RTFTokenGroup(self, row)
+        value = self.values.get(row)
+        if value is not None:
+            return value
+        start = self.starts[row]
+        end = self.ends[row]
+        if kind == self.RTFCMD:
+            return self._control_words[self.source[start:end]]
+        if kind == self.PAYLOAD:
+            return RTFPayload(self.source, start, end)
+        return self.source[start:end]
+
+    def token(self, row):
+        """Return the row as parseme() would: a group or a (kind, value) tuple."""
+        kind = self.kinds[row]
+        if kind == self.GROUP:
+            return RTFTokenGroup(self, row)
+        return (self.KIND_NAMES[kind], self.value(row))
+
+    def iterevents(self):
+        # Replays the stream as the events RTFParser.iterevents() yields for
+        # the same document, including skip_group() support, so event
+        # consumers can read a stream that is already parsed.
+        return RTFEvents(self._walk_events)
+
+    def _walk_events(self, walk):
+        kinds = self.kinds
+        ends = self.ends
+        kind_names = self.KIND_NAMES
+        row_count = len(kinds)
+        # The row just past each open group.
+        stops = []
+        row = 0
+        while row < row_count or stops:
+            if stops and row >= stops[-1]:
+                stops.pop()
+                event = ("GROUP_END", None)
+            elif kinds[row] == self.GROUP:
+                stops.append(ends[row])
+                row += 1
+                event = ("GROUP_START", None)
+            else:
+                event = (kind_names[kinds[row]], self.value(row))
+                row += 1
+            yield event
+            if walk.skip_requested and stops:
+                row = stops[-1]
+            walk.skip_requested = False
+
+
+class RTFTokenGroup:
+    # One group of an RTFTokenStream. It reads like a group list from
+    # parseme(): iterating yields child groups as RTFTokenGroup and every
+    # other token as a (kind, value) tuple, built on demand.
+    __slots__ = ("stream", "row")
+
+    def __init__(self, stream, row):
+        self.stream = stream
+        self.row = row
+
+    def __iter__(self):
+        token = self.stream.token
+        for child in self.stream.children(self.row):
+            yield token(child)
+
+    def __len__(self):
+        return sum(1 for _child in self.stream.children(self.row))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for position, child in enumerate(self.stream.children(self.row)):
+                if position == index:
+                    return self.stream.token(child)
+        raise IndexError("group index out of range")
+
+    def __eq__(self, other):
+        if isinstance(other, RTFTokenGroup):
+            other = other.tolist()
+        elif not isinstance(other, list):
+            return NotImplemented
+        return self.tolist() == other
+
+    __hash__ = None
+
+    @property
+    def parent(self):
+        row = self.stream.parents[self.row]
+        return None if row < 0 else RTFTokenGroup(self.stream, row)
+
+    def tolist(self):
+        """Materialize the group as the nested lists parseme() returns."""
+        stream = self.stream
+        kinds = stream.kinds
+        ends = stream.ends
+        root = group = []
+        # Open groups as (list, row just past the group), without recursion.
+        open_groups = []
+        stop = ends[self.row]
+        for row in range(self.row + 1, stop):
+            while open_groups and row >= stop:
+                group, stop = open_groups.pop()
+            if kinds[row] == stream.GROUP:
+                child = []
+                group.append(child)
+                open_groups.append((group, stop))
+                group, stop = child, ends[row]
+            else:
+                group.append(stream.token(row))
+        return root
+
+    def __repr__(self):
+        return f"RTFTokenGroup(row={self.row})"
+
+
+def _token_pattern(text_alternatives):
+    # Every position in a document matches exactly one alternative, so a single
+    # finditer pass walks the source as a gapless token stream. Alternatives
+    # are tried in order: literal escapes and \uN? must win over the generic
+    # control word, which consumes one trailing whitespace delimiter.
+    return re.compile(
+        r"(?P<payload_open>\{(?=\\(?:pict|supertextdata)(?:[{}\\ \t\f\r\n\x00]|$)))"
+        r"|(?P<open>\{)"
+        r"|(?P<close>\})"
+        r"|\\(?P<literal>[\\{}])"
+        r"|\\u(?P<unicode>-?\d+)\?"
+        r"|\\(?P<command>[^{}\\ \t\f\r\n\x00]+)[ \t\f\r\n\x00]?"
+        + text_alternatives
+        + r"|(?P<escape>\\)"
+    )
+
+
 class RTFParser:
     WHITESPACE = " \t\f\r\n\x00"
 
-    def __init__(self, rtfdata):
+    # Each whitespace character is its own token, as the parser has always
+    # emitted it.
+    _TOKEN_PATTERN = _token_pattern(
+        r"|(?P<space>[ \t\f\r\n\x00])"
+        r"|(?P<text>[^{}\\ \t\f\r\n\x00]+)"
+    )
+    # With coalesce_text, words and the whitespace between them are one token.
+    # Escaped characters are then joined onto the surrounding run as well. A
+    # run of hex digits and whitespace that closes its group is matched on its
+    # own, so a binary destination's payload is found without scanning twice.
+    _RUN_PATTERN = _token_pattern(
+        r"|(?P<hex>[ \t\f\r\n]*[0-9a-fA-F][0-9a-fA-F \t\f\r\n]*(?=\}))"
+        r"|(?P<text>[^{}\\]+)"
+    )
+    _TEXT_KINDS = frozenset({"text", "space", "literal", "unicode", "hex"})
+    # Binary destinations hold hex data up to their closing brace. When the
+    # text of such a group matches this, it becomes one PAYLOAD token.
+    _PAYLOAD_PATTERN = re.compile(
+        r"[ \t\f\r\n]*[0-9a-fA-F][0-9a-fA-F \t\f\r\n]*(?=\})"
+    )
+    # Skipped groups only need their braces counted. Literal brace escapes are
+    # matched first so they are passed over instead of counted.
+    _BRACE_PATTERN = re.compile(r"\\[\\{}]|[{}]")
+    _NON_WHITESPACE_PATTERN = re.compile(r"[^ \t\f\r\n\x00]")
+
+    def __init__(self, rtfdata, coalesce_text=False):
         self.rtf_text = rtfdata
+        # Merge adjacent text, whitespace and escaped characters of a group into
+        # one TEXT/CMDPARAM token. Content and command delimiters are unchanged;
+        # only the token boundaries between text pieces go away.
+        self.coalesce_text = coalesce_text
+        self._control_words = _ControlWordTable()
 
     def parseme(self):
         # RTF documents are one root group. Any non-whitespace after that group
         # is treated as malformed input instead of silently ignored.
-        tokens, pos = self._parse_group(0, 1)
-
-        while pos < len(self.rtf_text) and self.rtf_text[pos] in self.WHITESPACE:
-            pos += 1
-
-        if pos != len(self.rtf_text):
-            self._fail(pos, "unexpected content after root group")
-
-        return tokens
-
-    def _parse_group(self, pos, level):
-        if pos >= len(self.rtf_text) or self.rtf_text[pos] != "{":
-            self._fail(pos, "expected opening brace")
-
-        pos += 1
-        tokens = []
-
-        # A group is a balanced brace block containing nested groups, escaped
-        # commands/characters, and plain text spans.
-        while pos < len(self.rtf_text):
-            char = self.rtf_text[pos]
-
-            if char == "{":
-                nested_tokens, pos = self._parse_group(pos, level + 1)
-                tokens.append(nested_tokens)
-            elif char == "}":
-                return tokens, pos + 1
-            elif char == "\\":
-                token, pos = self._parse_escape(pos, level)
-                tokens.append(token)
+        text = self.rtf_text
+        coalesce_text = self.coalesce_text
+        pattern = self._RUN_PATTERN if coalesce_text else self._TOKEN_PATTERN
+        matches = pattern.finditer(text)
+        first = next(matches, None)
+        if first is None or first.lastgroup not in {"open", "payload_open"}:
+            self._fail(0, "expected opening brace")
+
+        # Groups are built with an explicit stack of open parents instead of
+        # one recursive call per brace, so deeply nested documents cannot hit
+        # the interpreter recursion limit.
+        root = group = []
+        append = group.append
+        parents = []
+        control_words = self._control_words
+        # Root group text is document content. Text inside nested groups is kept
+        # as command parameter data, preserving the previous parser contract.
+        text_kind = "TEXT"
+        # The open \pict or \supertextdata group whose hex data has not been
+        # seen yet. Its first text token is checked for a payload. The root
+        # group can be one too, as iterevents() treats it.
+        payload_group = root if first.lastgroup == "payload_open" else None
+        # Pieces of the text run being coalesced, flushed at the next
+        # non-text token.
+        run = []
+
+        while True:
+            for match in matches:
+                kind = match.lastgroup
+                if kind == "command":
+                    if run:
+                        append((text_kind, "".join(run)))
+                        run = []
+                    append(("RTFCMD", control_words[match[kind]]))
+                elif kind == "open":
+                    if run:
+                        append((text_kind, "".join(run)))
+                        run = []
+                    child = []
+                    append(child)
+                    parents.append(group)
+                    group = child
+                    append = group.append
+                    text_kind = "CMDPARAM"
+                elif kind == "close":
+                    if run:
+                        append((text_kind, "".join(run)))
+                        run = []
+                    if not parents:
+                        break
+                    group = parents.pop()
+                    append = group.append
+                    if not parents:
+                        text_kind = "TEXT"
+                elif kind == "escape":
+                    self._fail_escape(match.start())
+                elif kind == "payload_open":
+                    if run:
+                        append((text_kind, "".join(run)))
+                        run = []
+                    payload_group = []
+                    append(payload_group)
+                    parents.append(group)
+                    group = payload_group
+                    append = group.append
+                    text_kind = "CMDPARAM"
+                else:
+                    if group is payload_group:
+                        payload_group = None
+                        if kind == "hex":
+                            append(("PAYLOAD", RTFPayload(text, match.start(), match.end())))
+                            continue
+                        payload = self._match_payload(match.start())
+                        if payload is not None:
+                            # Resume tokenizing at the group's closing brace.
+                            append(("PAYLOAD", payload))
+                            matches = pattern.finditer(text, payload.end)
+                            break
+                    if kind == "unicode":
+                        value = self._unicode_char(match)
+                    else:
+                        value = match[kind]
+                    if coalesce_text:
+                        run.append(value)
+                    else:
+                        append((text_kind, value))
             else:
-                token, pos = self._parse_text(pos, level)
-                tokens.append(token)
-
-        self._fail(pos, "missing closing brace")
-
-    def _parse_escape(self, pos, level):
-        escaped_pos = pos + 1
+                self._fail(len(text), "missing closing brace")
+            # Otherwise a payload ended the pass, even one of the root group.
+            if kind == "close":
+                break
 
-        if escaped_pos >= len(self.rtf_text):
-            self._fail(pos, "dangling escape")
+        self._check_trailing(match.end())
+        return root
+
+    def parsecompact(self):
+        # Parses like parseme(), accepting and rejecting the same documents,
+        # but returns an RTFTokenStream holding token spans in arrays.
+        # Iterating stream.root yields the tokens parseme() would return.
+        text = self.rtf_text
+        coalesce_text = self.coalesce_text
+        pattern = self._RUN_PATTERN if coalesce_text else self._TOKEN_PATTERN
+        text_kinds = self._TEXT_KINDS
+        matches = pattern.finditer(text)
+        first = next(matches, None)
+        if first is None or first.lastgroup not in {"open", "payload_open"}:
+            self._fail(0, "expected opening brace")
+
+        stream = RTFTokenStream(text, self._control_words)
+        add = stream.append
+        ends = stream.ends
+        values = stream.values
+        GROUP = stream.GROUP
+        RTFCMD = stream.RTFCMD
+        PAYLOAD = stream.PAYLOAD
+        group = add(GROUP, -1, first.start(), 0)
+        parents = []
+        text_kind = stream.TEXT
+        payload_group = group if first.lastgroup == "payload_open" else None
+        # The text run being coalesced spans run_start to run_end. Its pieces
+        # are only collected once an escape makes it differ from the source.
+        run_start = run_end = -1
+        run = None
+
+        while True:
+            for match in matches:
+                kind = match.lastgroup
+                if run_start >= 0 and kind not in text_kinds:
+                    row = add(text_kind, group, run_start, run_end)
+                    if run is not None:
+                        values[row] = "".join(run)
+                        run = None
+                    run_start = -1
+                if kind == "command":
+                    add(RTFCMD, group, match.start(kind), match.end(kind))
+                elif kind == "open" or kind == "payload_open":
+                    parents.append(group)
+                    group = add(GROUP, group, match.start(), 0)
+                    text_kind = stream.CMDPARAM
+                    if kind == "payload_open":
+                        payload_group = group
+                elif kind == "close":
+                    ends[group] = len(ends)
+                    if not parents:
+                        break
+                    group = parents.pop()
+                    if not parents:
+                        text_kind = stream.TEXT
+                elif kind == "escape":
+                    self._fail_escape(match.start())
+                else:
+                    if group == payload_group:
+                        payload_group = None
+                        if kind == "hex":
+                            add(PAYLOAD, group, match.start(), match.end())
+                            continue
+                        payload = self._match_payload(match.start())
+                        if payload is not None:
+                            # Resume tokenizing at the group's closing brace.
+                            add(PAYLOAD, group, payload.start, payload.end)
+                            matches = pattern.finditer(text, payload.end)
+                            break
+                    # A literal escape's value is the character after the
+                    # backslash; only unicode escapes are not in the source.
+                    start = match.start(kind) if kind == "literal" else match.start()
+                    end = match.end()
+                    if not coalesce_text:
+                        row = add(text_kind, group, start, end)
+                        if kind == "unicode":
+                            values[row] = self._unicode_char(match)
+                        continue
+                    if run_start < 0:
+                        run_start = run_end = start
+                    if run is None and (kind == "unicode" or start != run_end):
+                        run = [text[run_start:run_end]]
+                    if run is not None:
+                        if kind == "unicode":
+                            run.append(self._unicode_char(match))
+                        else:
+                            run.append(text[start:end])
+                    run_end = end
+            else:
+                self._fail(len(text), "missing closing brace")
+            # Otherwise a payload ended the pass, even one of the root group.
+            if kind == "close":
+                break
 
-        escaped = self.rtf_text[escaped_pos]
+        self._check_trailing(match.end())
+        return stream
+
+    def iterevents(self):
+        # Streams the document as ("GROUP_START", None), ("GROUP_END", None),
+        # ("RTFCMD", word), ("TEXT"/"CMDPARAM", text) and ("PAYLOAD", payload)
+        # events in source order, so consumers can walk a note without building
+        # the nested token list. Text kinds, payloads and coalesce_text runs
+        # follow the same rules as parseme(). The returned RTFEvents can skip
+        # the rest of a group with skip_group().
+        return RTFEvents(self._walk_events)
+
+    def _walk_events(self, walk):
+        text = self.rtf_text
+        coalesce_text = self.coalesce_text
+        pattern = self._RUN_PATTERN if coalesce_text else self._TOKEN_PATTERN
+        text_kinds = self._TEXT_KINDS
+        control_words = self._control_words
+        matches = pattern.finditer(text)
+        match = next(matches, None)
+        if match is None or match.lastgroup not in {"open", "payload_open"}:
+            self._fail(0, "expected opening brace")
+
+        depth = 0
+        text_kind = "TEXT"
+        payload_level = -1
+        run = []
+        while True:
+            kind = match.lastgroup
+            event = None
+            position = match.end()
+            # Set when a finished text run is yielded ahead of this token, which
+            # is then handled on the next pass instead of reading a new one.
+            replay = False
+            if kind in text_kinds:
+                payload = None
+                if payload_level == depth:
+                    payload_level = -1
+                    if kind == "hex":
+                        payload = RTFPayload(text, match.start(), position)
+                    else:
+                        payload = self._match_payload(match.start())
+                if payload is not None:
+                    event = ("PAYLOAD", payload)
+                    if payload.end != position:
+                        position = payload.end
+                        matches = pattern.finditer(text, position)
+                else:
+                    if kind == "unicode":
+                        value = self._unicode_char(match)
+                    else:
+                        value = match[kind]
+                    if coalesce_text:
+                        run.append(value)
+                    else:
+                        event = (text_kind, value)
+            elif run:
+                event = (text_kind, "".join(run))
+                run = []
+                position = match.start()
+                replay = True
+            elif kind == "command":
+                event = ("RTFCMD", control_words[match[kind]])
+            elif kind == "open" or kind == "payload_open":
+                depth += 1
+                event = ("GROUP_START", None)
+                if kind == "payload_open":
+                    payload_level = depth
+            elif kind == "close":
+                depth -= 1
+                event = ("GROUP_END", None)
+                if payload_level > depth:
+                    payload_level = -1
+            else:
+                self._fail_escape(match.start())
+
+            if event is not None:
+                yield event
+                if walk.skip_requested and depth:
+                    position, depth = yield from self._skip_groups(walk, position, depth)
+                    matches = pattern.finditer(text, position)
+                    replay = False
+                    if payload_level > depth:
+                        payload_level = -1
+                walk.skip_requested = False
+
+            if not depth:
+                break
+            text_kind = "TEXT" if depth == 1 else "CMDPARAM"
+            if not replay:
+                match = next(matches, None)
+                if match is None:
+                    self._fail(len(text), "missing closing brace")
 
-        # These are literal text escapes in RTF, not commands.
-        if escaped in "\\{}":
-            return self._text_token(escaped, level), escaped_pos + 1
+        self._check_trailing(position)
 
+    def _match_payload(self, pos):
+        match = self._PAYLOAD_PATTERN.match(self.rtf_text, pos)
+        if match is None:
+            return None
+        return RTFPayload(self.rtf_text, pos, match.end())
+
+    def _skip_groups(self, walk, pos, depth):
+        # Passes over the rest of the innermost open group by brace counting
+        # alone, so its contents are never tokenized. A consumer may ask to
+        # skip the enclosing group again after each GROUP_END. Returns the
+        # position to resume at and the remaining depth.
+        while walk.skip_requested and depth:
+            walk.skip_requested = False
+            pos = self._find_group_end(pos)
+            depth -= 1
+            yield ("GROUP_END", None)
+        return pos, depth
+
+    def _check_trailing(self, pos):
+        match = self._NON_WHITESPACE_PATTERN.search(self.rtf_text, pos)
+        if match is not None:
+            self._fail(match.start(), "unexpected content after root group")
+
+    def _find_group_end(self, pos):
+        level = 1
+        for match in self._BRACE_PATTERN.finditer(self.rtf_text, pos):
+            brace = match[0]
+            if brace == "{":
+                level += 1
+            elif brace == "}":
+                level -= 1
+                if not level:
+                    return match.end()
+        self._fail(len(self.rtf_text), "missing closing brace")
+
+    def _unicode_char(self, match):
         # Unicode escapes are the only command-like form this parser evaluates.
         # Everything else remains an RTFCMD token for the UI layer to interpret.
-        unicode_token = self._parse_unicode_escape(pos, level)
-        if unicode_token is not None:
-            return unicode_token
-
-        return self._parse_command(pos)
-
-    def _parse_unicode_escape(self, pos, level):
-        value_start = pos + 2
-        if self.rtf_text[pos + 1] != "u" or value_start >= len(self.rtf_text):
-            return None
-
-        value_end = value_start
-        if self.rtf_text[value_end] == "-":
-            value_end += 1
-
-        digit_start = value_end
-        while value_end < len(self.rtf_text) and self.rtf_text[value_end].isdigit():
-            value_end += 1
-
-        if value_end == digit_start:
-            return None
-        if value_end >= len(self.rtf_text) or self.rtf_text[value_end] != "?":
-            return None
-
-        codepoint = int(self.rtf_text[value_start:value_end])
+        codepoint = int(match.group("unicode"))
         if codepoint < 0:
             # RTF stores signed 16-bit Unicode values in some producers.
             codepoint += 0x10000
 
         try:
-            char = chr(codepoint)
-        except ValueError:
-            self._fail(pos, f"invalid unicode escape {codepoint}")
-
-        return self._text_token(char, level), value_end + 1
-
-    def _parse_command(self, pos):
-        command_start = pos + 1
-        command_end = command_start
-
-        # Commands run until a delimiter. One following whitespace delimiter is
-        # consumed, matching the old Lark grammar and existing app behavior.
-        while command_end < len(self.rtf_text):
-            char = self.rtf_text[command_end]
-            if char in "{}\\" or char in self.WHITESPACE:
-                break
-            command_end += 1
-
-        if command_end == command_start:
-            self._fail(pos, "expected command after escape")
-
-        if (
-            command_end < len(self.rtf_text)
-            and self.rtf_text[command_end] in self.WHITESPACE
-        ):
-            command_end += 1
-
-        command = self.rtf_text[command_start:command_end].rstrip(self.WHITESPACE)
-        return ("RTFCMD", command), command_end
-
-    def _parse_text(self, pos, level):
-        if self.rtf_text[pos] in self.WHITESPACE:
-            return self._text_token(self.rtf_text[pos], level), pos + 1
-
-        text_end = pos
-        while text_end < len(self.rtf_text):
-            char = self.rtf_text[text_end]
-            if char in "{}\\" or char in self.WHITESPACE:
-                break
-            text_end += 1
-
-        if text_end == pos:
-            self._fail(pos, "expected text")
-
-        return self._text_token(self.rtf_text[pos:text_end], level), text_end
+            return chr(codepoint)
+        except (OverflowError, ValueError):
+            self._fail(match.start(), f"invalid unicode escape {codepoint}")
 
-    def _text_token(self, text, level):
-        # Root group text is document content. Text inside nested groups is kept
-        # as command parameter data, preserving the previous parser contract.
-        return ("TEXT" if level == 1 else "CMDPARAM", text)
+    def _fail_escape(self, pos):
+        if pos + 1 >= len(self.rtf_text):
+            self._fail(pos, "dangling escape")
+        self._fail(pos, "expected command after escape")
 
     def _fail(self, pos, message):
         raise RTFParseError(f"{message} at position {pos}")
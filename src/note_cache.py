@@ -0,0 +1,187 @@
+"""Process-wide cache of parsed SuperText notes keyed by file signature."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import os
+import sys
+import threading
+
+from src.RTFParser import RTFParser, RTFTokenGroup
+from src.search_index import rtf_to_plain_text
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def read_note_text(path):
+    """Read a note, falling back for notes saved in a legacy encoding."""
+    try:
+        with open(path, "r", encoding="utf-8") as source:
+            return source.read()
+    except UnicodeDecodeError:
+        pass
+    try:
+        with open(path, "r") as source:
+            return source.read()
+    except UnicodeDecodeError:
+        with open(path, "r", errors="replace") as source:
+            return source.read()
+
+
+@dataclass
+class _CachedNote:
+    signature: tuple[int, int]
+    data: str | None = None
+    tree: RTFTokenGroup | None = None
+    plain_text: str | None = None
+    sizes: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def size(self):
+        return sum(self.sizes.values())
+
+
+class NoteCache:
+    """An LRU cache of parsed notes and their plain text, bounded by size.
+
+    Entries are keyed by path and validated against the file's
+    ``(st_mtime_ns, st_size)`` signature, so an edited note misses and is read
+    again. Token trees are kept in the compact form from
+    ``RTFParser.parsecompact()`` and shared between callers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: OrderedDict[str, _CachedNote] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _lookup(self, key, signature, field):
+        # Returns (value, entry). The entry is returned whenever it matches the
+        # signature, so a note cached in another form is not read again.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature != signature:
+                self.misses += 1
+                return None, None
+            value = getattr(entry, field)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value, entry
+
+    def _store(self, key, signature, **values):
+        # Payload and text spans of a tree point into the cached source, so
+        # only the stream's own columns are added for it.
+        sizes = {
+            name: value.stream.nbytes if name == "tree" else sys.getsizeof(value)
+            for name, value in values.items()
+        }
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+                if entry.signature != signature:
+                    entry = None
+            if entry is None:
+                entry = _CachedNote(signature)
+            for name, value in values.items():
+                setattr(entry, name, value)
+            entry.sizes.update(sizes)
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self.evictions += 1
+
+    def parsed(self, path, stat=None):
+        """Return ``(data, tree)``: the note's RTF text and the root
+        ``RTFTokenGroup`` of its token tree, parsed with coalesced text runs.
+
+        Raises ``OSError`` when the note cannot be read and ``RTFParseError``
+        when it is not valid RTF.
+        """
+        key = self._key(path)
+        if stat is None:
+            stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        tree, entry = self._lookup(key, signature, "tree")
+        if tree is not None:
+            return entry.data, tree
+
+        data = entry.data if entry is not None else None
+        if data is None:
+            data = read_note_text(path)
+        tree = RTFParser(data, coalesce_text=True).parsecompact().root
+        self._store(key, signature, data=data, tree=tree)
+        return data, tree
+
+    def plain_text(self, path, stat=None):
+        """Return the note's visible text as indexed by the search index."""
+        key = self._key(path)
+        if stat is None:
+            stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        plain_text, entry = self._lookup(key, signature, "plain_text")
+        if plain_text is not None:
+            return plain_text
+
+        if entry is not None and entry.tree is not None:
+            plain_text = rtf_to_plain_text(entry.tree.stream)
+        else:
+            data = entry.data if entry is not None else None
+            if data is None:
+                data = read_note_text(path)
+            plain_text = rtf_to_plain_text(data)
+        self._store(key, signature, plain_text=plain_text)
+        return plain_text
+
+    def discard(self, path):
+        """Forget a note, e.g. after SuperText itself rewrote or removed it."""
+        with self._lock:
+            entry = self._entries.pop(self._key(path), None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared by the editor and the search index so a note parsed by one is reused
+# by the other.
+shared_note_cache = NoteCache()
@@ -0,0 +1,168 @@
+"""Keeps the note search index current on a background thread."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+
+class _Stopped(Exception):
+    pass
+
+
+class NoteIndexer:
+    """Refreshes a ``NoteSearchIndex`` in the background as notes change.
+
+    The first refresh runs as soon as the indexer starts. After that the
+    notebook is checked every ``poll_seconds`` with
+    ``NoteSearchIndex.pending_changes()``, which only lists folders whose
+    modification time changed. Changes are indexed once two checks
+    ``settle_seconds`` apart find the same ones, so a burst of writes such as
+    a cloud drive syncing is indexed once it ends rather than note by note; a
+    burst lasting longer than ``max_delay_seconds`` is indexed anyway.
+
+    ``on_change()`` is called on the indexer thread whenever ``status()``
+    changes, and at most every ``STATUS_INTERVAL_SECONDS`` while notes are
+    being indexed.
+    """
+
+    STATUS_INTERVAL_SECONDS = 0.25
+
+    def __init__(
+        self,
+        index,
+        poll_seconds=5.0,
+        settle_seconds=1.0,
+        max_delay_seconds=30.0,
+        on_change: Callable[[], None] | None = None,
+    ):
+        self.index = index
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.on_change = on_change
+        self.refreshes = 0
+        self._pending = 0
+        self._indexing = False
+        self._ready = False
+        self._error: str | None = None
+        self._wake = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._status_published = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._wake = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the thread, after the note it is indexing if any.
+
+        The indexer is still ``running`` if ``timeout`` passes first, until
+        the thread gets to the end of that note.
+        """
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def poll_now(self):
+        """Check the notebook for changes without waiting for the next poll."""
+        with self._condition:
+            self._wake = True
+            self._condition.notify_all()
+
+    def status(self):
+        with self._condition:
+            return {
+                "ready": self._ready,
+                "indexing": self._indexing,
+                "pending": self._pending,
+                "refreshes": self.refreshes,
+                "error": self._error,
+            }
+
+    def _set_status(self, **changes):
+        with self._condition:
+            if self._stopping:
+                raise _Stopped()
+            changed = False
+            for name, value in changes.items():
+                if getattr(self, "_" + name) != value:
+                    setattr(self, "_" + name, value)
+                    changed = True
+        if changed and self.on_change is not None:
+            self.on_change()
+
+    def _sleep(self, seconds):
+        # Returns early, with the wake-up consumed, when poll_now() is called.
+        with self._condition:
+            if not self._wake and not self._stopping:
+                self._condition.wait(seconds)
+            self._wake = False
+            if self._stopping:
+                raise _Stopped()
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    self._poll()
+                except _Stopped:
+                    raise
+                except Exception as exc:
+                    self._set_status(indexing=False, pending=0, error=str(exc))
+                self._sleep(self.poll_seconds)
+        except _Stopped:
+            pass
+        finally:
+            with self._condition:
+                self._thread = None
+
+    def _poll(self):
+        with self._condition:
+            self._wake = False
+        if self._ready:
+            changes = self.index.pending_changes()
+            if not changes:
+                return
+            first_seen = time.monotonic()
+            while time.monotonic() - first_seen < self.max_delay_seconds:
+                self._set_status(pending=len(changes))
+                self._sleep(self.settle_seconds)
+                settled = self.index.pending_changes()
+                if not settled:
+                    self._set_status(pending=0)
+                    return
+                if settled == changes:
+                    break
+                changes = settled
+
+        self._set_status(indexing=True)
+        self.index.refresh(progress=self._progress)
+        with self._condition:
+            self.refreshes += 1
+        self._set_status(indexing=False, pending=0, ready=True, error=None)
+
+    def _progress(self, done, total):
+        # Called for every note indexed, so a stop is noticed between notes.
+        with self._condition:
+            if self._stopping:
+                raise _Stopped()
+        now = time.monotonic()
+        if done in (0, total) or now - self._status_published >= self.STATUS_INTERVAL_SECONDS:
+            self._status_published = now
+            self._set_status(pending=total - done)
@@ -0,0 +1,162 @@
+"""Background prefetching of the notes a user is likely to open next."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import threading
+from typing import Any, Callable
+
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+@dataclass
+class _PrefetchedNote:
+    signature: tuple[int, int]
+    value: Any
+    size: int
+
+
+class NotePrefetcher:
+    """Loads notes ahead of time on one background thread, within a budget.
+
+    ``load(path)`` runs on the prefetch thread and returns the value kept for
+    a note, or None to keep nothing. Values are held until ``take()`` claims
+    them, least recently prefetched first out once their ``size(value)`` total
+    exceeds ``max_bytes``. Like ``NoteCache`` entries they are validated
+    against the file's ``(st_mtime_ns, st_size)`` signature, so a note edited
+    since it was prefetched misses.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str], Any],
+        size: Callable[[Any], int],
+        max_bytes=DEFAULT_MAX_BYTES,
+    ):
+        self._load = load
+        self._size = size
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: OrderedDict[str, _PrefetchedNote] = OrderedDict()
+        self._wanted: list[str] = []
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def prefetch(self, paths):
+        """Load ``paths`` in order, replacing any not started yet."""
+        with self._condition:
+            self._wanted = list(paths)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def take(self, path, stat=None):
+        """Return and forget the value prefetched for ``path``, or None."""
+        try:
+            if stat is None:
+                stat = os.stat(path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._condition:
+            entry = self._entries.pop(self._key(path), None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+            if entry is None or entry.signature != signature:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.value
+
+    def discard(self, path):
+        """Forget a note, e.g. after SuperText itself rewrote or removed it."""
+        with self._condition:
+            entry = self._entries.pop(self._key(path), None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+
+    def set_max_bytes(self, max_bytes):
+        with self._condition:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._condition:
+            self._wanted = []
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._condition:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self.evictions += 1
+
+    def _next_wanted(self):
+        # Blocks until a note is wanted that is not prefetched already.
+        with self._condition:
+            while True:
+                while not self._wanted:
+                    self._condition.wait()
+                path = self._wanted.pop(0)
+                key = self._key(path)
+                entry = self._entries.get(key)
+                if entry is None:
+                    return path, key, None
+                self._entries.move_to_end(key)
+                return path, key, entry.signature
+
+    def _run(self):
+        while True:
+            path, key, cached_signature = self._next_wanted()
+            try:
+                # The signature is read first, so a note saved during the load
+                # is stored under the older signature and misses when taken.
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == cached_signature:
+                continue
+            try:
+                value = self._load(path)
+            except Exception:
+                # Errors are reported when the note is opened and read again.
+                continue
+            if value is None:
+                continue
+            size = self._size(value)
+            with self._condition:
+                self.loads += 1
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.current_bytes -= entry.size
+                if size > self.max_bytes:
+                    continue
+                self._entries[key] = _PrefetchedNote(signature, value, size)
+                self.current_bytes += size
+                self._evict()
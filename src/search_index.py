@@ -2,14 +2,21 @@
 
 from __future__ import annotations
 
-from contextlib import closing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from dataclasses import dataclass
 import hashlib
+import multiprocessing
 import os
 import sqlite3
+import stat as stat_module
+import threading
+import time
 from typing import Iterable
 
-from src.RTFParser import RTFParser
+from src.RTFParser import RTFParser, RTFTokenStream
 
 
 @dataclass(frozen=True)
@@ -18,56 +25,75 @@ class SearchResult:
     snippet: str
 
 
-def _first_command(group):
-    for token in group:
-        if isinstance(token, tuple) and token[0] == "RTFCMD":
-            return token[1]
-    return None
+_SKIPPED_DESTINATIONS = frozenset({"fonttbl", "colortbl", "pict"})
 
 
-def _has_direct_command(group, command):
-    return any(
-        isinstance(token, tuple) and token == ("RTFCMD", command)
-        for token in group
-    )
-
+@dataclass
+class _PlainTextGroup:
+    start: int
+    first_command: str | None = None
+    is_link: bool = False
+    is_display: bool = False
+    display_span: tuple[int, int] | None = None
 
-def rtf_to_plain_text(rtf_data: str) -> str:
-    """Return visible note text while ignoring RTF metadata and embedded data."""
-    parsed = RTFParser(rtf_data).parseme()
-    output = []
-
-    def visit(group):
-        first_command = _first_command(group)
-        if first_command in {"fonttbl", "colortbl", "pict"}:
-            return
-        if _has_direct_command(group, "supertextfile"):
-            return
-        if _has_direct_command(group, "supertextlink"):
-            for child in group:
-                if (
-                    isinstance(child, list)
-                    and _has_direct_command(child, "supertextdisplay")
-                ):
-                    visit(child)
-                    break
-            return
 
-        for token in group:
-            if isinstance(token, list):
-                visit(token)
-                continue
+def rtf_to_plain_text(rtf_data: str | RTFTokenStream) -> str:
+    """Return visible note text while ignoring RTF metadata and embedded data.
 
-            token_type, token_value = token
-            if token_type in {"TEXT", "CMDPARAM"}:
-                output.append(token_value)
-            elif token_type == "RTFCMD":
-                if token_value == "par":
-                    output.append("\n")
-                elif token_value == "tab":
-                    output.append("\t")
+    ``rtf_data`` is RTF source, or a note already parsed by
+    ``RTFParser.parsecompact()``.
+    """
+    if isinstance(rtf_data, RTFTokenStream):
+        parser = rtf_data
+    else:
+        parser = RTFParser(rtf_data, coalesce_text=True)
+    output = []
+    # One small record per open group. Destination groups are skipped by the
+    # parser as soon as they are recognised, so image hex and attachment data
+    # are never tokenized. Text a group emitted before it turned out to be
+    # hidden is dropped by truncating ``output`` back to the group's start.
+    groups = []
+
+    events = parser.iterevents()
+    for event, value in events:
+        if event == "GROUP_START":
+            groups.append(_PlainTextGroup(len(output)))
+            continue
+
+        group = groups[-1]
+        if event == "GROUP_END":
+            groups.pop()
+            if group.is_link:
+                # A link shows only its first supertextdisplay child.
+                span = group.display_span
+                output[group.start:] = output[span[0]:span[1]] if span else []
+            if groups and group.is_display:
+                parent = groups[-1]
+                if parent.display_span is None:
+                    parent.display_span = (group.start, len(output))
+        elif event == "RTFCMD":
+            if group.first_command is None:
+                group.first_command = value
+                if value in _SKIPPED_DESTINATIONS:
+                    del output[group.start:]
+                    events.skip_group()
+                    continue
+            if value == "supertextfile":
+                del output[group.start:]
+                events.skip_group()
+            elif value == "supertextlink":
+                group.is_link = True
+            elif value == "supertextdisplay":
+                group.is_display = True
+            elif value == "par":
+                output.append("\n")
+            elif value == "tab":
+                output.append("\t")
+        elif event == "PAYLOAD":
+            output.append(value.text)
+        else:
+            output.append(value)
 
-    visit(parsed)
     return "".join(output)
 
 
@@ -115,20 +141,52 @@ def _sample_evenly(values: list[bytes], maximum: int) -> list[bytes]:
     ]
 
 
+def _note_file_grams(full_path: str) -> set[bytes]:
+    # Runs in the worker processes of NoteSearchIndex.refresh().
+    try:
+        return _index_grams(rtf_to_plain_text(NoteSearchIndex._read_rtf(full_path)))
+    except (OSError, ValueError):
+        return set()
+
+
 class NoteSearchIndex:
     """A persistent trigram index whose source of truth remains the RTF files."""
 
     DB_FILENAME = ".supertext-search.sqlite3"
     ARCHIVE_DIRNAME = ".supertext-archive"
     MAX_QUERY_GRAMS = 64
-
-    def __init__(self, node_root):
+    # A refresh with at least this many changed notes parses them in worker
+    # processes, one per core.
+    PARALLEL_MIN_NOTES = 64
+    # Notes written to the index per transaction during a refresh.
+    WRITE_BATCH_NOTES = 256
+    # A directory modified this recently could change again within the same
+    # mtime, so it is listed again by the next refresh.
+    RACY_DIRECTORY_NS = 2_000_000_000
+
+    def __init__(self, node_root, note_cache=None):
         self.node_root = os.path.abspath(os.path.normpath(node_root))
         self.db_path = os.path.join(self.node_root, self.DB_FILENAME)
+        # An optional src.note_cache.NoteCache shared with the editor, so notes
+        # opened, indexed or searched recently are not parsed again.
+        self.note_cache = note_cache
+        # One connection, opened on first use, is shared by the threads that
+        # search and save notes. The schema is checked once when it opens and
+        # sqlite3 keeps its prepared statements between calls.
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._closed = False
+        # The first refresh stats every note, to find notes edited in place
+        # while the editor was closed; later ones skip unchanged directories.
+        self._verified = False
 
     def _connect(self):
         os.makedirs(self.node_root, exist_ok=True)
-        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            check_same_thread=False,
+        )
         connection.execute("PRAGMA journal_mode=WAL")
         connection.execute("PRAGMA foreign_keys=ON")
         connection.executescript(
@@ -144,23 +202,114 @@ class NoteSearchIndex:
                 PRIMARY KEY (path, gram)
             ) WITHOUT ROWID;
             CREATE INDEX IF NOT EXISTS grams_by_gram ON grams(gram, path);
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
             """
         )
         return connection
 
-    def _iter_note_files(self):
-        for directory, _subdirectories, filenames in os.walk(self.node_root):
-            if os.path.normcase(directory) == os.path.normcase(self.node_root):
-                _subdirectories[:] = [
-                    name
-                    for name in _subdirectories
-                    if name != self.ARCHIVE_DIRNAME
-                ]
-            for filename in filenames:
-                if filename.lower().endswith(".rtf"):
-                    full_path = os.path.join(directory, filename)
-                    relative_path = os.path.relpath(full_path, self.node_root)
-                    yield relative_path, full_path
+    @contextmanager
+    def _connection(self):
+        """Yield the shared connection, used by one thread at a time."""
+        with self._db_lock:
+            if self._db is None:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+                self._db = self._connect()
+            yield self._db
+
+    def close(self):
+        """Close the index for good.
+
+        A refresh still running on another thread fails at its next write
+        instead of reopening the database.
+        """
+        with self._db_lock:
+            self._closed = True
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _scan_notes(self, known_files, known_directories, full):
+        """Find the notes of the notebook and the directories holding them.
+
+        Returns ``(present, changed, directories)``: the relative paths of all
+        notes, ``(relative_path, full_path, stat)`` for notes whose signature
+        differs from ``known_files``, and the mtime to record for each
+        directory. Adding, removing or renaming a note (as saving one does)
+        changes its directory's mtime, so unless ``full`` is set the notes of a
+        directory whose mtime matches ``known_directories`` are taken as
+        unchanged and only its subdirectories are visited, without listing it.
+        """
+        subdirectories = defaultdict(list)
+        for relative_directory in known_directories:
+            if relative_directory:
+                subdirectories[os.path.dirname(relative_directory)].append(relative_directory)
+        notes_in = defaultdict(list)
+        for relative_path in known_files:
+            notes_in[os.path.dirname(relative_path)].append(relative_path)
+
+        present = set()
+        changed = []
+        directories = {}
+        racy_after = time.time_ns() - self.RACY_DIRECTORY_NS
+        try:
+            pending = [("", os.stat(self.node_root).st_mtime_ns)]
+        except OSError:
+            pending = []
+        while pending:
+            relative_directory, mtime_ns = pending.pop()
+            directory = os.path.join(self.node_root, relative_directory)
+            directories[relative_directory] = mtime_ns if mtime_ns < racy_after else -1
+
+            if not full and known_directories.get(relative_directory) == mtime_ns:
+                present.update(notes_in[relative_directory])
+                for relative_subdirectory in subdirectories[relative_directory]:
+                    try:
+                        subdirectory_stat = os.stat(
+                            os.path.join(self.node_root, relative_subdirectory)
+                        )
+                    except OSError:
+                        continue
+                    if stat_module.S_ISDIR(subdirectory_stat.st_mode):
+                        pending.append((relative_subdirectory, subdirectory_stat.st_mtime_ns))
+                continue
+
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                # listed again by the next refresh
+                directories.pop(relative_directory)
+                continue
+            for entry in entries:
+                relative_path = os.path.join(relative_directory, entry.name)
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+                if is_directory:
+                    if entry.is_symlink() or (
+                        not relative_directory and entry.name == self.ARCHIVE_DIRNAME
+                    ):
+                        continue
+                    try:
+                        pending.append((relative_path, entry.stat().st_mtime_ns))
+                    except OSError:
+                        pass
+                    continue
+                if not entry.name.lower().endswith(".rtf"):
+                    continue
+                present.add(relative_path)
+                try:
+                    # cached from the directory listing on Windows
+                    note_stat = entry.stat()
+                except OSError:
+                    continue
+                if known_files.get(relative_path) != (note_stat.st_mtime_ns, note_stat.st_size):
+                    changed.append((relative_path, entry.path, note_stat))
+        return present, changed, directories
 
     @staticmethod
     def _read_rtf(path):
@@ -171,14 +320,30 @@ class NoteSearchIndex:
             with open(path, "r", errors="replace") as source:
                 return source.read()
 
-    def _replace_file(self, connection, relative_path, full_path, stat):
+    def _plain_text(self, full_path, stat=None):
+        if self.note_cache is not None:
+            return self.note_cache.plain_text(full_path, stat)
+        return rtf_to_plain_text(self._read_rtf(full_path))
+
+    def _note_grams(self, full_path, stat):
         try:
-            plain_text = rtf_to_plain_text(self._read_rtf(full_path))
+            plain_text = self._plain_text(full_path, stat)
         except (OSError, ValueError):
             # Malformed/temporarily unreadable notes are recorded so every
             # search does not repeatedly retry them. A file change retries it.
             plain_text = ""
+        return _index_grams(plain_text)
+
+    def _replace_file(self, connection, relative_path, full_path, stat):
+        self._store_grams(
+            connection,
+            relative_path,
+            stat,
+            self._note_grams(full_path, stat),
+        )
 
+    @staticmethod
+    def _store_grams(connection, relative_path, stat, grams):
         connection.execute("DELETE FROM files WHERE path = ?", (relative_path,))
         connection.execute(
             "INSERT INTO files(path, mtime_ns, size) VALUES (?, ?, ?)",
@@ -186,62 +351,204 @@ class NoteSearchIndex:
         )
         connection.executemany(
             "INSERT INTO grams(path, gram) VALUES (?, ?)",
-            ((relative_path, gram) for gram in _index_grams(plain_text)),
+            ((relative_path, gram) for gram in grams),
+        )
+
+    def _changed_note_grams(self, changed):
+        """Yield ``(relative_path, stat, grams)`` for each changed note."""
+        done = 0
+        workers = min(os.cpu_count() or 1, len(changed))
+        if len(changed) >= self.PARALLEL_MIN_NOTES and workers > 1:
+            pool = None
+            try:
+                # Worker processes are started fresh rather than forked from
+                # the editor, which has Tk and other threads running.
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for grams in pool.map(
+                    _note_file_grams,
+                    [full_path for _path, full_path, _stat in changed],
+                    chunksize=max(1, len(changed) // (workers * 8)),
+                ):
+                    relative_path, _full_path, stat = changed[done]
+                    yield relative_path, stat, grams
+                    done += 1
+            except (OSError, BrokenProcessPool):
+                # Processes could not be started or died; the remaining
+                # notes are parsed here instead.
+                pass
+            finally:
+                # notes not started yet are dropped if the refresh is stopped
+                if pool is not None:
+                    pool.shutdown(cancel_futures=True)
+        for relative_path, full_path, stat in changed[done:]:
+            yield relative_path, stat, self._note_grams(full_path, stat)
+
+    def _known_state(self):
+        with self._connection() as connection:
+            known = {
+                path: (mtime_ns, size)
+                for path, mtime_ns, size in connection.execute(
+                    "SELECT path, mtime_ns, size FROM files"
+                )
+            }
+            known_directories = dict(
+                connection.execute("SELECT path, mtime_ns FROM directories")
+            )
+        return known, known_directories
+
+    def pending_changes(self):
+        """Return the notes a refresh would index, without indexing them.
+
+        The result is a frozenset of ``(relative_path, mtime_ns, size)`` for
+        new and changed notes and ``(relative_path, None, None)`` for removed
+        ones, so two scans can be compared to tell whether notes are still
+        being written. When no note changed, the directories are recorded as
+        a refresh would, so a directory whose mtime changed without any note
+        changing (as saving a note already indexed does) is listed only once.
+        """
+        known, known_directories = self._known_state()
+        present, changed, directories = self._scan_notes(
+            known,
+            known_directories,
+            not self._verified,
+        )
+        changes = frozenset(
+            [
+                (relative_path, stat.st_mtime_ns, stat.st_size)
+                for relative_path, _full_path, stat in changed
+            ]
+            + [(relative_path, None, None) for relative_path in set(known) - present]
+        )
+        if not changes and directories != known_directories:
+            with self._connection() as connection:
+                with connection:
+                    self._store_directories(connection, directories)
+        return changes
+
+    def refresh(self, full=False, progress=None):
+        """Incrementally bring the cache in sync with the notebook.
+
+        Only directories changed since the last refresh are listed; see
+        ``_scan_notes``. ``full`` stats every note, as the first refresh of
+        each index does. Changed notes are parsed in parallel when there are
+        many of them and written in batches, so a refresh that is interrupted
+        keeps its work. ``progress(done, total)`` is called before the first
+        changed note and after each one is parsed; an exception it raises
+        stops the refresh, keeping the notes parsed so far.
+        """
+        full = full or not self._verified
+        known, known_directories = self._known_state()
+        present, changed, directories = self._scan_notes(
+            known,
+            known_directories,
+            full,
         )
 
-    def refresh(self):
-        """Incrementally bring the cache in sync with the notebook."""
-        with closing(self._connect()) as connection:
+        if progress is not None:
+            progress(0, len(changed))
+        batch = []
+        for done, note in enumerate(self._changed_note_grams(changed), 1):
+            batch.append(note)
+            if len(batch) >= self.WRITE_BATCH_NOTES:
+                self._store_batch(batch)
+                batch = []
+            if progress is not None:
+                try:
+                    progress(done, len(changed))
+                except BaseException:
+                    self._store_batch(batch)
+                    raise
+        self._store_batch(batch)
+
+        removed_paths = set(known) - present
+        with self._connection() as connection:
             with connection:
-                known = {
-                    path: (mtime_ns, size)
-                    for path, mtime_ns, size in connection.execute(
-                        "SELECT path, mtime_ns, size FROM files"
-                    )
-                }
-                present = set()
-                updated = 0
-
-                for relative_path, full_path in self._iter_note_files():
-                    present.add(relative_path)
-                    try:
-                        stat = os.stat(full_path)
-                    except OSError:
-                        continue
-                    signature = (stat.st_mtime_ns, stat.st_size)
-                    if known.get(relative_path) == signature:
-                        continue
-                    self._replace_file(
-                        connection,
-                        relative_path,
-                        full_path,
-                        stat,
-                    )
-                    updated += 1
-
-                removed_paths = set(known) - present
                 connection.executemany(
                     "DELETE FROM files WHERE path = ?",
                     ((path,) for path in removed_paths),
                 )
-                return {"updated": updated, "removed": len(removed_paths)}
+                # recorded last, so an interrupted refresh lists them again
+                if directories != known_directories:
+                    self._store_directories(connection, directories)
+        self._verified = True
+        return {"updated": len(changed), "removed": len(removed_paths)}
 
-    def update_file(self, full_path):
-        """Update one saved note without walking the whole notebook."""
+    @staticmethod
+    def _store_directories(connection, directories):
+        connection.execute("DELETE FROM directories")
+        connection.executemany(
+            "INSERT INTO directories(path, mtime_ns) VALUES (?, ?)",
+            directories.items(),
+        )
+
+    def _store_batch(self, batch):
+        if not batch:
+            return
+        with self._connection() as connection:
+            with connection:
+                for relative_path, stat, grams in batch:
+                    self._store_grams(connection, relative_path, stat, grams)
+
+    def _relative_path(self, full_path):
+        """Return a note's path relative to the notebook, or None if outside it."""
         full_path = os.path.abspath(os.path.normpath(full_path))
         try:
             if os.path.commonpath([self.node_root, full_path]) != self.node_root:
-                return False
+                return None
+        except ValueError:
+            return None
+        return os.path.relpath(full_path, self.node_root)
+
+    def update_file(self, full_path):
+        """Update one saved note without walking the whole notebook."""
+        relative_path = self._relative_path(full_path)
+        if relative_path is None:
+            return False
+        try:
             stat = os.stat(full_path)
-        except (OSError, ValueError):
+        except OSError:
             return False
 
-        relative_path = os.path.relpath(full_path, self.node_root)
-        with closing(self._connect()) as connection:
+        with self._connection() as connection:
             with connection:
                 self._replace_file(connection, relative_path, full_path, stat)
         return True
 
+    def update_text(self, full_path, plain_text, stat):
+        """Update a note from text its writer already has, without reading it.
+
+        ``stat`` is the note's stat once written. It is recorded as the note's
+        signature, so the next refresh does not parse the note again, along
+        with the mtime its directory has once the note is in place, so the
+        directory is not listed again either.
+        """
+        relative_path = self._relative_path(full_path)
+        if relative_path is None:
+            return False
+
+        grams = _index_grams(plain_text)
+        try:
+            directory_mtime_ns = os.stat(
+                os.path.dirname(os.path.join(self.node_root, relative_path))
+            ).st_mtime_ns
+        except OSError:
+            directory_mtime_ns = -1
+        if directory_mtime_ns >= time.time_ns() - self.RACY_DIRECTORY_NS:
+            directory_mtime_ns = -1
+        with self._connection() as connection:
+            with connection:
+                self._store_grams(connection, relative_path, stat, grams)
+                # a directory not recorded yet may hold other new notes, so
+                # it is left for the next refresh to list
+                connection.execute(
+                    "UPDATE directories SET mtime_ns = ? WHERE path = ?",
+                    (directory_mtime_ns, os.path.dirname(relative_path)),
+                )
+        return True
+
     def _candidate_paths(self, connection, query: str, limit: int):
         grams = sorted(_query_grams(query))
         if not grams:
@@ -285,14 +592,14 @@ class NoteSearchIndex:
             return []
 
         normalized_query = query.casefold()
-        with closing(self._connect()) as connection:
+        with self._connection() as connection:
             candidates = self._candidate_paths(connection, query, limit)
 
         results = []
         for relative_path in candidates:
             full_path = os.path.join(self.node_root, relative_path)
             try:
-                text = rtf_to_plain_text(self._read_rtf(full_path))
+                text = self._plain_text(full_path)
             except (OSError, ValueError):
                 continue
             match_start = text.casefold().find(normalized_query)
@@ -25,9 +25,11 @@ class ScrollableText(tk.Frame):
         text.grid(row=0, column=0, sticky='nsew') # fill available space with text
         
         # set up scrollbar to scroll the text area
-        scrolly = tk.Scrollbar(self, command=text.yview)
-        scrolly.grid(row=0, column=1, sticky='nse') # won't auto-expand because column isn't configured with a weight
-        text.config(yscrollcommand=scrolly.set) # sets the scrollbar to match where the text is scrolled to
+        self.scrolly = tk.Scrollbar(self, command=text.yview)
+        self.scrolly.grid(row=0, column=1, sticky='nse') # won't auto-expand because column isn't configured with a weight
+        text.config(yscrollcommand=self._set_yscroll) # sets the scrollbar to match where the text is scrolled to
+        # called with the new (first, last) fractions whenever the view moves
+        self.yscroll_callback: Callable[[str, str], object] | None = None
 
         # Unwrapped documents need horizontal navigation. Keep the scrollbar
         # out of the layout while wrapping is enabled so wrapped documents do
@@ -72,6 +74,11 @@ class ScrollableText(tk.Frame):
         self.update_idletasks = text.update_idletasks
         self.winfo_width = text.winfo_width
 
+    def _set_yscroll(self, first, last):
+        self.scrolly.set(first, last)
+        if self.yscroll_callback is not None:
+            self.yscroll_callback(first, last)
+
     def set_wrap(self, enabled):
         """Enable word wrapping and show horizontal scrolling only as needed."""
         self.widget.configure(wrap='word' if enabled else 'none')
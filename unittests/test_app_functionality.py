@@ -1,6 +1,7 @@
 import configparser
 import hashlib
 import importlib.util
+import itertools
 import json
 import os
 import struct
@@ -121,6 +122,7 @@ class TestRTFWindowFunctionality(unittest.TestCase):
     def cleanup_window(self):
         self.clipboard_patch.stop()
         try:
+            self.window.search_index.close()
             self.window.window.destroy()
         finally:
             self.tmp.cleanup()
@@ -262,6 +264,124 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         self.assertEqual("Beta text", self.window.text.get("1.0", "end-1c"))
         self.assertEqual(1, len(self.window.editor_tabs.tabs()))
 
+    def run_background_note_loads(self, count):
+        for _ in range(count):
+            item = self.window.actionQueue.get(timeout=5)
+            while item.descr != "showBackgroundNoteLoad":
+                item = self.window.actionQueue.get(timeout=5)
+            item.item()
+
+    def run_note_writes(self, count):
+        for _ in range(count):
+            item = self.window.actionQueue.get(timeout=5)
+            while item.descr != "finishNoteWrite":
+                item = self.window.actionQueue.get(timeout=5)
+            item.item()
+
+    def test_background_preview_decodes_pictures_off_the_tk_thread(self):
+        image_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (3, 2), "blue").save(image_bytes, "PNG")
+        self.write_node("alpha", "Alpha text")
+        self.write_node(
+            "beta",
+            r"Beta {\pict\pngblip\picw90\pich60 " + image_bytes.getvalue().hex() + "}",
+        )
+        self.window.populateNodeTree()
+        self.window.tryReadShowRTF(None)
+        self.window.start_worker = True
+        beta = self.window.find_self("beta")
+        decoding_threads = []
+        decode = self.window.decodeRTFImageGroup
+
+        def record_decode(structure):
+            decoding_threads.append(threading.get_ident())
+            return decode(structure)
+
+        with mock.patch.object(self.window, "decodeRTFImageGroup", side_effect=record_decode):
+            self.assertIsNone(self.window.previewNodeInFirstTab(beta))
+            self.assertEqual("Alpha text", self.window.text.get("1.0", "end-1c"))
+            self.run_background_note_loads(1)
+
+        self.assertEqual(1, len(decoding_threads))
+        self.assertNotEqual(threading.get_ident(), decoding_threads[0])
+        self.assertEqual(str(self.node_dir / "beta.rtf"), self.window.openFile)
+        self.assertEqual(1, len(self.window.embedded_images))
+        self.assertIsNone(self.window.active_document.loaded_note)
+
+    def test_notes_loaded_ahead_only_decode_pictures_near_their_top(self):
+        image_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (3, 2), "blue").save(image_bytes, "PNG")
+        picture = r"{\pict\pngblip\picw45\pich30 " + image_bytes.getvalue().hex() + "}"
+        rtf_file = self.write_node(
+            "alpha",
+            picture + r"\par " * (app.RTFWindow.IMAGE_PRELOAD_LINES + 1) + picture,
+        )
+
+        note = self.window.readNoteForDisplay(str(rtf_file))
+
+        near, far = note.images.values()
+        self.assertEqual((3, 2), near.image.size)
+        self.assertIsNone(far.image)
+        self.assertEqual((image_bytes.getvalue(), "pngblip", (3, 2)), (far.data, far.blip, far.size))
+        # only the decoded picture's pixels count against the prefetch budget
+        self.assertEqual(
+            app.sys.getsizeof(note.data) + note.tree.stream.nbytes
+            + 2 * len(image_bytes.getvalue()) + 3 * 2 * 3,
+            note.size,
+        )
+
+    def test_background_preview_discards_notes_the_user_moved_past(self):
+        for name in ("alpha", "beta", "gamma"):
+            self.write_node(name, f"{name.title()} text")
+        self.window.populateNodeTree()
+        self.window.tryReadShowRTF(None)
+        self.window.start_worker = True
+
+        self.window.previewNodeInFirstTab(self.window.find_self("beta"))
+        self.window.previewNodeInFirstTab(self.window.find_self("gamma"))
+        self.run_background_note_loads(2)
+
+        self.assertEqual(str(self.node_dir / "gamma.rtf"), self.window.openFile)
+        self.assertEqual("Gamma text", self.window.text.get("1.0", "end-1c"))
+
+    def test_preview_prefetches_siblings_and_first_child(self):
+        for name in ("alpha", "beta", "gamma", os.path.join("beta", "child")):
+            self.write_node(name, "text")
+        self.window.populateNodeTree()
+        self.window.tryReadShowRTF(None)
+        beta = self.window.find_self("beta")
+
+        with mock.patch.object(self.window.note_prefetcher, "prefetch") as prefetch:
+            self.window.previewNodeInFirstTab(beta)
+            prefetch.assert_not_called()
+            self.window.start_worker = True
+            self.window.prefetchNodeNeighbours(beta)
+
+        self.assertEqual(
+            [
+                str(self.node_dir / "gamma.rtf"),
+                str(self.node_dir / "alpha.rtf"),
+                str(self.node_dir / "beta" / "child.rtf"),
+            ],
+            prefetch.call_args.args[0],
+        )
+
+    def test_preview_shows_a_prefetched_note_without_reading_it(self):
+        self.write_node("alpha", "Alpha text")
+        self.write_node("beta", "Beta text")
+        self.window.populateNodeTree()
+        self.window.tryReadShowRTF(None)
+        beta_path = str(self.node_dir / "beta.rtf")
+        note = self.window.readNoteForDisplay(beta_path)
+
+        with mock.patch.object(self.window.note_prefetcher, "take", return_value=note), \
+                mock.patch.object(self.window.note_cache, "parsed") as parsed:
+            self.window.previewNodeInFirstTab(self.window.find_self("beta"))
+
+        parsed.assert_not_called()
+        self.assertEqual(beta_path, self.window.openFile)
+        self.assertEqual("Beta text", self.window.text.get("1.0", "end-1c"))
+
     def test_canceling_single_click_preview_keeps_unsaved_note_open(self):
         self.write_node("alpha", "Alpha text")
         self.write_node("beta", "Beta text")
@@ -391,6 +511,33 @@ class TestRTFWindowFunctionality(unittest.TestCase):
             self.window.editor_tabs.tab(preview_document.tab_id, "text").startswith("* ")
         )
 
+    def test_opening_unchanged_copies_of_a_note_does_not_serialize_it(self):
+        rtf_file = self.write_node("alpha", "Alpha text")
+        self.window.populateNodeTree()
+        alpha = self.window.find_self("alpha")
+        event = SimpleNamespace(x=10, y=20)
+
+        with mock.patch.object(
+            self.window,
+            "convertToRTF",
+            side_effect=AssertionError("the note was serialized"),
+        ):
+            preview_document = self.window.tryReadShowRTF(None)
+            with mock.patch.object(self.window.tree, "identify", return_value=alpha):
+                self.window.openNodeFromTreeDoubleClick(event)
+            dedicated_document = self.window.active_document
+            self.window.selectDocumentTab(preview_document)
+
+        self.assertIsNot(preview_document, dedicated_document)
+        self.assertEqual(
+            self.window.documentContentHash(rtf_file.read_text(encoding="utf-8")),
+            preview_document.content_hash,
+        )
+        self.assertEqual(preview_document.content_hash, dedicated_document.content_hash)
+        self.assertEqual("Alpha text", dedicated_document.text.get("1.0", "end-1c"))
+        self.assertFalse(preview_document.dirty)
+        self.assertFalse(dedicated_document.dirty)
+
     def test_opening_multiple_nodes_creates_tabs_and_preserves_unsaved_edits(self):
         self.write_node("alpha", "Alpha text")
         self.write_node("beta", "Beta text")
@@ -474,6 +621,267 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         self.window.undoDocument()
         self.assertEqual("Externally updated", self.window.text.get("1.0", "end-1c"))
 
+    def test_opening_a_note_runs_one_layout_pass_without_undo_history(self):
+        self.write_node("alpha", r"{\qc Centered}\par Alpha text")
+        self.window.populateNodeTree()
+
+        with mock.patch.object(
+            self.window,
+            "refreshCenteredTextLayout",
+            wraps=self.window.refreshCenteredTextLayout,
+        ) as centered, mock.patch.object(
+            self.window,
+            "refreshTableLayout",
+            wraps=self.window.refreshTableLayout,
+        ) as table:
+            document = self.window.tryReadShowRTF(None)
+
+        self.assertEqual(1, centered.call_count)
+        self.assertEqual(1, table.call_count)
+        self.assertIsNone(self.window.bulk_text_load)
+        self.assertFalse(document.dirty)
+        self.assertFalse(document.text.edit_modified())
+        with self.assertRaises(tk.TclError):
+            document.text.edit_undo()
+
+    def test_large_note_renders_progressively_and_read_only(self):
+        rtf_file = self.write_node("alpha", r"{\b Bold} " + "word " * 2000 + r"\par end")
+        self.window.populateNodeTree()
+
+        with mock.patch.object(app.RTFWindow, "PROGRESSIVE_RENDER_MIN_BYTES", 0), \
+                mock.patch.object(app.RTFWindow, "PROGRESSIVE_RENDER_SLICE_MS", 0):
+            document = self.window.tryReadShowRTF(None)
+
+            self.assertIsNotNone(document.render_job)
+            self.assertTrue(document.loading)
+            self.assertEqual("disabled", str(document.text.widget.cget("state")))
+            self.assertRegex(self.window.documentTabTitle(document), r"\(\d+%\)$")
+            self.assertFalse(self.window.writeCurrentDocument(show_confirmation=False))
+            while document.render_job is not None:
+                self.window.window.update()
+
+        self.assertEqual(
+            "Bold " + "word " * 2000 + "\nend",
+            document.text.get("1.0", "end-1c"),
+        )
+        self.assertEqual("normal", str(document.text.widget.cget("state")))
+        self.assertEqual("alpha", self.window.documentTabTitle(document))
+        self.assertFalse(document.loading)
+        self.assertFalse(document.dirty)
+        self.assertEqual(
+            document.content_hash,
+            self.window.documentContentHash(rtf_file.read_text(encoding="utf-8")),
+        )
+        with self.assertRaises(tk.TclError):
+            document.text.edit_undo()
+
+    def test_closing_a_rendering_note_cancels_the_render(self):
+        self.write_node("alpha", "word " * 2000)
+        self.window.populateNodeTree()
+
+        with mock.patch.object(app.RTFWindow, "PROGRESSIVE_RENDER_MIN_BYTES", 0), \
+                mock.patch.object(app.RTFWindow, "PROGRESSIVE_RENDER_SLICE_MS", 0):
+            document = self.window.tryReadShowRTF(None)
+            self.assertIsNotNone(document.render_job)
+            self.assertTrue(self.window.closeDocumentTab(document.tab_id))
+            self.window.window.update()
+
+        self.assertIsNone(document.render_job)
+        self.assertIsNot(document, self.window.active_document)
+
+    def test_failed_save_keeps_the_previous_note(self):
+        rtf_file = self.write_node("alpha", "before")
+        original = rtf_file.read_text(encoding="utf-8")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        self.window.text.insert("end-1c", " after")
+
+        with mock.patch.object(app.os, "replace", side_effect=OSError("disk full")), \
+                mock.patch.object(app.messagebox, "showerror") as showerror:
+            self.assertFalse(self.window.writeCurrentDocument(show_confirmation=False))
+
+        showerror.assert_called_once()
+        self.assertEqual(original, rtf_file.read_text(encoding="utf-8"))
+        self.assertEqual(["alpha.rtf"], sorted(
+            path.name for path in self.node_dir.iterdir() if path.is_file()
+        ))
+
+        self.assertTrue(self.window.writeCurrentDocument(show_confirmation=False))
+
+        saved = rtf_file.read_text(encoding="utf-8")
+        self.assertIn("before after", saved)
+        self.assertEqual(self.window.convertToRTF("1.0", "end"), saved)
+        self.assertEqual(self.window.documentContentHash(saved), document.content_hash)
+        self.assertEqual(["alpha.rtf"], sorted(
+            path.name for path in self.node_dir.iterdir() if path.is_file()
+        ))
+
+    def test_saved_note_is_indexed_from_the_editor_text(self):
+        self.write_node("alpha", "before")
+        self.window.populateNodeTree()
+        self.window.tryReadShowRTF(None)
+        self.window.text.insert("end-1c", " searchable after")
+        index = self.window.search_index
+
+        with mock.patch.object(index, "_read_rtf") as read_rtf, \
+                mock.patch.object(self.window.note_cache, "plain_text") as plain_text:
+            self.assertTrue(self.window.writeCurrentDocument(show_confirmation=False))
+            self.assertEqual({"updated": 0, "removed": 0}, index.refresh())
+
+        read_rtf.assert_not_called()
+        plain_text.assert_not_called()
+        self.assertEqual(["alpha"], [r.path for r in index.search("searchable")])
+
+    def test_background_save_writes_off_the_tk_thread_and_reports_failures(self):
+        rtf_file = self.write_node("alpha", "before")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        self.window.text.insert("end-1c", " after")
+        writer_threads = []
+        write_note_file = self.window.writeNoteFile
+
+        def record_writer_thread(*args):
+            writer_threads.append(threading.get_ident())
+            return write_note_file(*args)
+
+        with mock.patch.object(self.window, "writeNoteFile", side_effect=record_writer_thread):
+            self.assertTrue(
+                self.window.writeCurrentDocument(show_confirmation=False, background=True)
+            )
+            self.assertFalse(document.dirty)
+            self.assertFalse(document.text.edit_modified())
+            self.run_note_writes(1)
+
+        self.assertEqual(1, len(writer_threads))
+        self.assertNotEqual(threading.get_ident(), writer_threads[0])
+        saved = rtf_file.read_text(encoding="utf-8")
+        self.assertIn("before after", saved)
+        self.assertEqual(self.window.documentContentHash(saved), document.content_hash)
+
+        self.window.text.insert("end-1c", " again")
+        with mock.patch.object(app.os, "replace", side_effect=OSError("disk full")), \
+                mock.patch.object(app.messagebox, "showerror") as showerror:
+            self.assertTrue(
+                self.window.writeCurrentDocument(show_confirmation=False, background=True)
+            )
+            self.assertFalse(document.dirty)
+            self.run_note_writes(1)
+
+        showerror.assert_called_once()
+        self.assertTrue(document.dirty)
+        self.assertTrue(document.text.edit_modified())
+        self.assertEqual(saved, rtf_file.read_text(encoding="utf-8"))
+
+    def test_closing_a_tab_reports_its_failed_background_save_first(self):
+        rtf_file = self.write_node("alpha", "before")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        self.window.text.insert("end-1c", " after")
+
+        with mock.patch.object(self.window, "writeNoteFile", side_effect=OSError("file locked")), \
+                mock.patch.object(app.messagebox, "showerror") as showerror, \
+                mock.patch.object(app.messagebox, "askyesnocancel", return_value=None) as ask:
+            self.assertTrue(
+                self.window.writeCurrentDocument(show_confirmation=False, background=True)
+            )
+            self.assertFalse(document.dirty)
+            self.assertFalse(self.window.closeDocumentTab(document.tab_id))
+            showerror.assert_called_once()
+            ask.assert_called_once()
+            # the queued report of the same save is not shown again
+            self.run_note_writes(1)
+            showerror.assert_called_once()
+
+        self.assertTrue(document.dirty)
+        self.assertIs(document, self.window.open_documents_by_tab[document.tab_id])
+        self.assertEqual("before after", document.text.get("1.0", "end-1c"))
+        self.assertNotIn("after", rtf_file.read_text(encoding="utf-8"))
+
+    def test_autosave_restarts_on_edits_and_skips_unchanged_notes(self):
+        rtf_file = self.write_node("alpha", "Alpha text")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        self.window.autosave_seconds = 30
+
+        self.window.text.insert("end-1c", " changed")
+        self.window.scheduleDocumentAutosave(document.text)
+        first_timer = document.autosave_after_id
+        self.window.scheduleDocumentAutosave(document.text)
+
+        self.assertIsNotNone(first_timer)
+        self.assertNotEqual(first_timer, document.autosave_after_id)
+        self.window.cancelDocumentAutosave(document)
+        self.window.autosaveDocument(document)
+        self.assertFalse(document.dirty)
+        self.run_note_writes(1)
+        self.assertIn("Alpha text changed", rtf_file.read_text(encoding="utf-8"))
+
+        os.utime(rtf_file, ns=(1_000_000_000, 1_000_000_000))
+        self.window.text.insert("end-1c", "!")
+        self.window.text.delete("end-2c")
+        self.assertTrue(document.text.edit_modified())
+        with mock.patch.object(
+            self.window,
+            "writeRTFSnapshot",
+            wraps=self.window.writeRTFSnapshot,
+        ) as write_snapshot:
+            self.window.autosaveDocument(document)
+            self.run_note_writes(1)
+
+        write_snapshot.assert_called_once()
+        # the copy written to compare with the note is removed
+        self.assertEqual(
+            ["alpha.rtf"],
+            [path.name for path in rtf_file.parent.glob("*alpha.rtf*")],
+        )
+        self.assertEqual(1_000_000_000, rtf_file.stat().st_mtime_ns)
+        self.assertFalse(document.dirty)
+        self.assertFalse(document.text.edit_modified())
+
+    def test_closing_the_window_reports_a_failed_autosave_first(self):
+        rtf_file = self.write_node("alpha", "Alpha text")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        self.window.text.insert("end-1c", " changed")
+
+        with mock.patch.object(app.os, "replace", side_effect=OSError("disk full")), \
+                mock.patch.object(app.messagebox, "showerror") as showerror, \
+                mock.patch.object(app.messagebox, "askyesnocancel", return_value=None) as ask, \
+                mock.patch.object(self.window.window, "destroy") as destroy:
+            self.window.autosaveDocument(document)
+            self.assertFalse(document.dirty)
+            self.assertIsNone(self.window.closeWindow())
+            showerror.assert_called_once()
+            ask.assert_called_once()
+            self.run_note_writes(1)
+            showerror.assert_called_once()
+
+        destroy.assert_not_called()
+        self.assertTrue(document.dirty)
+        self.assertIs(document, self.window.active_document)
+        self.assertNotIn("changed", rtf_file.read_text(encoding="utf-8"))
+
+    def test_autosave_of_a_background_tab_keeps_undecoded_pictures(self):
+        self.write_node("alpha", "Alpha text")
+        self.window.populateNodeTree()
+        document = self.window.tryReadShowRTF(None)
+        gif_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (3, 2), "blue").save(gif_bytes, "GIF")
+        name = self.window.createEmbeddedPicture(
+            "end-1c",
+            app.EmbeddedPicture(gif_bytes.getvalue(), None, (3, 2)),
+        )
+        self.assertIsNone(self.window.embedded_images[name]["photo"])
+        self.window.activateDocument(self.window.createDocumentTab())
+        self.assertIsNot(document, self.window.active_document)
+
+        snapshot = self.window.snapshotRTF("1.0", "end", document)
+        saved = app.io.StringIO()
+        self.window.writeRTFSnapshot(saved, snapshot)
+
+        self.assertIn(r"{\pict\pngblip\picw45\pich30 ", saved.getvalue())
+        self.assertIsNone(document.embedded_images[name]["photo"])
+
     def test_canceling_reload_preserves_unsaved_edits(self):
         self.write_node("alpha", "Alpha text")
         self.window.populateNodeTree()
@@ -575,6 +983,49 @@ class TestRTFWindowFunctionality(unittest.TestCase):
             self.window.editor_tabs.tab(document.tab_id, "text"),
         )
 
+    def run_queued_until(self, descr):
+        while True:
+            item = self.window.actionQueue.get(timeout=5)
+            item.item()
+            if item.descr == descr:
+                return
+
+    def test_search_uses_the_background_index_and_repeats_once_it_catches_up(self):
+        self.write_node("alpha", "Alpha searchable phrase")
+        index = self.window.search_index
+        indexer = self.window.note_indexer
+        indexer.poll_seconds = 60
+        release = threading.Event()
+        refresh = index.refresh
+
+        def held_refresh(*args, **kwargs):
+            release.wait(5)
+            return refresh(*args, **kwargs)
+
+        with mock.patch.object(index, "refresh", side_effect=held_refresh), \
+                mock.patch.object(index, "refresh_and_search") as refresh_and_search:
+            indexer.start()
+            self.addCleanup(indexer.stop, 5)
+            self.window.showSearchDialog()
+            self.window.search_query_var.set("searchable")
+            self.window.startNoteSearch()
+            self.run_queued_until("showNoteSearchResults")
+
+            self.assertEqual({}, self.window.search_results)
+            self.assertIn("Indexing notes", self.window.search_status_var.get())
+            self.assertEqual("searchable", self.window.search_stale_query)
+
+            release.set()
+            self.run_queued_until("showNoteSearchResults")
+
+        refresh_and_search.assert_not_called()
+        self.assertEqual(["alpha"], list(self.window.search_results.values()))
+        self.assertEqual(
+            "1 match(es) for \u201csearchable\u201d.",
+            self.window.search_status_var.get(),
+        )
+        self.assertIsNone(self.window.search_stale_query)
+
     def test_search_result_opens_a_deep_lazily_loaded_node(self):
         self.write_node("alpha", "Alpha text")
         self.write_node(Path("alpha") / "beta", "Deep result text")
@@ -1330,6 +1781,22 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         self.assertEqual("Hello new text\n", self.window.text.get("1.0", "end"))
         self.assertFalse(self.window.text.tag_ranges("sel"))
 
+    def test_rich_text_paste_is_a_single_undo_step(self):
+        self.window.text.insert("1.0", "Hello world")
+        self.window.text.edit_separator()
+        self.window.text.mark_set("insert", "1.6")
+        self.window.clip.get_clipboard = (
+            lambda: r"{\rtf1\ansi {\b bold} and {\i italic} }"
+        )
+
+        self.window.pasteFromClipboard(None)
+        self.assertEqual("Hello bold and italic world", self.window.text.get("1.0", "end-1c"))
+        self.assertTrue(self.window.text.edit_modified())
+        self.window.text.edit_undo()
+
+        self.assertEqual("Hello world", self.window.text.get("1.0", "end-1c"))
+        self.assertIsNone(self.window.bulk_text_load)
+
     def test_copy_table_expands_tabs_to_spaces_for_plain_text_clipboard(self):
         self.window.insertTable(3, 2, has_header=True)
         self.window.text.tag_add("sel", "1.0", "end-1c")
@@ -1889,6 +2356,43 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         self.assertTrue(self.window.getTextStyleAt("1.0")["bold"])
         self.assertFalse(self.window.getTextStyleAt("1.5")["bold"])
 
+    def test_rendering_sends_styled_runs_in_batched_inserts(self):
+        rtf = (
+            r"{\rtf1\ansi\pard {\fonttbl\f0\fswiss Consolas;}\f0 "
+            + r"{\b bold} plain\par " * 200
+            + "}"
+        )
+
+        with mock.patch.object(
+            self.window.text,
+            "insert",
+            wraps=self.window.text.insert,
+        ) as insert:
+            self.window.displayNestedRTFStructure(
+                app.RTFParser(rtf, coalesce_text=True).parsecompact().root
+            )
+
+        self.assertEqual(1, insert.call_count)
+        self.assertEqual("bold plain\n" * 200, self.window.text.get("1.0", "end-1c"))
+        self.assertTrue(self.window.getTextStyleAt("200.0")["bold"])
+        self.assertFalse(self.window.getTextStyleAt("200.5")["bold"])
+        self.assertIsNone(self.window.styled_text_batch)
+
+    def test_batched_text_is_inserted_before_embedded_objects(self):
+        rtf = (
+            r"{\rtf1\ansi\pard {\fonttbl\f0\fswiss Consolas;}\f0 before "
+            r"{\supertexthr}after}"
+        )
+
+        self.window.displayNestedRTFStructure(
+            app.RTFParser(rtf, coalesce_text=True).parsecompact().root
+        )
+
+        rules = list(self.window.horizontal_rules)
+        self.assertEqual(1, len(rules))
+        self.assertEqual("1.7", self.window.text.index(rules[0]))
+        self.assertEqual("before after", self.window.text.get("1.0", "end-1c"))
+
     def test_centered_text_is_tagged_and_exported_to_rtf(self):
         self.window.openFile = str(self.node_dir / "scratch.rtf")
         self.window.text.insert("1.0", "Title")
@@ -2258,6 +2762,18 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         self.assertTrue(self.window.getTextStyleAt("1.0")["underline"])
         self.assertFalse(self.window.getTextStyleAt("1.11")["underline"])
 
+    def test_rtf_style_commands_ignore_unsupported_parameters(self):
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
+            r"\b Bold \b1 Still \par1 Same \b0 Plain}"
+        )
+
+        self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parseme())
+
+        self.assertEqual("Bold Still Same Plain\n", self.window.text.get("1.0", "end"))
+        self.assertTrue(self.window.getTextStyleAt("1.5")["bold"])
+        self.assertFalse(self.window.getTextStyleAt("1.16")["bold"])
+
     def test_display_nested_rtf_structure_only_decodes_actual_picture_group(self):
         rtf_text = (
             r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
@@ -2274,6 +2790,188 @@ class TestRTFWindowFunctionality(unittest.TestCase):
         printed = " ".join(str(arg) for call in print_mock.call_args_list for arg in call.args)
         self.assertNotIn("non-hexadecimal", printed)
 
+    def test_display_nested_rtf_structure_decodes_wrapped_picture_payload(self):
+        image_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (3, 2), "blue").save(image_bytes, "PNG")
+        image_hex = image_bytes.getvalue().hex()
+        wrapped_hex = "\r\n".join(
+            image_hex[start:start + 16]
+            for start in range(0, len(image_hex), 16)
+        )
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
+            r"{\pict\pngblip\picw90\pich60 " + wrapped_hex + "}}"
+        )
+
+        self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parseme())
+
+        self.assertEqual(1, len(self.window.embedded_images))
+        image = next(iter(self.window.embedded_images.values()))["original"]
+        self.assertEqual((3, 2), image.size)
+
+    def test_display_nested_rtf_structure_decodes_pictures_on_the_pool_in_order(self):
+        pictures = []
+        for width in (3, 4, 5):
+            image_bytes = app.io.BytesIO()
+            app.Image.new("RGB", (width, 2), "blue").save(image_bytes, "PNG")
+            pictures.append(
+                f"{width}{{\\pict\\pngblip\\picw90\\pich60 {image_bytes.getvalue().hex()}}}"
+            )
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
+            + " ".join(pictures) + " end}"
+        )
+        decoding_threads = set()
+        decode = self.window.decodeRTFImageGroup
+
+        def record_decode(structure):
+            decoding_threads.add(threading.get_ident())
+            return decode(structure)
+
+        with mock.patch.object(self.window, "decodeRTFImageGroup", side_effect=record_decode):
+            self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parsecompact().root)
+
+        self.assertNotIn(threading.get_ident(), decoding_threads)
+        self.assertEqual([], [
+            name for name in self.window.text.mark_names()
+            if name.startswith("rtf_pending_image_")
+        ])
+        dump = self.window.text.dump("1.0", "end-1c", text=True, image=True)
+        self.assertEqual(
+            ["text", "image", "text", "image", "text", "image", "text"],
+            [kind for kind, _group in itertools.groupby(item[0] for item in dump)],
+        )
+        self.assertEqual("3 4 5 end", self.window.text.get("1.0", "end-1c"))
+        self.assertEqual(
+            [(3, 2), (4, 2), (5, 2)],
+            [
+                self.window.embedded_images[value]["original"].size
+                for kind, value, _index in dump
+                if kind == "image"
+            ],
+        )
+
+    def test_adjacent_pictures_keep_their_order_when_decoded_on_the_pool(self):
+        picture_bytes = []
+        for width in (3, 4, 5):
+            image_bytes = app.io.BytesIO()
+            app.Image.new("RGB", (width, 2), "blue").save(image_bytes, "PNG")
+            picture_bytes.append(image_bytes.getvalue())
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 start"
+            + "".join(
+                r"{\pict\pngblip\picw90\pich60 " + data.hex() + "}"
+                for data in picture_bytes
+            )
+            + "end}"
+        )
+
+        self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parsecompact().root)
+
+        dump = self.window.text.dump("1.0", "end-1c", text=True, image=True)
+        self.assertEqual(
+            picture_bytes,
+            [
+                self.window.embedded_images[value]["data"]
+                for kind, value, _index in dump
+                if kind == "image"
+            ],
+        )
+        self.assertEqual("startend", self.window.text.get("1.0", "end-1c"))
+        saved = self.window.convertToRTF("1.0", "end")
+        positions = [saved.index(data.hex()) for data in picture_bytes]
+        self.assertEqual(sorted(positions), positions)
+
+    def test_pictures_far_from_view_are_placeholders_until_scrolled_near(self):
+        near_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (6, 4), "blue").save(near_bytes, "PNG")
+        far_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (6, 4), "red").save(far_bytes, "JPEG")
+        far_hex = far_bytes.getvalue().hex()
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
+            r"{\pict\pngblip\picw90\pich60 " + near_bytes.getvalue().hex() + "}"
+            + r"\par " * (app.RTFWindow.IMAGE_RELEASE_MARGIN_LINES * 2)
+            + r"{\pict\jpegblip\picw90\pich60 " + far_hex + "}}"
+        )
+
+        self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parsecompact().root)
+
+        near_name, far_name = sorted(
+            self.window.embedded_images,
+            key=lambda name: self.window.text.compare(name, ">", "1.0"),
+        )
+        near = self.window.embedded_images[near_name]
+        far = self.window.embedded_images[far_name]
+        self.assertIsNotNone(near["original"])
+        self.assertIsNone(far["original"])
+        self.assertEqual("2", str(self.window.text.image_cget(far_name, "padx")))
+        self.assertEqual("1", str(self.window.text.image_cget(far_name, "pady")))
+        self.assertIn(r"{\pict\jpegblip\picw90\pich60 " + far_hex + "}", self.window.convertToRTF("1.0", "end"))
+        self.assertIsNone(far["original"])
+
+        self.window.text.see(far_name)
+        self.window.window.update_idletasks()
+        self.window.refreshEmbeddedImages()
+
+        self.assertEqual((6, 4), far["original"].size)
+        self.assertEqual("0", str(self.window.text.image_cget(far_name, "padx")))
+        self.assertIsNone(near["original"])
+        self.assertIsNone(near["photo"])
+
+    def test_only_pictures_saved_from_their_bytes_are_released(self):
+        names = []
+        for image_format in ("PNG", "GIF"):
+            image_bytes = app.io.BytesIO()
+            app.Image.new("RGB", (3, 2), "blue").save(image_bytes, image_format)
+            image = app.Image.open(app.io.BytesIO(image_bytes.getvalue()))
+            image.load()
+            picture = app.EmbeddedPicture(
+                image_bytes.getvalue(),
+                app.RTFWindow.RTF_PICTURE_BLIPS.get(image_format),
+                image.size,
+                image,
+            )
+            names.append(self.window.createEmbeddedPicture("end-1c", picture))
+        png_name, gif_name = names
+
+        for name in names:
+            self.window.releaseEmbeddedImage(name)
+
+        self.assertIsNone(self.window.embedded_images[png_name]["original"])
+        self.assertIsNotNone(self.window.embedded_images[gif_name]["original"])
+        self.assertEqual(
+            2,
+            self.window.convertToRTF("1.0", "end").count(r"{\pict\pngblip\picw45\pich30 "),
+        )
+
+    def test_unchanged_pictures_are_saved_from_their_original_bytes(self):
+        jpeg_bytes = app.io.BytesIO()
+        app.Image.new("RGB", (6, 4), "red").save(jpeg_bytes, "JPEG")
+        jpeg_hex = jpeg_bytes.getvalue().hex()
+        rtf_text = (
+            r"{\rtf1\ansi\pard {\fonttbl{\f0\fswiss Consolas;}}\f0 "
+            r"{\pict\jpegblip\picw90\pich60 " + jpeg_hex + "}}"
+        )
+        self.window.displayNestedRTFStructure(app.RTFParser(rtf_text).parsecompact().root)
+        (name,) = self.window.embedded_images
+        self.assertIsNotNone(self.window.embedded_images[name]["original"])
+
+        with mock.patch.object(app.Image.Image, "save") as save:
+            rtf = self.window.convertToRTF("1.0", "end")
+
+        save.assert_not_called()
+        self.assertIn(r"{\pict\jpegblip\picw90\pich60 " + jpeg_hex + "}", rtf)
+
+        self.window.resizeEmbeddedImage(name, 12, 8)
+        rtf = self.window.convertToRTF("1.0", "end")
+
+        self.assertNotIn(r"\jpegblip", rtf)
+        self.assertIn(r"{\pict\pngblip\picw180\pich120 ", rtf)
+        with mock.patch.object(app.Image.Image, "save") as save:
+            self.assertEqual(rtf, self.window.convertToRTF("1.0", "end"))
+        save.assert_not_called()
+
     def test_embedded_file_round_trips_through_rtf(self):
         name = self.window.createEmbeddedFile('1.0', 'payload.bin', b'\x00\xffdata')
 
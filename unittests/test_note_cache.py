@@ -0,0 +1,140 @@
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from src.note_cache import NoteCache
+from src.RTFParser import RTFParseError, RTFParser
+from src.search_index import NoteSearchIndex
+
+
+RTF_HEADER = r"{\rtf1\ansi\pard {\fonttbl\f0\fswiss Consolas;}\f0 "
+
+
+class TestNoteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.cache = NoteCache()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_note(self, relative_path, body, mtime_ns=None):
+        path = self.root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(RTF_HEADER + body + "}", encoding="utf-8")
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_second_read_is_a_hit_and_shares_the_tree(self):
+        path = self.write_note("note.rtf", r"Hello {\b bold} world")
+
+        data, tree = self.cache.parsed(path)
+        again_data, again_tree = self.cache.parsed(path)
+
+        self.assertEqual(path.read_text(encoding="utf-8"), data)
+        self.assertEqual(RTFParser(data, coalesce_text=True).parseme(), tree.tolist())
+        self.assertIs(tree, again_tree)
+        self.assertIs(data, again_data)
+        self.assertEqual(1, self.cache.stats()["hits"])
+        self.assertEqual(1, self.cache.stats()["misses"])
+
+    def test_changed_signature_misses(self):
+        path = self.write_note("note.rtf", "before", mtime_ns=1_000_000_000)
+        self.cache.parsed(path)
+
+        self.write_note("note.rtf", "after!", mtime_ns=1_000_000_000)
+        self.assertIn("before", self.cache.parsed(path)[0])
+
+        self.write_note("note.rtf", "a longer body", mtime_ns=1_000_000_000)
+        self.assertIn("a longer body", self.cache.parsed(path)[0])
+
+        self.write_note("note.rtf", "different", mtime_ns=2_000_000_000)
+        self.assertIn("different", self.cache.parsed(path)[0])
+
+        self.assertEqual({"hits": 1, "misses": 3}, {
+            key: self.cache.stats()[key] for key in ("hits", "misses")
+        })
+
+    def test_discard_forces_a_fresh_read(self):
+        path = self.write_note("note.rtf", "before", mtime_ns=1_000_000_000)
+        self.cache.parsed(path)
+        self.write_note("note.rtf", "after!", mtime_ns=1_000_000_000)
+
+        self.cache.discard(path)
+
+        self.assertIn("after!", self.cache.parsed(path)[0])
+        self.assertEqual(0, self.cache.stats()["hits"])
+
+    def test_least_recently_used_notes_are_evicted_within_budget(self):
+        paths = [
+            self.write_note(f"note{index}.rtf", "word " * 200)
+            for index in range(3)
+        ]
+        self.cache.parsed(paths[0])
+        entry_bytes = self.cache.stats()["bytes"]
+        self.cache.set_max_bytes(entry_bytes * 2)
+
+        self.cache.parsed(paths[1])
+        self.cache.parsed(paths[0])
+        self.cache.parsed(paths[2])
+
+        stats = self.cache.stats()
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(1, stats["evictions"])
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+        self.cache.parsed(paths[0])
+        self.assertEqual(2, self.cache.stats()["hits"])
+
+    def test_note_larger_than_budget_is_not_cached(self):
+        path = self.write_note("note.rtf", "word " * 200)
+        self.cache.set_max_bytes(100)
+
+        self.cache.parsed(path)
+
+        self.assertEqual(0, self.cache.stats()["entries"])
+        self.assertEqual(0, self.cache.stats()["bytes"])
+
+    def test_plain_text_reuses_the_cached_tree(self):
+        path = self.write_note("note.rtf", r"Visible{\par }text")
+        self.cache.parsed(path)
+
+        with mock.patch("src.note_cache.read_note_text") as read_note_text, \
+                mock.patch.object(RTFParser, "iterevents") as iterevents:
+            text = self.cache.plain_text(path)
+            self.assertEqual(text, self.cache.plain_text(path))
+
+        read_note_text.assert_not_called()
+        iterevents.assert_not_called()
+        self.assertEqual("Visible\ntext", text)
+        self.assertEqual(1, self.cache.stats()["entries"])
+
+    def test_parse_errors_are_not_cached(self):
+        path = self.root / "broken.rtf"
+        path.write_text(r"{\rtf1 unterminated", encoding="utf-8")
+
+        for _ in range(2):
+            with self.assertRaises(RTFParseError):
+                self.cache.parsed(path)
+
+        self.assertEqual(2, self.cache.stats()["misses"])
+        self.assertEqual(0, self.cache.stats()["entries"])
+
+    def test_search_index_reads_plain_text_through_the_cache(self):
+        self.write_note("alpha.rtf", "A searchable HayStack value")
+        index = NoteSearchIndex(self.root, note_cache=self.cache)
+
+        index.refresh()
+        with mock.patch.object(NoteSearchIndex, "_read_rtf") as read_rtf:
+            results = index.search("haystack")
+
+        read_rtf.assert_not_called()
+        self.assertEqual(["alpha"], [result.path for result in results])
+        self.assertEqual(1, self.cache.stats()["hits"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+from pathlib import Path
+import tempfile
+import threading
+import sqlite3
+import time
+import unittest
+from unittest import mock
+
+from src.note_indexer import NoteIndexer
+from src.search_index import NoteSearchIndex
+
+
+RTF_HEADER = r"{\rtf1\ansi\pard {\fonttbl\f0\fswiss Consolas;}\f0 "
+
+
+class FakeIndex:
+    def __init__(self, changes=()):
+        self.changes = list(changes)
+        self.pending_calls = 0
+        self.refresh_calls = 0
+        self.refresh = self.refresh_once
+
+    def pending_changes(self):
+        self.pending_calls += 1
+        if len(self.changes) > 1:
+            return self.changes.pop(0)
+        return self.changes[0] if self.changes else frozenset()
+
+    def refresh_once(self, progress=None):
+        self.refresh_calls += 1
+        self.changes = []
+        if progress is not None:
+            progress(0, 1)
+            progress(1, 1)
+
+
+class TestNoteIndexer(unittest.TestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "indexer did not finish")
+            time.sleep(0.005)
+
+    def start(self, index, **options):
+        indexer = NoteIndexer(index, **options)
+        indexer.start()
+        self.addCleanup(indexer.stop, 5)
+        return indexer
+
+    def test_notes_are_indexed_on_start_and_after_they_change(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        (root / "alpha.rtf").write_text(RTF_HEADER + "Alpha phrase}", encoding="utf-8")
+        index = NoteSearchIndex(root)
+        self.addCleanup(index.close)
+        changes = []
+        indexer = self.start(
+            index,
+            poll_seconds=60,
+            settle_seconds=0.01,
+            on_change=lambda: changes.append(indexer.status()),
+        )
+
+        self.wait_for(lambda: indexer.status()["ready"])
+        self.assertEqual(["alpha"], [r.path for r in index.search("alpha phrase")])
+        self.assertTrue(any(status["indexing"] for status in changes))
+
+        (root / "beta.rtf").write_text(RTF_HEADER + "Beta phrase}", encoding="utf-8")
+        indexer.poll_now()
+        self.wait_for(lambda: indexer.status()["refreshes"] == 2)
+
+        self.assertEqual(["beta"], [r.path for r in index.search("beta phrase")])
+        self.assertEqual(
+            {"ready": True, "indexing": False, "pending": 0, "refreshes": 2, "error": None},
+            indexer.status(),
+        )
+
+    def test_a_burst_of_changes_is_indexed_once_it_settles(self):
+        first = frozenset({("a.rtf", 1, 1)})
+        second = frozenset({("a.rtf", 1, 1), ("b.rtf", 2, 2)})
+        index = FakeIndex()
+        indexer = self.start(index, poll_seconds=60, settle_seconds=0.01)
+        self.wait_for(lambda: indexer.status()["ready"])
+
+        index.changes = [first, second, second]
+        indexer.poll_now()
+        self.wait_for(lambda: indexer.status()["refreshes"] == 2)
+
+        self.assertEqual(2, index.refresh_calls)
+        self.assertEqual(3, index.pending_calls)
+
+    def test_stop_interrupts_a_refresh_between_notes(self):
+        index = FakeIndex()
+        storing = threading.Event()
+        stored = []
+
+        def slow_refresh(progress=None):
+            for done in range(3):
+                progress(done, 3)
+                stored.append(done)
+                storing.set()
+                time.sleep(0.05)
+
+        index.refresh = slow_refresh
+        indexer = self.start(index)
+        storing.wait(5)
+        indexer.stop(5)
+
+        self.assertFalse(indexer.running)
+        self.assertLess(len(stored), 3)
+        self.assertFalse(indexer.status()["ready"])
+
+    def test_index_closed_while_stopping_is_not_reopened(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        for name in ("alpha", "beta"):
+            (root / f"{name}.rtf").write_text(RTF_HEADER + name + "}", encoding="utf-8")
+        index = NoteSearchIndex(root)
+        self.addCleanup(index.close)
+        parsing = threading.Event()
+        release = threading.Event()
+        note_grams = index._note_grams
+
+        def slow_note_grams(full_path, stat):
+            parsing.set()
+            release.wait(5)
+            return note_grams(full_path, stat)
+
+        with mock.patch.object(index, "_note_grams", side_effect=slow_note_grams), \
+                mock.patch("src.search_index.sqlite3.connect", wraps=sqlite3.connect) as connect:
+            indexer = self.start(index)
+            parsing.wait(5)
+            indexer.stop(0.01)
+            self.assertTrue(indexer.running)
+
+            index.close()
+            release.set()
+            self.wait_for(lambda: not indexer.running)
+
+        self.assertEqual(1, connect.call_count)
+        self.assertFalse(indexer.status()["ready"])
+
+    def test_failed_refresh_is_reported_and_retried(self):
+        index = FakeIndex()
+        failures = []
+
+        def failing_refresh(progress=None):
+            if not failures:
+                failures.append(1)
+                raise OSError("disk unavailable")
+            index.refresh_once(progress)
+
+        index.refresh = failing_refresh
+        indexer = self.start(index, poll_seconds=60)
+        self.wait_for(lambda: indexer.status()["error"] is not None)
+        self.assertEqual("disk unavailable", indexer.status()["error"])
+
+        indexer.poll_now()
+        self.wait_for(lambda: indexer.status()["ready"])
+        self.assertIsNone(indexer.status()["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+import unittest
+
+from src.note_prefetch import NotePrefetcher
+
+
+class TestNotePrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.loaded = []
+        self.prefetcher = NotePrefetcher(self.load, len)
+
+    def tearDown(self):
+        self.prefetcher.clear()
+        self.tmp.cleanup()
+
+    def load(self, path):
+        self.loaded.append(path)
+        return Path(path).read_text(encoding="utf-8")
+
+    def write_note(self, name, body, mtime_ns=None):
+        path = self.root / name
+        path.write_text(body, encoding="utf-8")
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return str(path)
+
+    def wait_for_loads(self, count):
+        deadline = time.monotonic() + 5
+        while self.prefetcher.stats()["loads"] < count:
+            self.assertLess(time.monotonic(), deadline, "prefetch did not finish")
+            time.sleep(0.005)
+
+    def test_prefetched_note_is_taken_once(self):
+        path = self.write_note("alpha.rtf", "alpha")
+
+        self.prefetcher.prefetch([path])
+        self.wait_for_loads(1)
+
+        self.assertEqual("alpha", self.prefetcher.take(path))
+        self.assertIsNone(self.prefetcher.take(path))
+        stats = self.prefetcher.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(0, stats["bytes"])
+
+    def test_note_edited_after_prefetch_misses(self):
+        path = self.write_note("alpha.rtf", "before", mtime_ns=1_000_000_000)
+        self.prefetcher.prefetch([path])
+        self.wait_for_loads(1)
+
+        self.write_note("alpha.rtf", "after!", mtime_ns=2_000_000_000)
+
+        self.assertIsNone(self.prefetcher.take(path))
+        self.assertEqual(0, self.prefetcher.stats()["entries"])
+
+    def test_already_prefetched_notes_are_not_loaded_again(self):
+        path = self.write_note("alpha.rtf", "alpha")
+        other = self.write_note("beta.rtf", "beta")
+
+        self.prefetcher.prefetch([path])
+        self.wait_for_loads(1)
+        self.prefetcher.prefetch([path, other])
+        self.wait_for_loads(2)
+
+        self.assertEqual([path, other], self.loaded)
+
+    def test_budget_evicts_least_recently_prefetched_notes(self):
+        paths = [self.write_note(f"note{index}.rtf", "x" * 10) for index in range(3)]
+        self.prefetcher.set_max_bytes(25)
+
+        self.prefetcher.prefetch(paths)
+        self.wait_for_loads(3)
+
+        stats = self.prefetcher.stats()
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(1, stats["evictions"])
+        self.assertIsNone(self.prefetcher.take(paths[0]))
+        self.assertEqual("x" * 10, self.prefetcher.take(paths[2]))
+
+    def test_note_larger_than_budget_is_not_kept(self):
+        path = self.write_note("alpha.rtf", "x" * 100)
+        self.prefetcher.set_max_bytes(10)
+
+        self.prefetcher.prefetch([path])
+        self.wait_for_loads(1)
+
+        self.assertEqual(0, self.prefetcher.stats()["entries"])
+        self.assertIsNone(self.prefetcher.take(path))
+
+    def test_new_request_replaces_notes_not_started_yet(self):
+        release = threading.Event()
+        paths = [self.write_note(f"note{index}.rtf", "x") for index in range(3)]
+
+        def blocking_load(path):
+            self.loaded.append(path)
+            release.wait(5)
+            return "x"
+
+        prefetcher = NotePrefetcher(blocking_load, len)
+        prefetcher.prefetch(paths[:2])
+        deadline = time.monotonic() + 5
+        while not self.loaded:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+        prefetcher.prefetch(paths[2:])
+        release.set()
+        deadline = time.monotonic() + 5
+        while prefetcher.stats()["loads"] < 2:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+        self.assertEqual([paths[0], paths[2]], self.loaded)
+
+    def test_failed_loads_are_skipped(self):
+        missing = str(self.root / "missing.rtf")
+        path = self.write_note("alpha.rtf", "alpha")
+
+        def failing_load(load_path):
+            if load_path == path:
+                raise ValueError("broken note")
+            return self.load(load_path)
+
+        prefetcher = NotePrefetcher(failing_load, len)
+        other = self.write_note("beta.rtf", "beta")
+        prefetcher.prefetch([missing, path, other])
+        deadline = time.monotonic() + 5
+        while prefetcher.stats()["loads"] < 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.005)
+
+        self.assertIsNone(prefetcher.take(path))
+        self.assertEqual("beta", prefetcher.take(other))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,12 @@
 # RTF parsing
-from src.RTFParser import RTFParseError, RTFParser
+from src.RTFParser import (
+    RTFControlWord,
+    RTFParseError,
+    RTFParser,
+    RTFPayload,
+    RTFTokenGroup,
+    RTFTokenStream,
+)
 
 import random
 import string
@@ -14,9 +21,19 @@ class TestRTFParsing(unittest.TestCase):
 
             self.assertIsInstance(token, tuple)
             self.assertEqual(2, len(token))
+            if token[0] == "PAYLOAD":
+                self.assertIsInstance(token[1], RTFPayload)
+                continue
             self.assertIn(token[0], {"TEXT", "CMDPARAM", "RTFCMD"})
             self.assertIsInstance(token[1], str)
 
+    def flatten_tokens(self, tokens):
+        for token in tokens:
+            if isinstance(token, list):
+                yield from self.flatten_tokens(token)
+            else:
+                yield token
+
     def test_basicfile(self):
         testfile_path = 'unittests/files/t2.rtf'
         with open(testfile_path, 'r') as fi:
@@ -124,6 +141,313 @@ class TestRTFParsing(unittest.TestCase):
     def test_missing_root_group_fails(self):
         self.assertRaises(RTFParseError, lambda: RTFParser(r"\rtf1").parseme())
 
+    def test_out_of_range_unicode_escape_fails(self):
+        for value in ("1114112", "99999999999999999999999"):
+            with self.subTest(value=value):
+                self.assertRaises(
+                    RTFParseError,
+                    lambda: RTFParser(r"{\rtf1 \u" + value + "?}").parseme(),
+                )
+
+    def test_unicode_escape_without_terminator_is_a_command(self):
+        self.assertEqual(
+            [("RTFCMD", "rtf1"), ("RTFCMD", "u9731"), ("TEXT", "x")],
+            RTFParser(r"{\rtf1\u9731 x}").parseme(),
+        )
+
+    def test_deeply_nested_groups_parse_without_recursion(self):
+        depth = 100_000
+        rtf_text = r"{\rtf1" + "{\\b x" * depth + "}" * depth + "}"
+
+        group = RTFParser(rtf_text).parseme()
+        for _ in range(depth):
+            group = group[-1]
+            self.assertEqual([("RTFCMD", "b"), ("CMDPARAM", "x")], group[:2])
+
+        self.assertEqual(2, len(group))
+
+    def test_control_words_are_split_into_name_and_parameter(self):
+        parsed = RTFParser(r"{\rtf1\fs28\b0\par{\colortbl\blue255;}\*\li-360 x}").parseme()
+        words = [token[1] for token in self.flatten_tokens(parsed) if token[0] == "RTFCMD"]
+
+        self.assertEqual(
+            [
+                ("rtf", 1),
+                ("fs", 28),
+                ("b", 0),
+                ("par", None),
+                ("colortbl", None),
+                ("blue255;", None),
+                ("*", None),
+                ("li-360", None),
+            ],
+            [(word.name, word.parameter) for word in words],
+        )
+        for word in words:
+            self.assertIsInstance(word, RTFControlWord)
+
+    def test_control_words_compare_as_their_text(self):
+        parsed = RTFParser(r"{\rtf1\fs28 x}").parseme()
+
+        self.assertEqual(("RTFCMD", "fs28"), parsed[1])
+        self.assertEqual("fs28", str(parsed[1][1]))
+        self.assertIn(parsed[1][1], {"fs28"})
+
+    def test_coalesce_text_merges_text_whitespace_and_escapes(self):
+        rtf_text = "{\\rtf1\\ansi two  words \\{x\\} \\u9731?{\\b bold text}\\par\r\nnext line}"
+
+        self.assertEqual(
+            [
+                ("RTFCMD", "rtf1"),
+                ("RTFCMD", "ansi"),
+                ("TEXT", "two  words {x} \u2603"),
+                [("RTFCMD", "b"), ("CMDPARAM", "bold text")],
+                ("RTFCMD", "par"),
+                ("TEXT", "\nnext line"),
+            ],
+            RTFParser(rtf_text, coalesce_text=True).parseme(),
+        )
+
+    def test_picture_hex_is_one_payload_token(self):
+        rtf_text = "{\\rtf1{\\pict\\pngblip\\picw1\\pich1 8950\r\n4e47 }tail}"
+
+        parsed = RTFParser(rtf_text).parseme()
+
+        self.assertEqual(
+            [("RTFCMD", "pict"), ("RTFCMD", "pngblip"), ("RTFCMD", "picw1"), ("RTFCMD", "pich1")],
+            parsed[1][:4],
+        )
+        self.assertEqual(5, len(parsed[1]))
+        kind, payload = parsed[1][4]
+        self.assertEqual("PAYLOAD", kind)
+        self.assertEqual("8950\r\n4e47 ", payload.text)
+        self.assertEqual(b"\x89\x50\x4e\x47", payload.decode())
+        self.assertEqual(("TEXT", "tail"), parsed[2])
+
+    def test_attachment_data_is_one_payload_token(self):
+        parsed = RTFParser(r"{\rtf1{\*\supertextfile{\supertextdata 00ff}}}").parseme()
+
+        self.assertEqual(b"\x00\xff", parsed[1][2][1][1].decode())
+
+    def test_binary_group_with_other_content_keeps_text_tokens(self):
+        parsed = RTFParser(r"{\rtf1{\pict 4142\par 43}}").parseme()
+
+        self.assertEqual(
+            [
+                ("RTFCMD", "pict"),
+                ("CMDPARAM", "4142"),
+                ("RTFCMD", "par"),
+                ("CMDPARAM", "43"),
+            ],
+            parsed[1],
+        )
+
+    def test_payload_is_only_detected_in_binary_groups(self):
+        parsed = RTFParser(r"{\rtf1{\pict}{\b 4142}{\picture 4142}}").parseme()
+
+        self.assertEqual([("RTFCMD", "b"), ("CMDPARAM", "4142")], parsed[2])
+        self.assertEqual([("RTFCMD", "picture"), ("CMDPARAM", "4142")], parsed[3])
+
+    def test_root_binary_group_is_parsed_alike_by_every_reader(self):
+        for rtf_text in (r"{\pict\pngblip 4142}", r"{\supertextdata 00ff}"):
+            for coalesce_text in (False, True):
+                with self.subTest(rtf_text=rtf_text, coalesce_text=coalesce_text):
+                    parsed = RTFParser(rtf_text, coalesce_text=coalesce_text).parseme()
+
+                    self.assertEqual("PAYLOAD", parsed[-1][0])
+                    self.assertEqual(
+                        parsed,
+                        RTFParser(rtf_text, coalesce_text=coalesce_text).parsecompact().root,
+                    )
+                    self.assertEqual(
+                        parsed,
+                        self.tree_from_events(
+                            RTFParser(rtf_text, coalesce_text=coalesce_text).iterevents()
+                        ),
+                    )
+
+    def test_compact_stream_reads_as_the_parsed_tree(self):
+        rtf_text = (
+            "{\\rtf1\\ansi two  words \\{x\\} \\u9731?{\\b bold}"
+            "{\\pict\\pngblip 8950\r\n4e47}\\par\r\nnext}"
+        )
+
+        for coalesce_text in (False, True):
+            with self.subTest(coalesce_text=coalesce_text):
+                stream = RTFParser(rtf_text, coalesce_text=coalesce_text).parsecompact()
+                parsed = RTFParser(rtf_text, coalesce_text=coalesce_text).parseme()
+
+                self.assertIsInstance(stream, RTFTokenStream)
+                self.assertEqual(parsed, stream.root)
+                self.assertEqual(parsed, stream.root.tolist())
+                tokens = list(stream.root)
+                self.assertIsInstance(tokens[0][1], RTFControlWord)
+                groups = [token for token in tokens if isinstance(token, RTFTokenGroup)]
+                self.assertEqual(2, len(groups))
+                kind, payload = groups[1][-1]
+                self.assertEqual("PAYLOAD", kind)
+                self.assertEqual(b"\x89\x50\x4e\x47", payload.decode())
+
+    def test_compact_stream_stores_spans_of_the_source(self):
+        rtf_text = r"{\rtf1 a\{b{\b c}}"
+
+        stream = RTFParser(rtf_text, coalesce_text=True).parsecompact()
+
+        G, CMD, TEXT, PARAM = (
+            RTFTokenStream.GROUP,
+            RTFTokenStream.RTFCMD,
+            RTFTokenStream.TEXT,
+            RTFTokenStream.CMDPARAM,
+        )
+        self.assertEqual([G, CMD, TEXT, G, CMD, PARAM], list(stream.kinds))
+        self.assertEqual([-1, 0, 0, 0, 3, 3], list(stream.parents))
+        self.assertEqual("rtf1", rtf_text[stream.starts[1]:stream.ends[1]])
+        # Groups end at the row past their last descendant.
+        self.assertEqual([6, 6], [stream.ends[0], stream.ends[3]])
+        # Only the run that joined an escaped brace differs from the source.
+        self.assertEqual({2: "a{b"}, stream.values)
+        self.assertEqual("c", stream.value(5))
+        self.assertGreater(stream.nbytes, 0)
+
+    def test_compact_group_reads_like_a_list(self):
+        root = RTFParser(r"{\rtf1 a{\b c}d}").parsecompact().root
+
+        self.assertEqual(4, len(root))
+        self.assertEqual(("RTFCMD", "rtf1"), root[0])
+        self.assertEqual(("TEXT", "d"), root[-1])
+        self.assertEqual([("TEXT", "a"), [("RTFCMD", "b"), ("CMDPARAM", "c")]], root[1:3])
+        self.assertIs(root.stream, root[2].parent.stream)
+        self.assertEqual(0, root[2].parent.row)
+        self.assertIsNone(root.parent)
+        with self.assertRaises(IndexError):
+            root[4]
+
+    def test_compact_stream_rejects_what_parseme_rejects(self):
+        for rtf_text in ("", "x{}", "{\\", "{\\ x}", "{a", "{}}", "{\\u1114112?}", "{{\\pict ab}"):
+            with self.subTest(rtf_text=rtf_text):
+                with self.assertRaises(RTFParseError) as expected:
+                    RTFParser(rtf_text).parseme()
+                with self.assertRaises(RTFParseError) as compact:
+                    RTFParser(rtf_text).parsecompact()
+                self.assertEqual(str(expected.exception), str(compact.exception))
+
+    def test_compact_stream_replays_parser_events(self):
+        rtf_text = r"{\rtf1 a{\pict 41{\x}}{\b bold{\i x}y}\\}"
+        for skipped in (None, "pict", "i"):
+            with self.subTest(skipped=skipped):
+                streamed = []
+                for source in (
+                    RTFParser(rtf_text, coalesce_text=True),
+                    RTFParser(rtf_text, coalesce_text=True).parsecompact(),
+                ):
+                    events = []
+                    walk = source.iterevents()
+                    for event in walk:
+                        events.append(event)
+                        if event == ("RTFCMD", skipped):
+                            walk.skip_group()
+                    streamed.append(events)
+                self.assertEqual(streamed[0], streamed[1])
+
+    def tree_from_events(self, events):
+        root = group = []
+        parents = []
+        for event, value in events:
+            if event == "GROUP_START":
+                child = []
+                group.append(child)
+                parents.append(group)
+                group = child
+            elif event == "GROUP_END":
+                group = parents.pop()
+            else:
+                group.append((event, value))
+        return root[0]
+
+    def test_walks_of_a_shared_stream_skip_groups_independently(self):
+        stream = RTFParser(r"{\rtf1{\b bold}tail}").parsecompact()
+        skipping = stream.iterevents()
+        reading = stream.iterevents()
+        skipped = []
+        read = []
+
+        for event in skipping:
+            skipped.append(event)
+            if event == ("RTFCMD", "b"):
+                skipping.skip_group()
+                # the other walk reaches the same group before this one resumes
+                read.extend(next(reading) for _ in range(5))
+        read.extend(reading)
+
+        self.assertNotIn(("CMDPARAM", "bold"), skipped)
+        self.assertEqual(
+            [
+                ("GROUP_START", None),
+                ("RTFCMD", "rtf1"),
+                ("GROUP_START", None),
+                ("RTFCMD", "b"),
+                ("CMDPARAM", "bold"),
+                ("GROUP_END", None),
+                ("TEXT", "tail"),
+                ("GROUP_END", None),
+            ],
+            read,
+        )
+
+    def test_iterevents_streams_groups_commands_and_text(self):
+        self.assertEqual(
+            [
+                ("GROUP_START", None),
+                ("RTFCMD", "rtf1"),
+                ("TEXT", "a"),
+                ("GROUP_START", None),
+                ("RTFCMD", "b"),
+                ("CMDPARAM", "bold"),
+                ("GROUP_END", None),
+                ("TEXT", "\\"),
+                ("GROUP_END", None),
+            ],
+            list(RTFParser(r"{\rtf1 a{\b bold}\\}").iterevents()),
+        )
+
+    def test_skip_group_passes_over_the_rest_of_the_group(self):
+        parser = RTFParser(r"{\rtf1{\pict 41\}42{\u99999999? x}}tail}")
+        events = []
+        walk = parser.iterevents()
+        for event in walk:
+            events.append(event)
+            if event == ("RTFCMD", "pict"):
+                walk.skip_group()
+
+        self.assertEqual(
+            [
+                ("GROUP_START", None),
+                ("RTFCMD", "rtf1"),
+                ("GROUP_START", None),
+                ("RTFCMD", "pict"),
+                ("GROUP_END", None),
+                ("TEXT", "tail"),
+                ("GROUP_END", None),
+            ],
+            events,
+        )
+
+    def test_skip_group_without_closing_brace_fails(self):
+        parser = RTFParser(r"{\rtf1{\pict 4142}")
+        with self.assertRaises(RTFParseError):
+            walk = parser.iterevents()
+            for event in walk:
+                if event == ("RTFCMD", "pict"):
+                    walk.skip_group()
+
+    def test_iterevents_rejects_what_parseme_rejects(self):
+        for rtf_text in (r"\rtf1", r"{\rtf1", r"{\rtf1}extra", "{\\rtf1 \\"):
+            with self.subTest(rtf_text=rtf_text):
+                self.assertRaises(
+                    RTFParseError,
+                    lambda: list(RTFParser(rtf_text).iterevents()),
+                )
+
     def random_valid_rtf(self, rng, max_depth=3):
         commands = ["rtf1", "ansi", "pard", "par", "b", "i", "fs22", "f0"]
         text_chars = string.ascii_letters + string.digits + " .,;:-_"
@@ -159,6 +483,63 @@ class TestRTFParsing(unittest.TestCase):
                 self.assertIsInstance(parsed, list)
                 self.assert_token_tree_shape(parsed)
 
+    def test_fuzz_events_rebuild_the_parsed_tree(self):
+        rng = random.Random(20260705)
+
+        for _ in range(300):
+            rtf_text = self.random_valid_rtf(rng)
+            with self.subTest(rtf_text=rtf_text):
+                self.assertEqual(
+                    RTFParser(rtf_text).parseme(),
+                    self.tree_from_events(RTFParser(rtf_text).iterevents()),
+                )
+
+    def merge_text_runs(self, tokens):
+        merged = []
+        for token in tokens:
+            if isinstance(token, list):
+                merged.append(self.merge_text_runs(token))
+            elif (
+                token[0] in {"TEXT", "CMDPARAM"}
+                and merged
+                and isinstance(merged[-1], tuple)
+                and merged[-1][0] == token[0]
+            ):
+                merged[-1] = (token[0], merged[-1][1] + token[1])
+            else:
+                merged.append(token)
+        return merged
+
+    def test_fuzz_coalesced_tokens_join_to_the_uncoalesced_tokens(self):
+        rng = random.Random(20260706)
+
+        for _ in range(300):
+            rtf_text = self.random_valid_rtf(rng)
+            with self.subTest(rtf_text=rtf_text):
+                coalesced = RTFParser(rtf_text, coalesce_text=True).parseme()
+                self.assertEqual(
+                    self.merge_text_runs(RTFParser(rtf_text).parseme()),
+                    coalesced,
+                )
+                self.assertEqual(
+                    coalesced,
+                    self.tree_from_events(
+                        RTFParser(rtf_text, coalesce_text=True).iterevents()
+                    ),
+                )
+
+    def test_fuzz_compact_stream_matches_the_parsed_tree(self):
+        rng = random.Random(20260707)
+
+        for _ in range(300):
+            rtf_text = self.random_valid_rtf(rng)
+            for coalesce_text in (False, True):
+                with self.subTest(rtf_text=rtf_text, coalesce_text=coalesce_text):
+                    self.assertEqual(
+                        RTFParser(rtf_text, coalesce_text=coalesce_text).parseme(),
+                        RTFParser(rtf_text, coalesce_text=coalesce_text).parsecompact().root.tolist(),
+                    )
+
     def test_fuzz_arbitrary_input_only_raises_parse_errors(self):
         rng = random.Random(20260704)
         alphabet = string.ascii_letters + string.digits + "{}\\ \t\r\n\x00?;-"
@@ -1,9 +1,12 @@
 import os
 from pathlib import Path
+import sqlite3
 import tempfile
+import threading
 import unittest
 from unittest import mock
 
+from src.RTFParser import RTFParser
 from src.search_index import NoteSearchIndex, rtf_to_plain_text
 
 
@@ -17,6 +20,7 @@ class TestNoteSearchIndex(unittest.TestCase):
         self.index = NoteSearchIndex(self.root)
 
     def tearDown(self):
+        self.index.close()
         self.tmp.cleanup()
 
     def write_note(self, relative_path, body):
@@ -48,6 +52,20 @@ class TestNoteSearchIndex(unittest.TestCase):
         self.assertIn("Visible link", text)
         self.assertNotIn("68747470733a", text)
 
+    def test_plain_text_accepts_a_compact_token_stream(self):
+        rtf = (
+            RTF_HEADER
+            + r"Before{\par }After {\pict\pngblip 414243}"
+            + r"{\supertextlink{\*\supertexttarget 6869}"
+            + r"{\supertextdisplay Visible link}}"
+            + "}"
+        )
+
+        self.assertEqual(
+            rtf_to_plain_text(rtf),
+            rtf_to_plain_text(RTFParser(rtf).parsecompact()),
+        )
+
     def test_search_finds_case_insensitive_substrings_in_nested_notes(self):
         self.write_note("alpha.rtf", "A searchable HayStack value")
         self.write_note(Path("parent") / "child.rtf", "Needlework")
@@ -87,6 +105,134 @@ class TestNoteSearchIndex(unittest.TestCase):
         self.assertEqual([], self.index.search("First uncommon"))
         self.assertEqual(["second"], [r.path for r in self.index.search("unique")])
 
+    def test_refresh_skips_directories_that_have_not_changed(self):
+        self.write_note("alpha.rtf", "Alpha text")
+        self.write_note(Path("parent") / "child.rtf", "Child text")
+        grandchild = self.write_note(Path("parent") / "sub" / "grandchild.rtf", "Old text")
+        self.assertEqual({"updated": 3, "removed": 0}, self.index.refresh())
+        for directory in (self.root / "parent" / "sub", self.root / "parent", self.root):
+            os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+        self.index.refresh()
+
+        with mock.patch("src.search_index.os.scandir", wraps=os.scandir) as scandir:
+            stats = self.index.refresh()
+            scandir.assert_not_called()
+
+            grandchild.write_text(RTF_HEADER + "Edited text}", encoding="utf-8")
+            self.write_note(Path("parent") / "sub" / "new.rtf", "Fresh text")
+            stats = self.index.refresh()
+
+        self.assertEqual({"updated": 2, "removed": 0}, stats)
+        self.assertEqual(
+            [os.path.join(self.root, "parent", "sub")],
+            [call.args[0] for call in scandir.call_args_list],
+        )
+        self.assertEqual(
+            [os.path.join("parent", "sub", "new")],
+            [r.path for r in self.index.search("fresh")],
+        )
+        self.assertEqual(4, len(self.index.search("text")))
+
+    def test_first_refresh_of_an_index_finds_notes_edited_in_place(self):
+        child = self.write_note(Path("parent") / "child.rtf", "Old text")
+        for directory in (self.root / "parent", self.root):
+            os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+        self.index.refresh()
+
+        child.write_text(RTF_HEADER + "Edited text}", encoding="utf-8")
+        self.assertEqual({"updated": 0, "removed": 0}, self.index.refresh())
+        self.index.close()
+
+        reopened = NoteSearchIndex(self.root)
+        self.addCleanup(reopened.close)
+        self.assertEqual({"updated": 1, "removed": 0}, reopened.refresh())
+        self.assertEqual(
+            [os.path.join("parent", "child")],
+            [r.path for r in reopened.search("edited")],
+        )
+
+    def test_update_text_indexes_a_saved_note_without_reading_it(self):
+        path = self.write_note(Path("parent") / "child.rtf", "Saved body text")
+
+        with mock.patch.object(self.index, "_read_rtf") as read_mock:
+            self.assertTrue(
+                self.index.update_text(path, "Saved body text", os.stat(path))
+            )
+            self.assertFalse(
+                self.index.update_text(
+                    self.root.parent / "outside.rtf",
+                    "Outside text",
+                    os.stat(path),
+                )
+            )
+            stats = self.index.refresh()
+
+        read_mock.assert_not_called()
+        self.assertEqual({"updated": 0, "removed": 0}, stats)
+        self.assertEqual(
+            [os.path.join("parent", "child")],
+            [r.path for r in self.index.search("body text")],
+        )
+
+    def test_update_text_records_the_folder_of_the_saved_note(self):
+        child = self.write_note(Path("parent") / "child.rtf", "Old text")
+        self.index.refresh()
+        for directory in (self.root / "parent", self.root):
+            os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+        self.index.refresh()
+
+        saved = child.with_name(".child.rtf.tmp")
+        saved.write_text(RTF_HEADER + "Saved text}", encoding="utf-8")
+        os.replace(saved, child)
+        # as on a filesystem whose timestamps lag the clock
+        os.utime(self.root / "parent", ns=(2_000_000_000, 2_000_000_000))
+        self.index.update_text(child, "Saved text", os.stat(child))
+
+        with mock.patch("src.search_index.os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual(frozenset(), self.index.pending_changes())
+            self.assertEqual({"updated": 0, "removed": 0}, self.index.refresh())
+        scandir.assert_not_called()
+
+        # a folder saved to just now is listed again, as a refresh would
+        saved.write_text(RTF_HEADER + "Resaved text}", encoding="utf-8")
+        os.replace(saved, child)
+        self.index.update_text(child, "Resaved text", os.stat(child))
+        with mock.patch("src.search_index.os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual(frozenset(), self.index.pending_changes())
+        self.assertEqual(
+            [os.path.join(self.root, "parent")],
+            [call.args[0] for call in scandir.call_args_list],
+        )
+
+    def test_checking_for_changes_records_folders_whose_notes_are_unchanged(self):
+        child = self.write_note(Path("parent") / "child.rtf", "Old text")
+        self.index.refresh()
+        for directory in (self.root / "parent", self.root):
+            os.utime(directory, ns=(1_000_000_000, 1_000_000_000))
+        self.index.refresh()
+
+        saved = child.with_name(".child.rtf.tmp")
+        saved.write_text(RTF_HEADER + "Saved text}", encoding="utf-8")
+        os.replace(saved, child)
+        self.index.update_text(child, "Saved text", os.stat(child))
+        os.utime(self.root / "parent", ns=(2_000_000_000, 2_000_000_000))
+
+        with mock.patch("src.search_index.os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual(frozenset(), self.index.pending_changes())
+            self.assertEqual(
+                [os.path.join(self.root, "parent")],
+                [call.args[0] for call in scandir.call_args_list],
+            )
+            scandir.reset_mock()
+            self.assertEqual(frozenset(), self.index.pending_changes())
+            scandir.assert_not_called()
+
+        self.assertEqual({"updated": 0, "removed": 0}, self.index.refresh())
+        self.assertEqual(
+            [os.path.join("parent", "child")],
+            [r.path for r in self.index.search("saved text")],
+        )
+
     def test_short_queries_are_supported(self):
         self.write_note("alpha.rtf", "A xylophone")
         self.write_note("beta.rtf", "Nothing matching")
@@ -102,6 +248,75 @@ class TestNoteSearchIndex(unittest.TestCase):
         self.assertEqual(["alpha"], [result.path for result in results])
         self.assertEqual(1, read_mock.call_count)
 
+    def test_one_connection_is_shared_between_calls_and_threads(self):
+        path = self.write_note("alpha.rtf", "A searchable HayStack value")
+
+        with mock.patch("src.search_index.sqlite3.connect", wraps=sqlite3.connect) as connect:
+            self.index.refresh()
+            self.index.update_file(path)
+            results = []
+            worker = threading.Thread(
+                target=lambda: results.extend(self.index.search("haystack")),
+            )
+            worker.start()
+            worker.join(5)
+
+            self.assertEqual(["alpha"], [result.path for result in results])
+            self.assertEqual(1, connect.call_count)
+
+            self.index.close()
+            with self.assertRaises(sqlite3.ProgrammingError):
+                self.index.search("haystack")
+            self.assertEqual(1, connect.call_count)
+
+    def test_many_changed_notes_are_parsed_in_worker_processes(self):
+        for index in range(6):
+            self.write_note(f"note{index}.rtf", f"Shared text and marker{index}")
+
+        with mock.patch.object(NoteSearchIndex, "PARALLEL_MIN_NOTES", 2), \
+                mock.patch.object(NoteSearchIndex, "WRITE_BATCH_NOTES", 4), \
+                mock.patch("src.search_index.os.cpu_count", return_value=2), \
+                mock.patch.object(self.index, "_note_grams") as note_grams:
+            stats = self.index.refresh()
+
+        note_grams.assert_not_called()
+        self.assertEqual({"updated": 6, "removed": 0}, stats)
+        self.assertEqual(6, len(self.index.search("shared text")))
+        self.assertEqual(["note4"], [r.path for r in self.index.search("MARKER4")])
+        self.assertEqual({"updated": 0, "removed": 0}, self.index.refresh())
+
+    def test_refresh_stopped_by_its_progress_callback_keeps_parsed_notes(self):
+        for index in range(3):
+            self.write_note(f"note{index}.rtf", f"Shared text and marker{index}")
+        reported = []
+
+        def progress(done, total):
+            reported.append((done, total))
+            if done == 2:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.index.refresh(progress=progress)
+
+        self.assertEqual([(0, 3), (1, 3), (2, 3)], reported)
+        self.assertEqual(2, len(self.index.search("shared text")))
+        self.assertEqual({"updated": 1, "removed": 0}, self.index.refresh())
+
+    def test_refresh_parses_notes_itself_when_processes_cannot_start(self):
+        for index in range(3):
+            self.write_note(f"note{index}.rtf", f"Shared text and marker{index}")
+
+        with mock.patch.object(NoteSearchIndex, "PARALLEL_MIN_NOTES", 2), \
+                mock.patch("src.search_index.os.cpu_count", return_value=2), \
+                mock.patch(
+                    "src.search_index.ProcessPoolExecutor",
+                    side_effect=OSError("no processes"),
+                ):
+            stats = self.index.refresh()
+
+        self.assertEqual({"updated": 3, "removed": 0}, stats)
+        self.assertEqual(3, len(self.index.search("shared text")))
+
 
 if __name__ == "__main__":
     unittest.main()